@@ -0,0 +1,50 @@
+"""add hot query indexes
+
+Revision ID: 1b9c4e7f2a85
+Revises: f3a6d8e0b7c2
+Create Date: 2026-10-18 14:22:10.935480
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b9c4e7f2a85'
+down_revision: Union[str, Sequence[str], None] = 'f3a6d8e0b7c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns) for plain tables, built without blocking writes on
+# Postgres. Partitioned events cannot use CONCURRENTLY and are handled below.
+INDEXES = [
+    ('ix_sites_user_id', 'sites', ['user_id']),
+    ('ix_sites_status', 'sites', ['status']),
+    ('ix_variants_site_id_status', 'variants', ['site_id', 'status']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=postgres)
+
+    # Leads with site_id, so it replaces the single-column site index.
+    op.create_index(
+        'ix_events_site_id_variant_id_event_type',
+        'events',
+        ['site_id', 'variant_id', 'event_type', 'created_at'],
+        unique=False,
+    )
+    op.drop_index('ix_events_site_id', table_name='events')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_events_site_id', 'events', ['site_id'], unique=False)
+    op.drop_index('ix_events_site_id_variant_id_event_type', table_name='events')
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,29 @@
+"""add experiment stats watermark
+
+Revision ID: 5aa8b3702ea5
+Revises: 77ddd52edc99
+Create Date: 2026-10-18 04:02:37.803132
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5aa8b3702ea5'
+down_revision: Union[str, Sequence[str], None] = '77ddd52edc99'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows without a watermark are rebuilt from all events on their next update.
+    op.add_column('experiment_stats', sa.Column('watermark', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('experiment_stats', 'watermark')
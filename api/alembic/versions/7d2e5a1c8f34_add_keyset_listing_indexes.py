@@ -0,0 +1,41 @@
+"""add keyset listing indexes
+
+Revision ID: 7d2e5a1c8f34
+Revises: 1b9c4e7f2a85
+Create Date: 2026-10-18 15:48:37.204571
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e5a1c8f34'
+down_revision: Union[str, Sequence[str], None] = '1b9c4e7f2a85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        # Both follow the (created_at, id) order the listings page through.
+        op.create_index(
+            'ix_sites_user_id_created_at_id', 'sites', ['user_id', 'created_at', 'id'],
+            unique=False, postgresql_concurrently=postgres,
+        )
+        op.create_index(
+            'ix_variants_site_id_created_at_id', 'variants', ['site_id', 'created_at', 'id'],
+            unique=False, postgresql_concurrently=postgres,
+        )
+    # Superseded by the composite above, which leads with user_id.
+    op.drop_index('ix_sites_user_id', table_name='sites')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_sites_user_id', 'sites', ['user_id'], unique=False)
+    op.drop_index('ix_variants_site_id_created_at_id', table_name='variants')
+    op.drop_index('ix_sites_user_id_created_at_id', table_name='sites')
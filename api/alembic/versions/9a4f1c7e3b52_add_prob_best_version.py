@@ -0,0 +1,29 @@
+"""add prob best version
+
+Revision ID: 9a4f1c7e3b52
+Revises: 7d2e5a1c8f34
+Create Date: 2026-10-18 16:31:05.417829
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f1c7e3b52'
+down_revision: Union[str, Sequence[str], None] = '7d2e5a1c8f34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows without a version are recomputed on read until their next update.
+    op.add_column('experiment_stats', sa.Column('prob_best_version', sa.String(length=16), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('experiment_stats', 'prob_best_version')
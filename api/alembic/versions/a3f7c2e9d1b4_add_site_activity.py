@@ -0,0 +1,40 @@
+"""add site activity
+
+Revision ID: a3f7c2e9d1b4
+Revises: d5c8a0f2e6b9
+Create Date: 2026-10-18 19:12:40.318406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f7c2e9d1b4'
+down_revision: Union[str, Sequence[str], None] = 'd5c8a0f2e6b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Starts empty: existing stats count as current until a site's next event.
+    op.create_table(
+        'site_activity',
+        sa.Column('site_id', sa.UUID(), nullable=False),
+        sa.Column('pending_events', sa.Integer(), nullable=False),
+        sa.Column('dirty_since', sa.DateTime(), nullable=True),
+        sa.Column('last_event_at', sa.DateTime(), nullable=True),
+        sa.Column('last_recomputed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['site_id'], ['sites.id'], ),
+        sa.PrimaryKeyConstraint('site_id'),
+    )
+    op.create_index(op.f('ix_site_activity_dirty_since'), 'site_activity', ['dirty_since'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_site_activity_dirty_since'), table_name='site_activity')
+    op.drop_table('site_activity')
@@ -0,0 +1,58 @@
+"""add variant patch hash
+
+Revision ID: b7e2d94c1f08
+Revises: 9a4f1c7e3b52
+Create Date: 2026-10-18 17:12:44.081356
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.patches import patch_hash
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d94c1f08'
+down_revision: Union[str, Sequence[str], None] = '9a4f1c7e3b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('variants', sa.Column('patch_hash', sa.String(length=64), nullable=True))
+
+    # Hashed in Python so existing rows match the canonical JSON new rows use.
+    bind = op.get_bind()
+    variants = sa.table(
+        'variants',
+        sa.column('id', sa.Uuid()),
+        sa.column('patch', sa.JSON()),
+        sa.column('patch_hash', sa.String()),
+    )
+    while True:
+        rows = bind.execute(
+            sa.select(variants.c.id, variants.c.patch)
+            .where(variants.c.patch_hash.is_(None))
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            variants.update()
+            .where(variants.c.id == sa.bindparam('variant_id'))
+            .values(patch_hash=sa.bindparam('hash')),
+            [{'variant_id': row.id, 'hash': patch_hash(row.patch)} for row in rows],
+        )
+
+    op.create_index('ix_variants_patch_hash', 'variants', ['patch_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_variants_patch_hash', table_name='variants')
+    op.drop_column('variants', 'patch_hash')
@@ -0,0 +1,43 @@
+"""add site purges
+
+Revision ID: d5c8a0f2e6b9
+Revises: b7e2d94c1f08
+Create Date: 2026-10-18 17:58:21.660143
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5c8a0f2e6b9'
+down_revision: Union[str, Sequence[str], None] = 'b7e2d94c1f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sites', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'site_purges',
+        sa.Column('site_id', sa.UUID(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('deleted', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('requested_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('site_id'),
+    )
+    # Purges delete a site's goals by site_id.
+    op.create_index('ix_conversion_goals_site_id', 'conversion_goals', ['site_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversion_goals_site_id', table_name='conversion_goals')
+    op.drop_table('site_purges')
+    op.drop_column('sites', 'deleted_at')
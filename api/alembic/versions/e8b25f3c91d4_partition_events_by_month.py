@@ -0,0 +1,108 @@
+"""partition events by month
+
+Revision ID: e8b25f3c91d4
+Revises: c41e7a9d2b60
+Create Date: 2026-10-18 11:40:22.107395
+
+This is an offline step on PostgreSQL: events is renamed aside and copied
+into the partitioned table inside the migration's transaction, so ingest
+fails and the table stays locked until it commits. Stop event ingest and run
+it in a maintenance window; the copy goes one month per statement, so no
+single statement has to route the whole table.
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b25f3c91d4'
+down_revision: Union[str, Sequence[str], None] = 'c41e7a9d2b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months created ahead of now; services.event_retention keeps extending this.
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, site_id, variant_id, visitor_id, event_type, event_metadata, created_at"
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_events_table(partitioned: bool) -> None:
+    op.execute(
+        "CREATE TABLE events ("
+        "id UUID NOT NULL, "
+        "site_id UUID NOT NULL REFERENCES sites (id), "
+        "variant_id UUID NOT NULL REFERENCES variants (id), "
+        "visitor_id VARCHAR(255) NOT NULL, "
+        "event_type VARCHAR(50) NOT NULL, "
+        "event_metadata JSON, "
+        "created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL, "
+        + ("PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)" if partitioned else "PRIMARY KEY (id))")
+    )
+    op.create_index(op.f('ix_events_created_at'), 'events', ['created_at'], unique=False)
+    op.create_index(op.f('ix_events_site_id'), 'events', ['site_id'], unique=False)
+    op.create_index(op.f('ix_events_visitor_id'), 'events', ['visitor_id'], unique=False)
+
+
+def _rename_old_events() -> None:
+    op.rename_table('events', 'events_old')
+    for index in ('ix_events_created_at', 'ix_events_site_id', 'ix_events_visitor_id'):
+        op.execute(f"ALTER INDEX {index} RENAME TO {index}_old")
+    op.execute("ALTER TABLE events_old RENAME CONSTRAINT events_pkey TO events_old_pkey")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # SQLite and friends keep the single unpartitioned table.
+        return
+
+    _rename_old_events()
+    _create_events_table(partitioned=True)
+
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM events_old")).scalar()
+    now = datetime.utcnow()
+    month = (oldest or now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = _add_months(now.replace(day=1, hour=0, minute=0, second=0, microsecond=0), MONTHS_AHEAD)
+    months = []
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE events_p{month:%Y%m} PARTITION OF events "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        )
+        months.append((month, upper))
+        month = upper
+    op.execute("CREATE TABLE events_default PARTITION OF events DEFAULT")
+
+    for lower, upper in months:
+        op.execute(
+            f"INSERT INTO events_p{lower:%Y%m} ({COLUMNS}) SELECT {COLUMNS} FROM events_old "
+            f"WHERE created_at >= '{lower:%Y-%m-%d}' AND created_at < '{upper:%Y-%m-%d}'"
+        )
+    # Anything dated past the last partition lands in the default one.
+    op.execute(
+        f"INSERT INTO events_default ({COLUMNS}) SELECT {COLUMNS} FROM events_old "
+        f"WHERE created_at >= '{months[-1][1]:%Y-%m-%d}'"
+    )
+    op.drop_table('events_old')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    _rename_old_events()
+    _create_events_table(partitioned=False)
+    op.execute(f"INSERT INTO events ({COLUMNS}) SELECT {COLUMNS} FROM events_old")
+    # Dropping the partitioned parent drops every partition with it.
+    op.drop_table('events_old')
@@ -0,0 +1,51 @@
+"""time-ordered event ids
+
+Revision ID: f3a6d8e0b7c2
+Revises: e8b25f3c91d4
+Create Date: 2026-10-18 13:05:51.662014
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a6d8e0b7c2'
+down_revision: Union[str, Sequence[str], None] = 'e8b25f3c91d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The application generates UUIDv7 ids itself (db.ids.uuid7); this gives
+    # inserts made directly in SQL the same time-ordered keys. Existing rows
+    # keep their ids: the column type is unchanged and old keys stay valid.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION uuid_generate_v7() RETURNS uuid
+        LANGUAGE plpgsql VOLATILE AS $$
+        DECLARE
+            bytes bytea := uuid_send(gen_random_uuid());
+            ms bigint := floor(extract(epoch FROM clock_timestamp()) * 1000);
+        BEGIN
+            bytes := overlay(bytes placing substring(int8send(ms) FROM 3) FROM 1 FOR 6);
+            bytes := set_byte(bytes, 6, (get_byte(bytes, 6) & 15) | 112);
+            bytes := set_byte(bytes, 8, (get_byte(bytes, 8) & 63) | 128);
+            RETURN encode(bytes, 'hex')::uuid;
+        END
+        $$
+    """)
+    op.execute("ALTER TABLE events ALTER COLUMN id SET DEFAULT uuid_generate_v7()")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("ALTER TABLE events ALTER COLUMN id DROP DEFAULT")
+    op.execute("DROP FUNCTION IF EXISTS uuid_generate_v7()")
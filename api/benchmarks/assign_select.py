@@ -0,0 +1,70 @@
+"""Per-visitor selection cost of Beta sampling vs a precomputed alias table.
+
+Usage (from api/):
+    python -m benchmarks.assign_select [--arms 2,4,8,16,64] [--visitors 20000] [--json out.json]
+
+Both modes pick for the same visitors. The alias table is built once from
+prob_best, as a stats update would do, and its build time is reported
+separately.
+"""
+import argparse
+import time
+from typing import List
+
+from benchmarks.common import summarize, write_json
+from benchmarks.prob_best import make_variants
+from services.thompson_sampling import AliasTable, ThompsonSampler, posterior_version
+
+
+def run(arm_counts: List[int], visitors: int) -> List[dict]:
+    rows = []
+    for arms in arm_counts:
+        variants = sorted(make_variants(arms, 20_000, 0.05, seed=arms))
+        version = posterior_version(variants)
+        weights = ThompsonSampler.estimate_prob_best(variants).probabilities
+
+        started = time.perf_counter()
+        table = AliasTable.build(weights)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        modes = {
+            "thompson": lambda v: ThompsonSampler.select_variant(variants, v, "bench", version),
+            "allocation": lambda v: ThompsonSampler.select_allocated(table, v, "bench", version),
+        }
+        for mode, select in modes.items():
+            latencies = []
+            for i in range(visitors):
+                started = time.perf_counter()
+                select(f"visitor-{i}")
+                latencies.append((time.perf_counter() - started) * 1000)
+            rows.append({
+                "arms": arms,
+                "mode": mode,
+                "build_ms": build_ms if mode == "allocation" else 0.0,
+                **summarize(latencies),
+            })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arms", default="2,4,8,16,64")
+    parser.add_argument("--visitors", type=int, default=20_000)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    rows = run([int(a) for a in args.arms.split(",")], args.visitors)
+
+    print(f"{'arms':>4} {'mode':>10} {'mean us':>9} {'p99 us':>9} {'build ms':>9}")
+    for row in rows:
+        print(
+            f"{row['arms']:>4} {row['mode']:>10} {row['mean_ms'] * 1000:>9.1f} "
+            f"{row['p99_ms'] * 1000:>9.1f} {row['build_ms']:>9.3f}"
+        )
+
+    if args.json_path:
+        write_json(args.json_path, {"benchmark": "assign_select", "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Tail latency of /v1/assign under mixed read/write load, sync vs async sessions.
+
+Usage (from api/):
+    python -m benchmarks.async_db [--requests 2000] [--concurrency 10]
+        [--slow-ms 50] [--database-url URL] [--json out.json]
+
+"async_session" is the real runtime router. "sync_session" reproduces the
+old pattern of a blocking Session inside ``async def`` handlers, running the
+same queries. The load mixes assignments (snapshot cache disabled so every
+call reads the DB), event writes and a small share of slow report queries,
+and the assignment latency is reported. Without --database-url a throwaway
+SQLite file is used.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+# Shares of event writes and slow report queries; the rest are assignments.
+EVENT_SHARE = 0.3
+SLOW_SHARE = 0.02
+
+
+def build_apps(slow_ms: float) -> Dict[str, object]:
+    from fastapi import Depends, FastAPI, Response
+    from sqlalchemy import event as sa_event, select, text
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+
+    from db import get_async_db, get_db
+    from db.connection import async_engine, engine
+    from db.models import Site, Variant, ExperimentStats
+    from routes import runtime
+    from schemas.runtime import EventRequest, EventResponse
+    from services.event_buffer import event_row, insert_events
+    from services.site_cache import site_snapshots
+    from services.thompson_sampling import ThompsonSampler, posterior_version
+
+    if engine.dialect.name == "sqlite":
+        # SQLite has no sleep function; register one so a slow query holds
+        # its connection the way pg_sleep does.
+        def register_sleep(dbapi_connection, _record):
+            dbapi_connection.create_function("pg_sleep", 1, lambda s: time.sleep(s) or 0)
+
+        sa_event.listen(engine, "connect", register_sleep)
+        sa_event.listen(async_engine.sync_engine, "connect", register_sleep)
+
+    slow_query = text("SELECT pg_sleep(:seconds)")
+    site_snapshots.ttl_seconds = 0
+
+    async_app = FastAPI()
+    async_app.include_router(runtime.router)
+
+    @async_app.get("/bench/slow")
+    async def async_slow(db: AsyncSession = Depends(get_async_db)):
+        await db.execute(slow_query, {"seconds": slow_ms / 1000})
+        return {}
+
+    sync_app = FastAPI()
+
+    @sync_app.get("/v1/assign")
+    async def sync_assign(site_id: str, visitor_id: str, db: Session = Depends(get_db)):
+        site = db.get(Site, uuid.UUID(site_id))
+        rows = db.execute(
+            select(Variant.id, ExperimentStats.alpha, ExperimentStats.beta)
+            .join(ExperimentStats, Variant.id == ExperimentStats.variant_id, isouter=True)
+            .where(Variant.site_id == site.id, Variant.status == "active")
+        ).all()
+        variants = sorted((str(v), a or 1.0, b or 1.0) for v, a, b in rows)
+        selected = ThompsonSampler.select_variant(
+            variants, visitor_id, site_id=site_id, version=posterior_version(variants)
+        )
+        return Response(content=f'{{"variant_id":"{selected}"}}', media_type="application/json")
+
+    @sync_app.post("/v1/event", response_model=EventResponse)
+    async def sync_event(request: EventRequest, db: Session = Depends(get_db)):
+        insert_events(db, [event_row(request)])
+        db.commit()
+        return EventResponse(status="recorded")
+
+    @sync_app.get("/bench/slow")
+    async def sync_slow(db: Session = Depends(get_db)):
+        db.execute(slow_query, {"seconds": slow_ms / 1000})
+        return {}
+
+    return {"sync_session": sync_app, "async_session": async_app}
+
+
+def seed(arms: int) -> Dict[str, object]:
+    from db.connection import SessionLocal, engine
+    from db.models import Base, User, Site, Variant, ExperimentStats
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = User(id=uuid.uuid4(), email=f"bench-{uuid.uuid4().hex[:8]}@example.com")
+        site = Site(id=uuid.uuid4(), user_id=user.id, url="https://bench.example.com", status="running")
+        db.add_all([user, site])
+        variant_ids = []
+        for i in range(arms):
+            variant = Variant(id=uuid.uuid4(), site_id=site.id, patch={"headline": f"H{i}"}, status="active")
+            db.add(variant)
+            db.add(ExperimentStats(
+                variant_id=variant.id, visitors=1000, conversions=50 + i,
+                alpha=51.0 + i, beta=951.0 - i, prob_best=0.0,
+            ))
+            variant_ids.append(str(variant.id))
+        db.commit()
+        return {"site_id": str(site.id), "variant_ids": variant_ids}
+
+
+async def drive(app, fixture: dict, total: int, concurrency: int, seed_value: int) -> List[float]:
+    import httpx
+
+    rng = random.Random(seed_value)
+    plan = []
+    for _ in range(total):
+        roll = rng.random()
+        plan.append("slow" if roll < SLOW_SHARE else "event" if roll < SLOW_SHARE + EVENT_SHARE else "assign")
+
+    site_id = fixture["site_id"]
+    assign_latencies: List[float] = []
+    queue: "asyncio.Queue[str]" = asyncio.Queue()
+    for kind in plan:
+        queue.put_nowait(kind)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker(n: int) -> None:
+            while not queue.empty():
+                kind = queue.get_nowait()
+                visitor = f"visitor-{n}-{queue.qsize()}"
+                start = time.perf_counter()
+                if kind == "assign":
+                    response = await client.get("/v1/assign", params={"site_id": site_id, "visitor_id": visitor})
+                elif kind == "event":
+                    response = await client.post("/v1/event", json={
+                        "site_id": site_id,
+                        "variant_id": fixture["variant_ids"][0],
+                        "visitor_id": visitor,
+                        "type": "impression",
+                    })
+                else:
+                    response = await client.get("/bench/slow")
+                response.raise_for_status()
+                if kind == "assign":
+                    assign_latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+    return assign_latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    # Keep this within the sync engine's pool (5 + 10 overflow): a blocked
+    # loop cannot return connections, so the sync app deadlocks beyond it.
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--slow-ms", type=float, default=50.0)
+    parser.add_argument("--arms", type=int, default=3)
+    parser.add_argument("--database-url")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    # db.connection reads DATABASE_URL at import time.
+    os.environ["DATABASE_URL"] = args.database_url or (
+        f"sqlite:///{tempfile.mkdtemp(prefix='evoloop-bench-')}/bench.db"
+    )
+    from benchmarks.common import summarize, write_json
+
+    fixture = seed(args.arms)
+    apps = build_apps(args.slow_ms)
+
+    rows = []
+    for name, app in apps.items():
+        start = time.perf_counter()
+        latencies = asyncio.run(drive(app, fixture, args.requests, args.concurrency, seed_value=1))
+        rows.append({
+            "mode": name,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "wall_s": time.perf_counter() - start,
+            **summarize(latencies),
+        })
+
+    print(f"{'mode':>14} {'assigns':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'wall s':>7}")
+    for row in rows:
+        print(
+            f"{row['mode']:>14} {row['count']:>8} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+            f"{row['p99_ms']:>9.2f} {row['max_ms']:>9.2f} {row['wall_s']:>7.2f}"
+        )
+
+    if args.json_path:
+        write_json(args.json_path, {"benchmark": "async_db", "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Regression gate: compare a load_test run against a baseline run.
+
+Usage (from api/):
+    python -m benchmarks.compare baseline.json current.json
+        [--max-latency-regression 0.25] [--max-throughput-drop 0.2]
+
+Rows are matched on (arms, endpoint). A row regresses when its p95 or p99
+latency grew by more than the allowed fraction, its throughput fell by more
+than the allowed fraction, or it had errors. Baseline rows missing from the
+current run fail too. The exit status is 1 on any failure, so CI can fail
+the build on it.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+LATENCY_FIELDS = ("p95_ms", "p99_ms")
+
+
+def load_rows(path: str) -> Dict[Tuple, dict]:
+    with open(path) as f:
+        payload = json.load(f)
+    return {(row["arms"], row["endpoint"]): row for row in payload["results"]}
+
+
+def compare(
+    baseline: Dict[Tuple, dict],
+    current: Dict[Tuple, dict],
+    max_latency_regression: float,
+    max_throughput_drop: float,
+) -> List[dict]:
+    """One verdict per row present in both runs."""
+    verdicts = []
+    for key in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[key], current[key]
+        problems = []
+        for field in LATENCY_FIELDS:
+            if before[field] and after[field] > before[field] * (1 + max_latency_regression):
+                problems.append(f"{field} {before[field]:.2f} -> {after[field]:.2f}")
+        if after["throughput_rps"] < before["throughput_rps"] * (1 - max_throughput_drop):
+            problems.append(f"req/s {before['throughput_rps']:.1f} -> {after['throughput_rps']:.1f}")
+        if after["errors"]:
+            problems.append(f"{after['errors']} errors")
+        verdicts.append({"arms": key[0], "endpoint": key[1], "problems": problems})
+    return verdicts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--max-latency-regression", type=float, default=0.25)
+    parser.add_argument("--max-throughput-drop", type=float, default=0.2)
+    args = parser.parse_args()
+
+    baseline, current = load_rows(args.baseline), load_rows(args.current)
+    verdicts = compare(baseline, current, args.max_latency_regression, args.max_throughput_drop)
+    missing = sorted(baseline.keys() - current.keys())
+
+    for verdict in verdicts:
+        status = "REGRESSED" if verdict["problems"] else "ok"
+        print(f"{verdict['arms']:>4} {verdict['endpoint']:>12} {status:>9}  {'; '.join(verdict['problems'])}")
+    for arms, endpoint in missing:
+        print(f"{arms:>4} {endpoint:>12} {'missing':>9}")
+
+    if missing or any(v["problems"] for v in verdicts):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Insert throughput and primary key index size for random vs time-ordered event ids.
+
+Usage (from api/):
+    python -m benchmarks.event_keys [--rows 1000000] [--batch 10000]
+        [--database-url URL] [--json out.json]
+
+Each key scheme loads the same synthetic append-only event stream into its
+own table. Without --database-url a throwaway SQLite file is used and index
+sizes come from the dbstat virtual table; on Postgres they come from
+pg_relation_size.
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, create_engine, insert, text
+from sqlalchemy.dialects.postgresql import UUID
+
+from benchmarks.common import summarize, write_json
+
+
+def key_schemes() -> Dict[str, Callable[[], uuid.UUID]]:
+    from db.ids import uuid7
+
+    return {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+def bench_table(metadata: MetaData, scheme: str) -> Table:
+    return Table(
+        f"bench_events_{scheme}",
+        metadata,
+        Column("id", UUID(as_uuid=True), primary_key=True),
+        Column("site_id", UUID(as_uuid=True), nullable=False),
+        Column("visitor_id", String(255), nullable=False),
+        Column("created_at", DateTime, nullable=False),
+    )
+
+
+def index_sizes(engine, table: Table) -> Dict[str, int]:
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            return {
+                "pk_index_bytes": conn.scalar(text(f"SELECT pg_relation_size('{table.name}_pkey')")),
+                "table_bytes": conn.scalar(text(f"SELECT pg_relation_size('{table.name}')")),
+            }
+        sizes = dict(conn.execute(text("SELECT name, sum(pgsize) FROM dbstat GROUP BY name")).all())
+        return {
+            "pk_index_bytes": sizes.get(f"sqlite_autoindex_{table.name}_1", 0),
+            "table_bytes": sizes.get(table.name, 0),
+        }
+
+
+def load(engine, table: Table, new_id: Callable[[], uuid.UUID], rows: int, batch: int) -> List[float]:
+    site_id = uuid.uuid4()
+    start_time = datetime.utcnow() - timedelta(days=30)
+    latencies = []
+    for offset in range(0, rows, batch):
+        chunk = [
+            {
+                "id": new_id(),
+                "site_id": site_id,
+                "visitor_id": f"visitor-{offset + i}",
+                "created_at": start_time + timedelta(milliseconds=offset + i),
+            }
+            for i in range(min(batch, rows - offset))
+        ]
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(insert(table), chunk)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run(database_url: str, rows: int, batch: int) -> List[dict]:
+    schemes = key_schemes()
+    engine = create_engine(database_url)
+    metadata = MetaData()
+    tables = {scheme: bench_table(metadata, scheme) for scheme in schemes}
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    results = []
+    try:
+        for scheme, new_id in schemes.items():
+            started = time.perf_counter()
+            latencies = load(engine, tables[scheme], new_id, rows, batch)
+            elapsed = time.perf_counter() - started
+            batch_stats = summarize(latencies)
+            results.append({
+                "scheme": scheme,
+                "rows": rows,
+                "rows_per_s": rows / elapsed,
+                "batch_p50_ms": batch_stats["p50_ms"],
+                "batch_p99_ms": batch_stats["p99_ms"],
+                **index_sizes(engine, tables[scheme]),
+            })
+    finally:
+        if engine.dialect.name != "sqlite":
+            metadata.drop_all(engine)
+        engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--database-url")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='evoloop-bench-')}/keys.db"
+    # Importing db reads DATABASE_URL.
+    os.environ.setdefault("DATABASE_URL", database_url)
+    results = run(database_url, args.rows, args.batch)
+
+    print(f"{'scheme':>7} {'rows/s':>10} {'batch p50':>10} {'batch p99':>10} {'pk index MB':>12} {'table MB':>9}")
+    for row in results:
+        print(
+            f"{row['scheme']:>7} {row['rows_per_s']:>10.0f} {row['batch_p50_ms']:>10.1f} "
+            f"{row['batch_p99_ms']:>10.1f} {row['pk_index_bytes'] / 2**20:>12.1f} {row['table_bytes'] / 2**20:>9.1f}"
+        )
+
+    if args.json_path:
+        write_json(args.json_path, {"benchmark": "event_keys", "results": results})
+
+
+if __name__ == "__main__":
+    main()
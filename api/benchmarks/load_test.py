@@ -0,0 +1,191 @@
+"""Throughput and latency of the runtime and stats endpoints under concurrent load.
+
+Usage (from api/):
+    python -m benchmarks.load_test [--arms 2,10,100] [--endpoints assign,event,stats,stats_update]
+        [--requests 2000] [--concurrency 16] [--warmup 50] [--database-url URL] [--json out.json]
+
+Each scenario seeds one running site with the given number of active
+variants and some history, then drives every endpoint in turn against the
+full in-process app (middleware included) at a fixed concurrency. Without
+--database-url a throwaway SQLite file is used; a local Postgres URL needs
+an empty, migrated database. Compare two --json runs with
+``python -m benchmarks.compare``.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+# Events per variant seeded before the run, spread over the last week.
+SEED_EVENTS_PER_VARIANT = 200
+
+ENDPOINTS = ("assign", "event", "stats", "stats_update")
+# Recomputes of one site serialize on its stats rows, and the cron never
+# overlaps them, so these are driven one request at a time.
+SERIAL_ENDPOINTS = {"stats_update"}
+
+
+def seed(arms: int) -> Dict[str, object]:
+    from db.connection import SessionLocal, engine
+    from db.models import Base, User, Site, Variant, ExperimentStats
+    from services.event_buffer import insert_events
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(arms)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        user = User(id=uuid.uuid4(), email=f"load-{uuid.uuid4().hex[:8]}@example.com")
+        site = Site(id=uuid.uuid4(), user_id=user.id, url=f"https://load-{arms}.example.com", status="running")
+        db.add_all([user, site])
+        variants = [
+            Variant(id=uuid.uuid4(), site_id=site.id, patch={"headline": f"H{i}"}, status="active")
+            for i in range(arms)
+        ]
+        db.add_all(variants)
+        db.add_all([ExperimentStats(variant_id=v.id) for v in variants])
+        db.flush()
+
+        rows = []
+        for variant in variants:
+            for i in range(SEED_EVENTS_PER_VARIANT):
+                rows.append({
+                    "id": uuid.uuid4(),
+                    "site_id": site.id,
+                    "variant_id": variant.id,
+                    "visitor_id": f"seed-{i}",
+                    "event_type": "conversion" if rng.random() < 0.05 else "impression",
+                    "event_metadata": {},
+                    "created_at": now - timedelta(minutes=rng.randrange(7 * 24 * 60)),
+                })
+        insert_events(db, rows)
+        db.commit()
+        return {"site_id": str(site.id), "variant_ids": [str(v.id) for v in variants]}
+
+
+def request_factory(endpoint: str, fixture: dict, rng: random.Random) -> Callable:
+    """A coroutine function issuing one ``endpoint`` request on a client."""
+    site_id = fixture["site_id"]
+    variant_ids = fixture["variant_ids"]
+
+    if endpoint == "assign":
+        return lambda client, n: client.get(
+            "/v1/assign", params={"site_id": site_id, "visitor_id": f"visitor-{n}"}
+        )
+    if endpoint == "event":
+        return lambda client, n: client.post("/v1/event", json={
+            "site_id": site_id,
+            "variant_id": rng.choice(variant_ids),
+            "visitor_id": f"visitor-{n}",
+            "type": "conversion" if rng.random() < 0.05 else "impression",
+        })
+    if endpoint == "stats":
+        return lambda client, n: client.get(f"/api/stats/site/{site_id}")
+    if endpoint == "stats_update":
+        return lambda client, n: client.post(f"/api/stats/update/{site_id}")
+    raise ValueError(f"unknown endpoint {endpoint!r}")
+
+
+async def drive(app, send: Callable, total: int, concurrency: int, warmup: int) -> dict:
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    # Server errors come back as 500s and count as errors instead of aborting the run.
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for n in range(warmup):
+            await send(client, -1 - n)
+
+        counter = iter(range(total))
+
+        async def worker() -> None:
+            nonlocal errors
+            for n in counter:
+                start = time.perf_counter()
+                response = await send(client, n)
+                elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code >= 400:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall_s = time.perf_counter() - start
+
+    return {"latencies": latencies, "errors": errors, "wall_s": wall_s}
+
+
+def run(arm_counts: List[int], endpoints: List[str], total: int, concurrency: int, warmup: int) -> List[dict]:
+    from benchmarks.common import summarize
+    from index import app
+
+    rows = []
+    for arms in arm_counts:
+        fixture = seed(arms)
+        for endpoint in endpoints:
+            send = request_factory(endpoint, fixture, random.Random(arms))
+            workers = 1 if endpoint in SERIAL_ENDPOINTS else concurrency
+            result = asyncio.run(drive(app, send, total, workers, warmup))
+            rows.append({
+                "arms": arms,
+                "endpoint": endpoint,
+                "requests": total,
+                "concurrency": workers,
+                "errors": result["errors"],
+                "wall_s": result["wall_s"],
+                "throughput_rps": total / result["wall_s"] if result["wall_s"] else 0.0,
+                **summarize(result["latencies"]),
+            })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arms", default="2,10,100")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--database-url")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    endpoints = args.endpoints.split(",")
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    # db.connection reads DATABASE_URL at import time.
+    os.environ["DATABASE_URL"] = args.database_url or (
+        f"sqlite:///{tempfile.mkdtemp(prefix='evoloop-bench-')}/bench.db"
+    )
+    from benchmarks.common import write_json
+
+    rows = run([int(a) for a in args.arms.split(",")], endpoints, args.requests, args.concurrency, args.warmup)
+
+    print(
+        f"{'arms':>4} {'endpoint':>12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'errors':>6}"
+    )
+    for row in rows:
+        print(
+            f"{row['arms']:>4} {row['endpoint']:>12} {row['throughput_rps']:>8.1f} {row['p50_ms']:>8.2f} "
+            f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['errors']:>6}"
+        )
+
+    if args.json_path:
+        write_json(args.json_path, {
+            "benchmark": "load_test",
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "results": rows,
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
-from .connection import get_db, engine
+from .connection import get_db, get_async_db, engine, async_engine, SessionLocal, AsyncSessionLocal
 from .models import Base
 
-__all__ = ["get_db", "engine", "Base"]
+__all__ = [
+    "get_db", "get_async_db", "engine", "async_engine", "SessionLocal", "AsyncSessionLocal", "Base",
+]
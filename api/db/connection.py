@@ -1,9 +1,14 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from sqlalchemy.pool import NullPool
+from typing import AsyncGenerator, Generator
 from dotenv import load_dotenv
 
+from db.slow_queries import slow_query_log_from_env
+
 # Load environment variables from parent directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '..', '.env.local'))
 
@@ -12,9 +17,48 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
+
+def async_database_url(url: str) -> URL:
+    """Map a sync DATABASE_URL onto the matching async driver."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        # asyncpg spells sslmode as ssl and has no channel_binding option.
+        query = dict(parsed.query)
+        sslmode = query.pop("sslmode", None)
+        query.pop("channel_binding", None)
+        if sslmode:
+            query["ssl"] = sslmode
+        return parsed.set(drivername="postgresql+asyncpg", query=query)
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite")
+    return parsed
+
+
+# The sync engine serves Alembic, the event buffer's flusher thread and scripts.
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# SQLite has no server to keep connections to, and pooled aiosqlite
+# connections cannot move between event loops, so they are not pooled.
+async_engine = create_async_engine(
+    async_database_url(DATABASE_URL),
+    pool_pre_ping=True,
+    **({"poolclass": NullPool} if make_url(DATABASE_URL).get_backend_name() == "sqlite" else {}),
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# Off unless SLOW_QUERY_LOG_PATH is set.
+slow_query_log = slow_query_log_from_env()
+if slow_query_log is not None:
+    slow_query_log.install(engine)
+    slow_query_log.install(async_engine.sync_engine)
+
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
@@ -22,3 +66,8 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,9 +1,12 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Float, Text, JSON
+from sqlalchemy import Column, DDL, Index, String, DateTime, ForeignKey, Integer, Float, Text, JSON, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base, relationship
 
+from .ids import uuid7
+from .patches import _patch_hash_default
+
 Base = declarative_base()
 
 
@@ -26,18 +29,28 @@ class Site(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     url = Column(String(2048), nullable=False)
-    status = Column(String(50), default="analyzing", nullable=False)
+    status = Column(String(50), default="analyzing", nullable=False, index=True)
     autonomy_mode = Column(String(50), default="training_wheels", nullable=False)
     approvals_remaining = Column(Integer, default=5)
     brand_constraints = Column(JSON, default=dict)
     image_generation_enabled = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set when the site is deleted; its rows are then removed in the
+    # background by services.site_purge.
+    deleted_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="sites")
     variants = relationship("Variant", back_populates="site", cascade="all, delete-orphan")
     conversion_goals = relationship("ConversionGoal", back_populates="site", cascade="all, delete-orphan")
-    events = relationship("Event", back_populates="site", cascade="all, delete-orphan")
+    # Never loaded to delete a site; there can be millions.
+    events = relationship("Event", back_populates="site", passive_deletes="all")
+    event_rollups = relationship("EventRollup", passive_deletes="all")
+
+    __table_args__ = (
+        # Matches the keyset order of list_sites.
+        Index("ix_sites_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
 
 class Variant(Base):
@@ -47,6 +60,8 @@ class Variant(Base):
     site_id = Column(UUID(as_uuid=True), ForeignKey("sites.id"), nullable=False)
     parent_variant_id = Column(UUID(as_uuid=True), ForeignKey("variants.id"), nullable=True)
     patch = Column(JSON, default=dict)
+    # Content address of the patch, which never changes after creation.
+    patch_hash = Column(String(64), nullable=True, index=True, default=_patch_hash_default)
     screenshot_url = Column(String(2048), nullable=True)
     generation_reasoning = Column(Text, nullable=True)
     status = Column(String(50), default="pending_review", nullable=False)
@@ -55,6 +70,12 @@ class Variant(Base):
 
     site = relationship("Site", back_populates="variants")
     parent = relationship("Variant", remote_side=[id], backref="children")
+
+    __table_args__ = (
+        Index("ix_variants_site_id_status", "site_id", "status"),
+        # Matches the keyset order of list_variants.
+        Index("ix_variants_site_id_created_at_id", "site_id", "created_at", "id"),
+    )
     stats = relationship("ExperimentStats", back_populates="variant", uselist=False, cascade="all, delete-orphan")
 
 
@@ -67,6 +88,8 @@ class ExperimentStats(Base):
     alpha = Column(Float, default=1.0, nullable=False)
     beta = Column(Float, default=1.0, nullable=False)
     prob_best = Column(Float, default=0.0, nullable=False)
+    # posterior_version() of the active arms prob_best was computed over.
+    prob_best_version = Column(String(16), nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     variant = relationship("Variant", back_populates="stats")
@@ -74,26 +97,86 @@ class ExperimentStats(Base):
 
 class Event(Base):
     __tablename__ = "events"
-
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    site_id = Column(UUID(as_uuid=True), ForeignKey("sites.id"), nullable=False, index=True)
+    # On Postgres events are range-partitioned by month on created_at, which
+    # must therefore be part of the primary key. See services.event_retention.
+    __table_args__ = (
+        # Leads with site_id, so it also serves the site-only filters.
+        Index("ix_events_site_id_variant_id_event_type", "site_id", "variant_id", "event_type", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # Time-ordered so appends stay on the right edge of the primary key index.
+    # Postgres also has uuid_generate_v7() as the column default for raw SQL.
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    site_id = Column(UUID(as_uuid=True), ForeignKey("sites.id"), nullable=False)
     variant_id = Column(UUID(as_uuid=True), ForeignKey("variants.id"), nullable=False)
     visitor_id = Column(String(255), nullable=False, index=True)
     event_type = Column(String(50), nullable=False)
     event_metadata = Column(JSON, default=dict)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True, primary_key=True)
 
     site = relationship("Site", back_populates="events")
     variant = relationship("Variant")
 
 
+# Catches rows outside every monthly partition, e.g. for schemas built with
+# create_all rather than the migrations.
+event.listen(
+    Event.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT").execute_if(dialect="postgresql"),
+)
+
+
+class EventRollup(Base):
+    """Event counts per variant, type and hour, kept in step with ``events``."""
+    __tablename__ = "event_rollups"
+
+    site_id = Column(UUID(as_uuid=True), ForeignKey("sites.id"), primary_key=True)
+    variant_id = Column(UUID(as_uuid=True), ForeignKey("variants.id"), primary_key=True)
+    event_type = Column(String(50), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class SiteActivity(Base):
+    """Events ingested for a site since its stats were last recomputed."""
+    __tablename__ = "site_activity"
+
+    site_id = Column(UUID(as_uuid=True), ForeignKey("sites.id"), primary_key=True)
+    pending_events = Column(Integer, default=0, nullable=False)
+    # Ingest time of the oldest event not yet in the stats; NULL when clean.
+    dirty_since = Column(DateTime, nullable=True, index=True)
+    last_event_at = Column(DateTime, nullable=True)
+    last_recomputed_at = Column(DateTime, nullable=True)
+
+
 class ConversionGoal(Base):
     __tablename__ = "conversion_goals"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    site_id = Column(UUID(as_uuid=True), ForeignKey("sites.id"), nullable=False)
+    site_id = Column(UUID(as_uuid=True), ForeignKey("sites.id"), nullable=False, index=True)
     type = Column(String(50), nullable=False)
     config = Column(JSON, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     site = relationship("Site", back_populates="conversion_goals")
+
+
+class SitePurge(Base):
+    """Progress of a deleted site's background purge.
+
+    Not tied to sites by a foreign key, since the site row is the last
+    thing the purge removes.
+    """
+    __tablename__ = "site_purges"
+
+    site_id = Column(UUID(as_uuid=True), primary_key=True)
+    # pending, running, done or failed.
+    status = Column(String(20), default="pending", nullable=False)
+    # Rows removed so far, per table.
+    deleted = Column(JSON, default=dict)
+    error = Column(Text, nullable=True)
+    requested_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,17 @@
+import hashlib
+import json
+from typing import Optional
+
+
+def canonical_patch(patch: Optional[dict]) -> str:
+    """The one serialization a patch is hashed and served in."""
+    return json.dumps(patch or {}, separators=(",", ":"), sort_keys=True)
+
+
+def patch_hash(patch: Optional[dict]) -> str:
+    """SHA-256 of the canonical patch; equal patches share a hash."""
+    return hashlib.sha256(canonical_patch(patch).encode()).hexdigest()
+
+
+def _patch_hash_default(context) -> str:
+    return patch_hash(context.get_current_parameters().get("patch"))
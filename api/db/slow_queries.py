@@ -0,0 +1,189 @@
+"""Opt-in log of slow SQL statements, as JSON lines in a rotating file.
+
+Set ``SLOW_QUERY_LOG_PATH`` to turn it on. Each statement slower than
+``SLOW_QUERY_THRESHOLD_MS`` is logged with its bound parameters, its
+duration and the route of the request that ran it.
+For a sample of the slow SELECTs the plan is captured too: on PostgreSQL
+with ``EXPLAIN (ANALYZE, BUFFERS)``, which runs the statement again and so
+is sampled, and on SQLite with ``EXPLAIN QUERY PLAN``, which does not.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import random
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Longest rendering of a single bound parameter kept in the log.
+MAX_PARAM_LENGTH = 200
+
+# ASGI scope of the request being served, for the calling route.
+current_request: ContextVar[Optional[dict]] = ContextVar("current_request", default=None)
+
+
+class RequestContextMiddleware:
+    """Makes the request's scope available to statements it runs."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_request.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
+
+
+def calling_route() -> Optional[str]:
+    scope = current_request.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f'{scope["method"]} {getattr(route, "path", None) or scope["path"]}'
+
+
+def _loggable(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else str(value)
+    return text if len(text) <= MAX_PARAM_LENGTH else text[:MAX_PARAM_LENGTH] + "..."
+
+
+def loggable_parameters(parameters: Any) -> Any:
+    if isinstance(parameters, dict):
+        return {str(k): _loggable(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [loggable_parameters(p) if isinstance(p, (dict, list, tuple)) else _loggable(p) for p in parameters]
+    return _loggable(parameters)
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        logger: logging.Logger,
+        threshold_ms: float,
+        explain_sample_rate: float,
+        rng: Optional[random.Random] = None,
+    ):
+        self.logger = logger
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.rng = rng or random.Random()
+
+    def install(self, engine: Engine) -> None:
+        """Watch ``engine``'s statements; async engines pass ``.sync_engine``."""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def uninstall(self, engine: Engine) -> None:
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - context._slow_query_start) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+        entry = {
+            "logged_at": datetime.utcnow().isoformat(),
+            "duration_ms": round(elapsed_ms, 3),
+            "route": calling_route(),
+            "dialect": conn.dialect.name,
+            "statement": statement,
+            "parameters": loggable_parameters(parameters),
+            "executemany": executemany,
+            "rowcount": cursor.rowcount,
+        }
+        if self._should_explain(statement, executemany):
+            entry["plan"] = self._explain(conn, statement, parameters)
+        self.logger.warning(json.dumps(entry, default=str))
+
+    def _should_explain(self, statement: str, executemany: bool) -> bool:
+        # EXPLAIN ANALYZE executes the statement, so writes are never replayed.
+        return (
+            not executemany
+            and statement.lstrip()[:6].upper() == "SELECT"
+            and self.rng.random() < self.explain_sample_rate
+        )
+
+    def _explain(self, conn, statement: str, parameters: Any) -> Any:
+        """Plan of a statement just run, read through the raw DBAPI connection.
+
+        A raw cursor fires no engine events, so this is not logged itself.
+        On PostgreSQL the EXPLAIN runs inside a savepoint, so a failure
+        cannot abort the caller's transaction.
+        """
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            prefix = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+        elif dialect == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            return None
+        savepoint = dialect == "postgresql"
+        cursor = conn.connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT slow_query_explain")
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        except Exception as e:
+            if savepoint:
+                try:
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                except Exception:
+                    pass
+            return {"error": str(e)}
+        finally:
+            cursor.close()
+        if dialect == "postgresql":
+            plan = rows[0][0]
+            return json.loads(plan) if isinstance(plan, str) else plan
+        return [row[-1] for row in rows]
+
+
+def file_logger(path: str, max_bytes: int, backups: int, name: str = "evoloop.slow_queries") -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    if not any(isinstance(h, logging.handlers.RotatingFileHandler) for h in logger.handlers):
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(logging.WARNING)
+    return logger
+
+
+def slow_query_log_from_env() -> Optional[SlowQueryLog]:
+    """The log configured by the environment, or None when it is off.
+
+    Read at call time rather than import, after connection.py has loaded
+    .env.local.
+    """
+    # JSON-lines file to write slow statements to; the log is off when unset.
+    path = os.getenv("SLOW_QUERY_LOG_PATH", "")
+    if not path:
+        return None
+    return SlowQueryLog(
+        file_logger(
+            path,
+            max_bytes=int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backups=int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5")),
+        ),
+        threshold_ms=float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200")),
+        # Share of slow SELECTs whose plan is captured.
+        explain_sample_rate=float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1")),
+    )
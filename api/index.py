@@ -1,19 +1,72 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import Response
+from db.connection import async_engine, engine, slow_query_log
+from db.slow_queries import RequestContextMiddleware
 from routes.auth import router as auth_router
 from routes.sites import router as sites_router
 from routes.variants import router as variants_router
 from routes.runtime import router as runtime_router
 from routes.stats import router as stats_router
+from routes.maintenance import router as maintenance_router
+from routes.bundles import router as bundles_router
+from services.event_buffer import EVENT_INGEST_MODE, event_buffer
+from services.metrics import CONTENT_TYPE, METRICS_ENABLED, MetricsMiddleware, instrument_engine, metrics
+from services.prob_best_cache import prob_best_cache
+from services.site_activity import site_activity_tally
+from services.site_cache import site_snapshots
+from services.stats_scheduler import stats_scheduler
+from services.stats_updater import shutdown_posterior_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if EVENT_INGEST_MODE == "buffered":
+        event_buffer.start()
+    site_activity_tally.start()
+    stats_scheduler.start()
+    yield
+    await stats_scheduler.stop()
+    event_buffer.stop()
+    site_activity_tally.stop()
+    shutdown_posterior_pool()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+if slow_query_log is not None:
+    app.add_middleware(RequestContextMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
 
 app.include_router(auth_router)
 app.include_router(sites_router)
 app.include_router(variants_router)
 app.include_router(runtime_router)
 app.include_router(stats_router)
+app.include_router(maintenance_router)
+app.include_router(bundles_router)
 
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok", "service": "evoloop"}
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Request, query and sampler metrics in the Prometheus text format."""
+    if not METRICS_ENABLED:
+        return Response(status_code=404)
+    buffer = event_buffer.metrics()
+    snapshots = site_snapshots.stats()
+    prob_best = prob_best_cache.stats()
+    gauges = {
+        "evoloop_event_buffer_queue_depth": ("Events waiting for the buffered writer.", buffer["queue_depth"]),
+        "evoloop_assign_snapshot_cache_hit_rate": ("Hit rate of the assignment snapshot cache.", snapshots["hit_rate"]),
+        "evoloop_prob_best_cache_hit_rate": ("Hit rate of the prob_best cache.", prob_best["hit_rate"]),
+    }
+    return Response(content=metrics.render(gauges), media_type=CONTENT_TYPE)
@@ -3,9 +3,10 @@ import hashlib
 import os
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_db
+from db import get_async_db
 from db.models import User
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
@@ -35,8 +36,8 @@ class UserResponse(BaseModel):
 
 
 @router.post("/signup", response_model=UserResponse)
-async def signup(request: SignupRequest, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.email == request.email).first()
+async def signup(request: SignupRequest, db: AsyncSession = Depends(get_async_db)):
+    existing = await db.scalar(select(User).where(User.email == request.email))
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -46,15 +47,15 @@ async def signup(request: SignupRequest, db: Session = Depends(get_db)):
         password_hash=hash_password(request.password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     return UserResponse(id=str(user.id), email=user.email)
 
 
 @router.post("/login", response_model=UserResponse)
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.email == request.email))
     if not user or user.password_hash != hash_password(request.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
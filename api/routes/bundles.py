@@ -0,0 +1,61 @@
+import re
+import uuid
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from services import site_bundles
+from services.http_cache import etag_matches
+from services.site_bundles import SITE_BUNDLE_MAX_AGE_SECONDS, bundle_key, current_version, manifest_cache
+
+router = APIRouter(prefix="/v1/bundles", tags=["bundles"])
+
+# Versioned bundle URLs never change content.
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _revalidated(request: Request, etag: str, cache_control: str, body: bytes) -> Response:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _store():
+    if site_bundles.bundle_store is None:
+        raise HTTPException(status_code=404, detail="Bundle publishing is not enabled")
+    return site_bundles.bundle_store
+
+
+@router.get("/manifest")
+async def get_manifest(request: Request):
+    """Current bundle version of every published site."""
+    store = _store()
+    body, etag = await run_in_threadpool(manifest_cache.get, store)
+    return _revalidated(request, etag, f"public, max-age={SITE_BUNDLE_MAX_AGE_SECONDS}", body)
+
+
+@router.get("/{site_id}")
+async def get_current_bundle(site_id: uuid.UUID, request: Request):
+    """The site's live bundle, revalidated by version ETag."""
+    store = _store()
+    site_id = str(site_id)
+    version = current_version(store, site_id)
+    body = store.get(bundle_key(site_id, version)) if version else None
+    if body is None:
+        raise HTTPException(status_code=404, detail="No bundle published for site")
+    return _revalidated(
+        request, f'"{version}"', f"public, max-age={SITE_BUNDLE_MAX_AGE_SECONDS}, must-revalidate", body,
+    )
+
+
+@router.get("/{site_id}/{version}.json")
+async def get_bundle_version(site_id: uuid.UUID, version: str, request: Request):
+    """A specific bundle version; its content never changes."""
+    store = _store()
+    body = None
+    if re.fullmatch(r"[0-9a-f]{20}", version):
+        body = store.get(bundle_key(str(site_id), version))
+    if body is None:
+        raise HTTPException(status_code=404, detail="Bundle not found")
+    return _revalidated(request, f'"{version}"', IMMUTABLE, body)
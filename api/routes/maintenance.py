@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import AsyncSessionLocal, get_async_db
+from services.event_retention import run_event_retention
+from services.site_purge import resume_site_purges
+
+router = APIRouter(prefix="/api/maintenance", tags=["maintenance"])
+
+
+@router.post("/events/retention")
+async def event_retention(db: AsyncSession = Depends(get_async_db)):
+    """Create upcoming event partitions and purge events past retention."""
+    return await run_event_retention(db)
+
+
+@router.post("/sites/purge")
+async def site_purge():
+    """Resume site purges that are pending, failed or stalled."""
+    return {"purges": await resume_site_purges(AsyncSessionLocal)}
@@ -1,66 +1,199 @@
-import uuid
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import json
+from typing import List, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_db
-from db.models import Site, Variant, ExperimentStats, Event
-from schemas.runtime import AssignResponse, EventRequest, EventResponse
+from db import get_async_db
+from db.models import Variant
+from db.patches import canonical_patch
+from schemas.runtime import (
+    AssignResponse, EventRequest, EventResponse, EventReject, EventBatchResponse,
+)
+from services.event_batch import (
+    NDJSON_CONTENT_TYPES, BatchTooLarge, MalformedBatch, check_event_targets, decoded_chunks,
+    iter_validated,
+)
+from services.event_buffer import event_buffer, event_row, insert_events
+from services.http_cache import etag_matches
+from services.metrics import sampler_timer
+from services.site_activity import site_activity_tally
+from services.site_cache import ASSIGN_MODE, site_snapshots, load_site_snapshot
 from services.thompson_sampling import ThompsonSampler
 
 router = APIRouter(prefix="/v1", tags=["runtime"])
 
+# Patches are content-addressed, so a URL's body never changes.
+PATCH_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Assignments are per visitor and change with the posteriors; clients may
+# keep one but must revalidate it.
+ASSIGN_CACHE_CONTROL = "private, no-cache"
+
 
 @router.get("/assign", response_model=AssignResponse)
 async def assign_variant(
     site_id: str,
     visitor_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    inline_patch: bool = True,
+    db: AsyncSession = Depends(get_async_db),
 ):
-    site = db.query(Site).filter(Site.id == uuid.UUID(site_id)).first()
-    if not site or site.status != "running":
-        raise HTTPException(status_code=404, detail="Site not found or not running")
+    """Assign a visitor to a variant.
 
-    variants = (
-        db.query(Variant, ExperimentStats)
-        .join(ExperimentStats, Variant.id == ExperimentStats.variant_id, isouter=True)
-        .filter(Variant.site_id == uuid.UUID(site_id))
-        .filter(Variant.status == "active")
-        .all()
-    )
+    The response carries the variant's patch_hash; with ``inline_patch``
+    false the patch itself is left out and fetched from /v1/patches, where
+    it is cached indefinitely. A repeat request whose If-None-Match matches
+    the assignment gets a bodiless 304.
+    """
+    snapshot = await site_snapshots.get_or_load(site_id, lambda: load_site_snapshot(db, site_id))
+    if not snapshot or snapshot.status != "running":
+        raise HTTPException(status_code=404, detail="Site not found or not running")
 
-    if not variants:
+    if not snapshot.variants:
         raise HTTPException(status_code=404, detail="No active variants")
 
-    variant_data = []
-    for variant, stats in variants:
-        alpha = stats.alpha if stats else 1.0
-        beta = stats.beta if stats else 1.0
-        variant_data.append((str(variant.id), alpha, beta))
+    if ASSIGN_MODE == "allocation" and snapshot.allocation is not None:
+        with sampler_timer("select_allocated"):
+            selected_id = ThompsonSampler.select_allocated(
+                snapshot.allocation,
+                visitor_id,
+                site_id=site_id,
+                version=snapshot.version,
+            )
+    else:
+        with sampler_timer("select_variant"):
+            selected_id = ThompsonSampler.select_variant(
+                list(snapshot.variants),
+                visitor_id,
+                site_id=site_id,
+                version=snapshot.version,
+            )
+
+    hash_ = snapshot.patch_hashes[selected_id]
+    etag = f'"{selected_id}.{hash_[:16]}{"" if inline_patch else ".ref"}"'
+    headers = {"ETag": etag, "Cache-Control": ASSIGN_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Patches are serialized once per snapshot, so the body is spliced
+    # together rather than re-encoded through AssignResponse.
+    body = f'{{"variant_id":{json.dumps(selected_id)},"patch_hash":"{hash_}"'
+    if inline_patch:
+        body += f',"patch":{snapshot.patches[selected_id]}'
+    return Response(content=body + "}", media_type="application/json", headers=headers)
 
-    selected_id = ThompsonSampler.select_variant(variant_data, visitor_id)
 
-    selected_variant = next(v for v, _ in variants if str(v.id) == selected_id)
+@router.get("/patches/{patch_hash}")
+async def get_patch(patch_hash: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """A variant patch by content hash, cacheable forever."""
+    etag = f'"{patch_hash}"'
+    headers = {"ETag": etag, "Cache-Control": PATCH_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
 
-    return AssignResponse(
-        variant_id=selected_id,
-        patch=selected_variant.patch or {},
-    )
+    patch = (await db.execute(
+        select(Variant.patch).where(Variant.patch_hash == patch_hash).limit(1)
+    )).first()
+    if patch is None:
+        raise HTTPException(status_code=404, detail="Patch not found")
+    return Response(content=canonical_patch(patch[0]), media_type="application/json", headers=headers)
 
 
 @router.post("/event", response_model=EventResponse)
 async def record_event(
     request: EventRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    event = Event(
-        id=uuid.uuid4(),
-        site_id=uuid.UUID(request.site_id),
-        variant_id=uuid.UUID(request.variant_id),
-        visitor_id=request.visitor_id,
-        event_type=request.type,
-        event_metadata=request.metadata or {},
-    )
-    db.add(event)
-    db.commit()
+    row = event_row(request)
+    # Checked up front: a buffered row that fails later cannot be reported.
+    [error] = await check_event_targets(db, [row])
+    if error is not None:
+        raise HTTPException(status_code=422, detail=error)
 
+    # The buffer only runs in EVENT_INGEST_MODE=buffered; a full buffer falls
+    # back to a synchronous write rather than dropping the event.
+    if event_buffer.running and event_buffer.put(row):
+        return EventResponse(status="queued")
+
+    await write_events(db, [row])
     return EventResponse(status="recorded")
+
+
+async def write_events(db: AsyncSession, rows: List[dict]) -> None:
+    """Insert and commit ``rows``.
+
+    With the site activity tally running, the rows are counted there only
+    after the commit, so an ingest that rolls back marks no site dirty.
+    """
+    tallied = site_activity_tally.running
+    await db.run_sync(insert_events, rows, not tallied)
+    await db.commit()
+    if tallied:
+        site_activity_tally.add(rows)
+
+
+async def store_events(db: AsyncSession, rows: List[Tuple[int, dict]]) -> List[EventReject]:
+    """Queue (index, row) pairs on the running buffer, writing any overflow
+    directly, and commit.
+
+    The direct write is one bulk insert; if the database refuses it, the
+    rows are written one at a time and those it still refuses are rejected.
+    """
+    if event_buffer.running:
+        rows = [(index, row) for index, row in rows if not event_buffer.put(row)]
+    try:
+        await write_events(db, [row for _, row in rows])
+        return []
+    except (IntegrityError, DataError):
+        await db.rollback()
+
+    rejected = []
+    for index, row in rows:
+        try:
+            await write_events(db, [row])
+        except (IntegrityError, DataError) as e:
+            await db.rollback()
+            rejected.append(EventReject(index=index, error=f"rejected by the database: {e.orig}"))
+    return rejected
+
+
+@router.post("/events", response_model=EventBatchResponse)
+async def record_events(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Record a batch of events sent as a JSON array or an NDJSON stream.
+
+    Gzip bodies are accepted via Content-Encoding. Invalid records, and
+    records for unknown sites or variants, are reported by position and do
+    not fail the rest of the batch.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    chunks = decoded_chunks(request.stream(), gzipped)
+
+    rows = []
+    rejected = []
+    try:
+        async for index, row, error in iter_validated(chunks, content_type in NDJSON_CONTENT_TYPES):
+            if error is not None:
+                rejected.append(EventReject(index=index, error=error))
+            else:
+                rows.append((index, row))
+    except BatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except MalformedBatch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    errors = await check_event_targets(db, [row for _, row in rows])
+    valid = []
+    for (index, row), error in zip(rows, errors):
+        if error is None:
+            valid.append((index, row))
+        else:
+            rejected.append(EventReject(index=index, error=error))
+
+    # Nothing is stored until the whole body has been read, so a rejected
+    # batch leaves no partial writes behind.
+    refused = await store_events(db, valid)
+    rejected = sorted(rejected + refused, key=lambda reject: reject.index)
+
+    return EventBatchResponse(accepted=len(valid) - len(refused), rejected=rejected)
@@ -1,11 +1,21 @@
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-
-from db import get_db
-from db.models import Site
+from datetime import datetime
+from typing import List, Literal, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import AsyncSessionLocal, get_async_db
+from db.models import Site, SitePurge
 from schemas.sites import SiteCreate, SiteUpdate, SiteResponse
+from services.event_export import MEDIA_TYPES, ExportFormatUnavailable, check_format, export_events
+from services.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, InvalidCursor, keyset_page, split_page,
+)
+from services.site_bundles import try_publish_site_bundle
+from services.site_cache import site_snapshots
+from services.site_purge import purge_progress, purge_site
 
 router = APIRouter(prefix="/api/sites", tags=["sites"])
 
@@ -25,8 +35,16 @@ def site_to_response(site: Site) -> SiteResponse:
     )
 
 
+async def get_live_site(db: AsyncSession, site_id: str) -> Site:
+    """The site, or 404 if it does not exist or is being deleted."""
+    site = await db.get(Site, uuid.UUID(site_id))
+    if not site or site.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Site not found")
+    return site
+
+
 @router.post("", response_model=SiteResponse)
-async def create_site(request: SiteCreate, db: Session = Depends(get_db)):
+async def create_site(request: SiteCreate, db: AsyncSession = Depends(get_async_db)):
     site = Site(
         id=uuid.uuid4(),
         user_id=uuid.UUID(request.user_id),
@@ -36,30 +54,47 @@ async def create_site(request: SiteCreate, db: Session = Depends(get_db)):
         approvals_remaining=5,
     )
     db.add(site)
-    db.commit()
-    db.refresh(site)
+    await db.commit()
+    await db.refresh(site)
     return site_to_response(site)
 
 
 @router.get("", response_model=List[SiteResponse])
-async def list_sites(user_id: str, db: Session = Depends(get_db)):
-    sites = db.query(Site).filter(Site.user_id == uuid.UUID(user_id)).all()
+async def list_sites(
+    user_id: str,
+    response: Response,
+    status: Optional[List[str]] = Query(None),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """List a user's sites oldest first, one page at a time.
+
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    query = select(Site).where(Site.user_id == uuid.UUID(user_id), Site.deleted_at.is_(None))
+    if status:
+        query = query.where(Site.status.in_(status))
+    try:
+        query = keyset_page(query, Site, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    sites, next_cursor = split_page(list(await db.scalars(query)), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [site_to_response(s) for s in sites]
 
 
 @router.get("/{site_id}", response_model=SiteResponse)
-async def get_site(site_id: str, db: Session = Depends(get_db)):
-    site = db.query(Site).filter(Site.id == uuid.UUID(site_id)).first()
-    if not site:
-        raise HTTPException(status_code=404, detail="Site not found")
+async def get_site(site_id: str, db: AsyncSession = Depends(get_async_db)):
+    site = await get_live_site(db, site_id)
     return site_to_response(site)
 
 
 @router.patch("/{site_id}", response_model=SiteResponse)
-async def update_site(site_id: str, request: SiteUpdate, db: Session = Depends(get_db)):
-    site = db.query(Site).filter(Site.id == uuid.UUID(site_id)).first()
-    if not site:
-        raise HTTPException(status_code=404, detail="Site not found")
+async def update_site(site_id: str, request: SiteUpdate, db: AsyncSession = Depends(get_async_db)):
+    site = await get_live_site(db, site_id)
 
     if request.status is not None:
         allowed_statuses = {"analyzing", "analyzed", "running"}
@@ -73,17 +108,64 @@ async def update_site(site_id: str, request: SiteUpdate, db: Session = Depends(g
     if request.image_generation_enabled is not None:
         site.image_generation_enabled = 1 if request.image_generation_enabled else 0
 
-    db.commit()
-    db.refresh(site)
+    await db.commit()
+    await db.refresh(site)
+    site_snapshots.invalidate(site_id)
+    await try_publish_site_bundle(db, site_id)
     return site_to_response(site)
 
 
-@router.delete("/{site_id}")
-async def delete_site(site_id: str, db: Session = Depends(get_db)):
-    site = db.query(Site).filter(Site.id == uuid.UUID(site_id)).first()
-    if not site:
-        raise HTTPException(status_code=404, detail="Site not found")
-
-    db.delete(site)
-    db.commit()
-    return {"status": "deleted"}
+@router.delete("/{site_id}", status_code=202)
+async def delete_site(
+    site_id: str,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Soft-delete the site and purge its rows in the background.
+
+    The site disappears from the API at once; its events, rollups, stats,
+    variants and goals are then deleted in chunks. Progress is reported by
+    GET /api/sites/{site_id}/purge.
+    """
+    site = await get_live_site(db, site_id)
+
+    site.status = "deleting"
+    site.deleted_at = datetime.utcnow()
+    db.add(SitePurge(site_id=site.id))
+    await db.commit()
+    site_snapshots.invalidate(site_id)
+    await try_publish_site_bundle(db, site_id)
+
+    background_tasks.add_task(purge_site, AsyncSessionLocal, str(site.id))
+    return {"status": "deleting", "progress": f"/api/sites/{site.id}/purge"}
+
+
+@router.get("/{site_id}/purge")
+async def get_site_purge(site_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Progress of a deleted site's purge."""
+    purge = await db.get(SitePurge, uuid.UUID(site_id))
+    if not purge:
+        raise HTTPException(status_code=404, detail="No purge for site")
+    return purge_progress(purge)
+
+
+@router.get("/{site_id}/events/export")
+async def export_site_events(
+    site_id: str,
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Stream a site's raw events, optionally limited to [since, until)."""
+    site = await get_live_site(db, site_id)
+    try:
+        check_format(format)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    return StreamingResponse(
+        export_events(AsyncSessionLocal, site.id, format, since, until),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="events-{site_id}.{format}"'},
+    )
@@ -1,26 +1,47 @@
+import time
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-
-from db import get_db
-from db.models import Site, Variant, ExperimentStats, Event
-from services.thompson_sampling import ThompsonSampler
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import get_async_db
+from db.connection import AsyncSessionLocal
+from db.models import Site, Variant, ExperimentStats
+from services.event_buffer import EVENT_INGEST_MODE, event_buffer
+from services.event_rollups import site_timeseries
+from services.prob_best_cache import prob_best_cache
+from services.site_bundles import try_publish_site_bundle
+from services.site_cache import site_snapshots
+from services.site_activity import dirty_sites_query, site_activity_tally
+from services.stats_scheduler import is_due, stats_scheduler
+from services.stats_updater import (
+    STATS_UPDATE_CONCURRENCY, posterior_pool, recompute_site_stats, update_sites,
+)
+from services.thompson_sampling import posterior_version
 
 router = APIRouter(prefix="/api/stats", tags=["stats"])
 
 
 @router.get("/site/{site_id}")
-async def get_site_stats(site_id: str, db: Session = Depends(get_db)):
-    """Get statistics for all variants of a site."""
-    variants = (
-        db.query(Variant, ExperimentStats)
+async def get_site_stats(
+    site_id: str,
+    use_stored: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get statistics for all variants of a site.
+
+    With ``use_stored`` the persisted prob_best is served as long as the
+    active arms' posteriors still match the ones it was computed from;
+    otherwise it comes from prob_best_cache.
+    """
+    variants = (await db.execute(
+        select(Variant, ExperimentStats)
         .join(ExperimentStats, Variant.id == ExperimentStats.variant_id, isouter=True)
-        .filter(Variant.site_id == uuid.UUID(site_id))
-        .filter(Variant.status.in_(["active", "pending_review"]))
-        .all()
-    )
+        .where(Variant.site_id == uuid.UUID(site_id))
+        .where(Variant.status.in_(["active", "pending_review"]))
+    )).all()
 
     if not variants:
         raise HTTPException(status_code=404, detail="No variants found")
@@ -31,7 +52,14 @@ async def get_site_stats(site_id: str, db: Session = Depends(get_db)):
         for v, s in variants
         if v.status == "active"
     ]
-    prob_best = ThompsonSampler.calculate_prob_best(active_variants) if active_variants else {}
+    prob_best = {}
+    if active_variants:
+        version = posterior_version(active_variants)
+        stored = [s for v, s in variants if v.status == "active"]
+        if use_stored and all(s and s.prob_best_version == version for s in stored):
+            prob_best = {str(s.variant_id): s.prob_best for s in stored}
+        else:
+            prob_best = prob_best_cache.get(active_variants).probabilities
 
     result = []
     for variant, stats in variants:
@@ -48,79 +76,104 @@ async def get_site_stats(site_id: str, db: Session = Depends(get_db)):
     return result
 
 
+@router.get("/site/{site_id}/timeseries")
+async def get_site_timeseries(
+    site_id: str,
+    hours: int = Query(168, ge=1, le=24 * 366),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Hourly impressions and conversions per variant, read from the rollups."""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return await site_timeseries(db, site_id, since=since)
+
+
 @router.post("/update/{site_id}")
-async def update_site_stats(site_id: str, db: Session = Depends(get_db)):
-    """Recalculate statistics for a site's variants from events."""
-    variants = db.query(Variant).filter(
-        Variant.site_id == uuid.UUID(site_id),
-        Variant.status == "active"
-    ).all()
-
-    updated = []
-    for variant in variants:
-        # Count impressions and conversions
-        impressions = db.query(func.count(Event.id)).filter(
-            Event.variant_id == variant.id,
-            Event.event_type == "impression"
-        ).scalar()
-
-        conversions = db.query(func.count(Event.id)).filter(
-            Event.variant_id == variant.id,
-            Event.event_type == "conversion"
-        ).scalar()
-
-        # Get or create stats
-        stats = db.query(ExperimentStats).filter(
-            ExperimentStats.variant_id == variant.id
-        ).first()
-
-        if not stats:
-            stats = ExperimentStats(variant_id=variant.id)
-            db.add(stats)
-
-        stats.visitors = impressions
-        stats.conversions = conversions
-        stats.alpha = 1.0 + conversions
-        stats.beta = 1.0 + (impressions - conversions)
-
-        updated.append(str(variant.id))
-
-    db.commit()
-
-    # Recalculate prob_best
-    variant_data = []
-    for variant in variants:
-        stats = db.query(ExperimentStats).filter(
-            ExperimentStats.variant_id == variant.id
-        ).first()
-        if stats:
-            variant_data.append((str(variant.id), stats.alpha, stats.beta))
-
-    prob_best = ThompsonSampler.calculate_prob_best(variant_data)
-
-    for variant_id, prob in prob_best.items():
-        stats = db.query(ExperimentStats).filter(
-            ExperimentStats.variant_id == uuid.UUID(variant_id)
-        ).first()
-        if stats:
-            stats.prob_best = prob
-
-    db.commit()
-
-    return {"updated": updated, "prob_best": prob_best}
+async def update_site_stats(site_id: str, full: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """Recompute a site's statistics from its hourly event rollups.
+
+    With ``full`` the rollups are rebuilt from the raw events first, which
+    repairs them after events were backfilled or deleted. Only hours inside
+    the event retention window are rebuilt, so purged history is kept.
+    """
+    result = await recompute_site_stats(db, site_id, full=full)
+    site_snapshots.invalidate(site_id)
+    publish_error = await try_publish_site_bundle(db, site_id)
+    if publish_error is not None:
+        result["publish_error"] = publish_error
+    return result
 
 
 @router.post("/update-all")
-async def update_all_stats(db: Session = Depends(get_db)):
-    """Update statistics for all running sites."""
-    sites = db.query(Site).filter(Site.status == "running").all()
-
-    results = []
-    for site in sites:
-        try:
-            result = await update_site_stats(str(site.id), db)
-            results.append({"site_id": str(site.id), "status": "success", **result})
-        except Exception as e:
-            results.append({"site_id": str(site.id), "status": "error", "error": str(e)})
-
-    return {"sites_updated": len(results), "results": results}
+async def update_all_stats(
+    concurrency: Optional[int] = Query(None, ge=1, le=64),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Update statistics for all running sites, several at a time."""
+    start = time.perf_counter()
+    site_ids = [str(site_id) for site_id in await db.scalars(select(Site.id).where(Site.status == "running"))]
+    concurrency = concurrency or STATS_UPDATE_CONCURRENCY
+
+    results = await update_sites(
+        site_ids,
+        AsyncSessionLocal,
+        concurrency=concurrency,
+        pool=posterior_pool(),
+        publish=True,
+    )
+
+    return {
+        "sites_updated": len(results),
+        "concurrency": concurrency,
+        "duration_ms": (time.perf_counter() - start) * 1000,
+        "results": results,
+    }
+
+
+@router.post("/update-dirty")
+async def update_dirty_stats():
+    """Recompute only the sites with new events that are due: hot or stale."""
+    return await stats_scheduler.run_once()
+
+
+@router.get("/scheduler")
+async def get_scheduler_status(
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Scheduler counters, queue depth and the stalest dirty sites."""
+    now = datetime.utcnow()
+    dirty = (await db.scalars(dirty_sites_query())).all()
+    sites = [
+        {
+            "site_id": str(activity.site_id),
+            "pending_events": activity.pending_events,
+            "dirty_since": activity.dirty_since,
+            "staleness_seconds": (now - activity.dirty_since).total_seconds(),
+            "last_event_at": activity.last_event_at,
+            "last_recomputed_at": activity.last_recomputed_at,
+            "due": is_due(activity, now),
+        }
+        for activity in dirty
+    ]
+    return {
+        **stats_scheduler.metrics(),
+        "queue_depth": len(sites),
+        "due": sum(1 for site in sites if site["due"]),
+        "sites": sites[:limit],
+    }
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Hit/miss counters for the in-process assignment and prob_best caches."""
+    return {"assign_snapshots": site_snapshots.stats(), "prob_best": prob_best_cache.stats()}
+
+
+@router.get("/ingest")
+async def get_ingest_stats():
+    """Queue depth and flush latency of the buffered event writer."""
+    return {
+        "mode": EVENT_INGEST_MODE,
+        **event_buffer.metrics(),
+        "site_activity": site_activity_tally.metrics(),
+    }
@@ -1,12 +1,19 @@
 import uuid
 from datetime import datetime
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
-from db import get_db
+from db import get_async_db
 from db.models import Variant, Site, ExperimentStats
 from schemas.variants import VariantCreate, VariantUpdate, VariantResponse, VariantDiff
+from services.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, InvalidCursor, keyset_page, split_page,
+)
+from services.site_bundles import try_publish_site_bundle
+from services.site_cache import site_snapshots
 
 router = APIRouter(tags=["variants"])
 
@@ -37,22 +44,50 @@ def variant_to_response(variant: Variant) -> VariantResponse:
 
 
 @router.get("/api/sites/{site_id}/variants", response_model=List[VariantResponse])
-async def list_variants(site_id: str, db: Session = Depends(get_db)):
-    variants = db.query(Variant).filter(Variant.site_id == uuid.UUID(site_id)).all()
+async def list_variants(
+    site_id: str,
+    response: Response,
+    status: Optional[List[str]] = Query(None),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """List a site's variants oldest first, with stats joined in one query.
+
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    query = (
+        select(Variant)
+        .join(Site, Site.id == Variant.site_id)
+        .options(joinedload(Variant.stats))
+        .where(Variant.site_id == uuid.UUID(site_id), Site.deleted_at.is_(None))
+    )
+    if status:
+        query = query.where(Variant.status.in_(status))
+    try:
+        query = keyset_page(query, Variant, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    variants, next_cursor = split_page(list(await db.scalars(query)), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [variant_to_response(v) for v in variants]
 
 
 @router.post("/api/variants", response_model=VariantResponse)
-async def create_variant(request: VariantCreate, db: Session = Depends(get_db)):
-    site = db.query(Site).filter(Site.id == uuid.UUID(request.site_id)).first()
-    if not site:
+async def create_variant(request: VariantCreate, db: AsyncSession = Depends(get_async_db)):
+    site = await db.get(Site, uuid.UUID(request.site_id))
+    if not site or site.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Site not found")
 
     has_active = (
-        db.query(Variant)
-        .filter(Variant.site_id == uuid.UUID(request.site_id))
-        .filter(Variant.status == "active")
-        .first()
+        await db.scalar(
+            select(Variant.id)
+            .where(Variant.site_id == uuid.UUID(request.site_id))
+            .where(Variant.status == "active")
+            .limit(1)
+        )
         is not None
     )
 
@@ -68,30 +103,29 @@ async def create_variant(request: VariantCreate, db: Session = Depends(get_db)):
         generation_reasoning=request.generation_reasoning,
         status=status,
     )
+    variant.stats = ExperimentStats(
+        variant_id=variant.id,
+        visitors=0,
+        conversions=0,
+        alpha=1.0,
+        beta=1.0,
+        prob_best=0.0,
+    )
     db.add(variant)
-    db.commit()
-    db.refresh(variant)
-
-    stats = db.query(ExperimentStats).filter(ExperimentStats.variant_id == variant.id).first()
-    if not stats:
-        db.add(
-            ExperimentStats(
-                variant_id=variant.id,
-                visitors=0,
-                conversions=0,
-                alpha=1.0,
-                beta=1.0,
-                prob_best=0.0,
-            )
-        )
-        db.commit()
+    await db.commit()
 
+    site_snapshots.invalidate(request.site_id)
+    await try_publish_site_bundle(db, request.site_id)
     return variant_to_response(variant)
 
 
 @router.patch("/api/variants/{variant_id}", response_model=VariantResponse)
-async def update_variant(variant_id: str, request: VariantUpdate, db: Session = Depends(get_db)):
-    variant = db.query(Variant).filter(Variant.id == uuid.UUID(variant_id)).first()
+async def update_variant(variant_id: str, request: VariantUpdate, db: AsyncSession = Depends(get_async_db)):
+    variant = await db.scalar(
+        select(Variant)
+        .options(joinedload(Variant.stats))
+        .where(Variant.id == uuid.UUID(variant_id))
+    )
     if not variant:
         raise HTTPException(status_code=404, detail="Variant not found")
 
@@ -100,15 +134,16 @@ async def update_variant(variant_id: str, request: VariantUpdate, db: Session =
         if request.status == "killed":
             variant.killed_at = datetime.utcnow()
 
-    db.commit()
-    db.refresh(variant)
+    await db.commit()
+    site_snapshots.invalidate(str(variant.site_id))
+    await try_publish_site_bundle(db, variant.site_id)
     return variant_to_response(variant)
 
 
 @router.get("/api/variants/{variant_a}/diff/{variant_b}", response_model=VariantDiff)
-async def get_variant_diff(variant_a: str, variant_b: str, db: Session = Depends(get_db)):
-    v_a = db.query(Variant).filter(Variant.id == uuid.UUID(variant_a)).first()
-    v_b = db.query(Variant).filter(Variant.id == uuid.UUID(variant_b)).first()
+async def get_variant_diff(variant_a: str, variant_b: str, db: AsyncSession = Depends(get_async_db)):
+    v_a = await db.get(Variant, uuid.UUID(variant_a))
+    v_b = await db.get(Variant, uuid.UUID(variant_b))
 
     if not v_a or not v_b:
         raise HTTPException(status_code=404, detail="Variant not found")
@@ -1,9 +1,9 @@
 from .sites import SiteCreate, SiteUpdate, SiteResponse
 from .variants import VariantUpdate, VariantResponse, VariantDiff
-from .runtime import AssignResponse, EventRequest, EventResponse
+from .runtime import AssignResponse, EventRequest, EventResponse, EventReject, EventBatchResponse
 
 __all__ = [
     "SiteCreate", "SiteUpdate", "SiteResponse",
     "VariantUpdate", "VariantResponse", "VariantDiff",
-    "AssignResponse", "EventRequest", "EventResponse",
+    "AssignResponse", "EventRequest", "EventResponse", "EventReject", "EventBatchResponse",
 ]
@@ -1,10 +1,12 @@
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 
 class AssignResponse(BaseModel):
     variant_id: str
-    patch: Dict[str, Any]
+    patch_hash: str
+    # Omitted with inline_patch=false; fetch /v1/patches/{patch_hash} instead.
+    patch: Optional[Dict[str, Any]] = None
 
 
 class EventRequest(BaseModel):
@@ -17,3 +19,13 @@ class EventRequest(BaseModel):
 
 class EventResponse(BaseModel):
     status: str
+
+
+class EventReject(BaseModel):
+    index: int
+    error: str
+
+
+class EventBatchResponse(BaseModel):
+    accepted: int
+    rejected: List[EventReject]
@@ -1,3 +1,3 @@
-from .thompson_sampling import ThompsonSampler
+from .thompson_sampling import ThompsonSampler, ProbBestEstimate, posterior_version
 
-__all__ = ["ThompsonSampler"]
+__all__ = ["ThompsonSampler", "ProbBestEstimate", "posterior_version"]
@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import Variant
+from schemas.runtime import EventRequest
+from services.event_buffer import event_row
+from services.site_cache import load_site_snapshot, site_snapshots
+
+EVENT_BATCH_MAX_RECORDS = int(os.getenv("EVENT_BATCH_MAX_RECORDS", "5000"))
+EVENT_BATCH_MAX_BYTES = int(os.getenv("EVENT_BATCH_MAX_BYTES", str(10 * 1024 * 1024)))
+# Variants remembered outside the site snapshots, see VariantOwners.
+EVENT_VARIANT_CACHE_SIZE = int(os.getenv("EVENT_VARIANT_CACHE_SIZE", "10000"))
+
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+
+class BatchTooLarge(Exception):
+    pass
+
+
+class MalformedBatch(Exception):
+    pass
+
+
+async def decoded_chunks(
+    chunks: AsyncIterator[bytes],
+    gzipped: bool,
+    max_bytes: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """Yield the body, gunzipped if needed, failing past ``max_bytes``."""
+    if max_bytes is None:
+        max_bytes = EVENT_BATCH_MAX_BYTES
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    remaining = max_bytes
+    async for chunk in chunks:
+        if decompressor is not None:
+            try:
+                # Asking for one byte over the limit bounds gzip bombs.
+                chunk = decompressor.decompress(chunk, remaining + 1)
+            except zlib.error as e:
+                raise MalformedBatch(f"Invalid gzip body: {e}")
+        remaining -= len(chunk)
+        if remaining < 0:
+            raise BatchTooLarge(f"Body exceeds {max_bytes} bytes")
+        if chunk:
+            yield chunk
+    if decompressor is not None:
+        tail = decompressor.flush()
+        if len(tail) > remaining:
+            raise BatchTooLarge(f"Body exceeds {max_bytes} bytes")
+        if tail:
+            yield tail
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yield (index, line) for each non-blank line as it arrives."""
+    pending = b""
+    index = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, line
+                index += 1
+    if pending.strip():
+        yield index, pending
+
+
+def array_records(body: bytes) -> Iterator[Tuple[int, object]]:
+    try:
+        records = json.loads(body)
+    except ValueError as e:
+        raise MalformedBatch(f"Invalid JSON body: {e}")
+    if not isinstance(records, list):
+        raise MalformedBatch("Expected a JSON array of events")
+    return enumerate(records)
+
+
+def validate_record(record) -> Tuple[Optional[dict], Optional[str]]:
+    """Turn one raw record into an event row, or return why it was rejected."""
+    try:
+        if isinstance(record, (bytes, str)):
+            request = EventRequest.model_validate_json(record)
+        else:
+            request = EventRequest.model_validate(record)
+        return event_row(request), None
+    except ValidationError as e:
+        return None, "; ".join(
+            f"{'.'.join(str(p) for p in err['loc']) or 'record'}: {err['msg']}"
+            for err in e.errors()
+        )
+    except ValueError as e:
+        return None, str(e)
+
+
+class VariantOwners:
+    """Bounded LRU of variant id -> owning site id, None for unknown ids.
+
+    Covers the variants a site snapshot does not list: killed or paused
+    ones whose assigned visitors still send events, ones created since the
+    snapshot was loaded, and made-up ids. A variant never changes site, so
+    entries need no expiry.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, variant_id: str) -> Tuple[bool, Optional[str]]:
+        with self._lock:
+            if variant_id not in self._entries:
+                return False, None
+            self._entries.move_to_end(variant_id)
+            return True, self._entries[variant_id]
+
+    def put(self, variant_id: str, site_id: Optional[str]) -> None:
+        with self._lock:
+            self._entries[variant_id] = site_id
+            self._entries.move_to_end(variant_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+variant_owners = VariantOwners(max_entries=EVENT_VARIANT_CACHE_SIZE)
+
+
+async def check_event_targets(db: AsyncSession, rows: List[dict]) -> List[Optional[str]]:
+    """Per row, why its site or variant cannot take events, or None.
+
+    The site must exist and not be deleted, and the variant must belong to
+    it, whatever its status. Sites and their active variants come from the
+    snapshots /v1/assign serves from, so a warm site costs no queries; any
+    other variant is looked up once, in one query per call, and remembered
+    in ``variant_owners``.
+    """
+    # Active variant ids per site; None for a site that does not exist.
+    active: Dict[str, Optional[Set[str]]] = {}
+    for row in rows:
+        site_id = str(row["site_id"])
+        if site_id not in active:
+            snapshot = await site_snapshots.get_or_load(site_id, lambda: load_site_snapshot(db, site_id))
+            active[site_id] = None if snapshot is None else {variant[0] for variant in snapshot.variants}
+
+    owners: Dict[str, Optional[str]] = {}
+    missing = set()
+    for row in rows:
+        site_id, variant_id = str(row["site_id"]), str(row["variant_id"])
+        if active[site_id] is None or variant_id in active[site_id] or variant_id in owners:
+            continue
+        cached, owner = variant_owners.lookup(variant_id)
+        if cached:
+            owners[variant_id] = owner
+        else:
+            missing.add(variant_id)
+    if missing:
+        found = dict((await db.execute(
+            select(Variant.id, Variant.site_id).where(Variant.id.in_([uuid.UUID(v) for v in missing]))
+        )).all())
+        for variant_id in missing:
+            owner = found.get(uuid.UUID(variant_id))
+            owners[variant_id] = None if owner is None else str(owner)
+            variant_owners.put(variant_id, owners[variant_id])
+
+    errors: List[Optional[str]] = []
+    for row in rows:
+        site_id, variant_id = str(row["site_id"]), str(row["variant_id"])
+        if active[site_id] is None:
+            errors.append("site_id: unknown or deleted site")
+        elif variant_id not in active[site_id] and owners[variant_id] != site_id:
+            errors.append("variant_id: not a variant of this site")
+        else:
+            errors.append(None)
+    return errors
+
+
+async def iter_validated(
+    chunks: AsyncIterator[bytes],
+    ndjson: bool,
+    max_records: Optional[int] = None,
+) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (index, row, error) for every record in the body."""
+    if max_records is None:
+        max_records = EVENT_BATCH_MAX_RECORDS
+    if ndjson:
+        records = ndjson_records(chunks)
+    else:
+        body = b"".join([chunk async for chunk in chunks])
+        records = _as_async(array_records(body))
+
+    async for index, record in records:
+        if index >= max_records:
+            raise BatchTooLarge(f"Batch exceeds {max_records} events")
+        row, error = validate_record(record)
+        yield index, row, error
+
+
+async def _as_async(items: Iterator) -> AsyncIterator:
+    for item in items:
+        yield item
@@ -0,0 +1,257 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from db.connection import SessionLocal
+from db.ids import uuid7
+from db.models import Event
+from schemas.runtime import EventRequest
+from services.event_rollups import record_rollups
+from services.site_activity import record_site_activity
+
+logger = logging.getLogger(__name__)
+
+# "sync" commits every event in its request; "buffered" queues events for the
+# background flusher and trades durability of the last few seconds for
+# throughput.
+EVENT_INGEST_MODE = os.getenv("EVENT_INGEST_MODE", "sync")
+EVENT_BUFFER_MAX_SIZE = int(os.getenv("EVENT_BUFFER_MAX_SIZE", "10000"))
+EVENT_BUFFER_BATCH_SIZE = int(os.getenv("EVENT_BUFFER_BATCH_SIZE", "500"))
+EVENT_BUFFER_FLUSH_INTERVAL_SECONDS = float(os.getenv("EVENT_BUFFER_FLUSH_INTERVAL_SECONDS", "1.0"))
+# Flush attempts a batch gets when the database is unavailable before its
+# events are dropped.
+EVENT_BUFFER_MAX_ATTEMPTS = int(os.getenv("EVENT_BUFFER_MAX_ATTEMPTS", "5"))
+
+
+def event_row(request: EventRequest) -> dict:
+    return {
+        "id": uuid7(),
+        "site_id": uuid.UUID(request.site_id),
+        "variant_id": uuid.UUID(request.variant_id),
+        "visitor_id": request.visitor_id,
+        "event_type": request.type,
+        "event_metadata": request.metadata or {},
+        "created_at": datetime.utcnow(),
+    }
+
+
+def insert_events(db: Session, rows: List[dict], record_activity: bool = True) -> None:
+    """Bulk insert event rows, fold them into the hourly rollups and mark their sites dirty.
+
+    Callers passing ``record_activity=False`` add the rows to a running
+    site activity tally once their transaction has committed.
+    """
+    if rows:
+        db.execute(insert(Event), rows)
+        record_rollups(db, rows)
+        if record_activity:
+            record_site_activity(db, rows)
+
+
+class EventBuffer:
+    """Bounded in-memory queue of event rows written by a background thread.
+
+    The flusher wakes when ``batch_size`` rows are queued or every
+    ``flush_interval`` seconds, and writes each batch with one bulk insert.
+    A batch the database rejects is bisected until only the offending rows
+    are dropped; one that fails for any other reason, such as an outage, is
+    retried on later flushes up to ``max_attempts`` times.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        max_attempts: int = EVENT_BUFFER_MAX_ATTEMPTS,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        # (attempts so far, rows) of batches waiting to be written again.
+        self._retries: Deque[Tuple[int, List[dict]]] = deque()
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_size)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.retried = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def put(self, row: dict) -> bool:
+        """Queue a row; returns False when the buffer is full."""
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        """Write everything currently queued, one bulk insert per batch.
+
+        Returns the number of rows settled, written or dropped. Stops early
+        when a batch has to be retried, leaving the rest for the next flush.
+        """
+        settled = 0
+        with self._flush_lock:
+            # Retried batches go first, so events land roughly in order.
+            while self._retries:
+                attempts, batch = self._retries.popleft()
+                if not self._write(batch, attempts):
+                    return settled
+                settled += len(batch)
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return settled
+                if not self._write(batch):
+                    return settled
+                settled += len(batch)
+
+    def _drain(self) -> List[dict]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[dict], attempts: int = 0) -> bool:
+        """Write a batch; False if part of it was queued for a retry."""
+        start = time.perf_counter()
+        unwritten = self._insert(batch)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+
+        if not unwritten:
+            return True
+        attempts += 1
+        if attempts >= self.max_attempts:
+            self.failed += len(unwritten)
+            logger.error("Dropping %d buffered events after %d attempts", len(unwritten), attempts)
+            return True
+        self.retried += len(unwritten)
+        self._retries.append((attempts, unwritten))
+        return False
+
+    def _insert(self, batch: List[dict]) -> List[dict]:
+        """Insert ``batch``, bisecting around rows the database rejects.
+
+        Rows that fail on their own are dropped. On any other error the
+        rows not yet committed are returned, in order, for a retry.
+        """
+        pending = [batch]
+        while pending:
+            part = pending.pop()
+            db = self.session_factory()
+            try:
+                insert_events(db, part)
+                db.commit()
+                self.flushed += len(part)
+            except (IntegrityError, DataError):
+                db.rollback()
+                if len(part) == 1:
+                    self.failed += 1
+                    logger.exception("Dropping buffered event %s", part[0].get("id"))
+                else:
+                    middle = len(part) // 2
+                    pending.extend([part[middle:], part[:middle]])
+            except Exception:
+                db.rollback()
+                logger.exception("Failed to flush %d buffered events", len(part))
+                return part + [row for rest in reversed(pending) for row in rest]
+            finally:
+                db.close()
+        return []
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="event-buffer-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher and write whatever is still queued."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+            atexit.unregister(self.stop)
+        self.flush()
+        # Nothing will flush again, so anything left behind a retry is lost.
+        lost = sum(len(batch) for _, batch in self._retries)
+        self._retries.clear()
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            lost += len(batch)
+        if lost:
+            self.failed += lost
+            logger.error("Dropping %d buffered events at shutdown", lost)
+
+    def metrics(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "max_size": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "retried": self.retried,
+            "retry_depth": sum(len(batch) for _, batch in self._retries),
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0,
+        }
+
+
+event_buffer = EventBuffer(
+    session_factory=SessionLocal,
+    max_size=EVENT_BUFFER_MAX_SIZE,
+    batch_size=EVENT_BUFFER_BATCH_SIZE,
+    flush_interval=EVENT_BUFFER_FLUSH_INTERVAL_SECONDS,
+)
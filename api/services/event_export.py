@@ -0,0 +1,240 @@
+"""Stream a site's raw events out as NDJSON, CSV or Parquet.
+
+Rows are read through a server-side cursor in batches of EXPORT_BATCH_SIZE
+and encoded batch by batch, so memory stays flat however many events match.
+
+Usage (from api/):
+    python -m services.event_export --site-id ID [--format ndjson|csv|parquet]
+        [--since ISO] [--until ISO] [--output PATH]
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+
+from db.models import Event
+
+# Rows fetched from the cursor and encoded per chunk; also the Parquet row
+# group size.
+EXPORT_BATCH_SIZE = int(os.getenv("EVENTS_EXPORT_BATCH_SIZE", "5000"))
+
+COLUMNS = ["id", "site_id", "variant_id", "visitor_id", "event_type", "event_metadata", "created_at"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportFormatUnavailable(RuntimeError):
+    pass
+
+
+def export_query(site_id: uuid.UUID, since: Optional[datetime], until: Optional[datetime]):
+    query = select(*(getattr(Event, c) for c in COLUMNS)).where(Event.site_id == site_id)
+    if since is not None:
+        query = query.where(Event.created_at >= since)
+    if until is not None:
+        query = query.where(Event.created_at < until)
+    # No ORDER BY: sorting a large range would make the database buffer it
+    # before the first row is sent.
+    return query
+
+
+async def event_batches(
+    session_factory,
+    site_id: uuid.UUID,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[List[dict]]:
+    """Yield events as lists of plain dicts, ``batch_size`` at a time.
+
+    A session of its own is held for the whole stream, since a response
+    body outlives the request's session.
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    async with session_factory() as db:
+        result = await db.stream(
+            export_query(site_id, since, until).execution_options(yield_per=batch_size)
+        )
+        async for rows in result.mappings().partitions():
+            yield [_plain(row) for row in rows]
+
+
+def _plain(row) -> dict:
+    return {
+        "id": str(row["id"]),
+        "site_id": str(row["site_id"]),
+        "variant_id": str(row["variant_id"]) if row["variant_id"] else None,
+        "visitor_id": row["visitor_id"],
+        "event_type": row["event_type"],
+        "event_metadata": row["event_metadata"] or {},
+        "created_at": row["created_at"],
+    }
+
+
+def _text_row(row: dict) -> dict:
+    return {**row, "created_at": row["created_at"].isoformat()}
+
+
+async def ndjson_chunks(batches: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield "".join(
+            json.dumps(_text_row(row), separators=(",", ":")) + "\n" for row in batch
+        ).encode()
+
+
+async def csv_chunks(batches: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    async for batch in batches:
+        for row in batch:
+            writer.writerow({**_text_row(row), "event_metadata": json.dumps(row["event_metadata"])})
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.string()),
+        ("site_id", pa.string()),
+        ("variant_id", pa.string()),
+        ("visitor_id", pa.string()),
+        ("event_type", pa.string()),
+        ("event_metadata", pa.string()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+
+async def parquet_chunks(batches: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    """One row group per batch, flushed to the caller as soon as it is written."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ExportFormatUnavailable("Parquet export requires pyarrow") from e
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for batch in batches:
+            columns = {c: [row[c] for row in batch] for c in COLUMNS}
+            columns["event_metadata"] = [json.dumps(m) for m in columns["event_metadata"]]
+            writer.write_table(pa.table(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS: Dict[str, Callable[[AsyncIterator[List[dict]]], AsyncIterator[bytes]]] = {
+    "ndjson": ndjson_chunks,
+    "csv": csv_chunks,
+    "parquet": parquet_chunks,
+}
+
+
+def check_format(fmt: str) -> None:
+    """Fail before any bytes are sent if ``fmt`` cannot be produced here."""
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ExportFormatUnavailable("Parquet export requires pyarrow") from e
+
+
+def export_events(
+    session_factory,
+    site_id: uuid.UUID,
+    fmt: str = "ndjson",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    check_format(fmt)
+    return ENCODERS[fmt](event_batches(session_factory, site_id, since, until, batch_size))
+
+
+async def write_export(out, session_factory, site_id: uuid.UUID, fmt: str, **kwargs) -> int:
+    written = 0
+    async for chunk in export_events(session_factory, site_id, fmt, **kwargs):
+        out.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--site-id", required=True, type=uuid.UUID)
+    parser.add_argument("--format", dest="fmt", choices=sorted(ENCODERS), default="ndjson")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--output", help="File to write; standard output by default")
+    args = parser.parse_args()
+
+    from db.connection import AsyncSessionLocal, async_engine
+
+    async def run(out) -> int:
+        try:
+            return await write_export(
+                out, AsyncSessionLocal, args.site_id, args.fmt,
+                since=args.since, until=args.until, batch_size=args.batch_size,
+            )
+        finally:
+            await async_engine.dispose()
+
+    if args.output:
+        with open(args.output, "wb") as out:
+            written = asyncio.run(run(out))
+        print(f"Wrote {written} bytes to {args.output}", file=sys.stderr)
+    else:
+        asyncio.run(run(sys.stdout.buffer))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import os
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import Event
+
+# Monthly partitions created ahead of the current month.
+EVENTS_PARTITION_MONTHS_AHEAD = int(os.getenv("EVENTS_PARTITION_MONTHS_AHEAD", "3"))
+# Raw events older than this are purged; 0 keeps everything. Stats survive
+# the purge because they are summed from the hourly rollups, and rollup
+# rebuilds leave the hours before the cutoff alone (see retained_since).
+EVENTS_RETENTION_DAYS = int(os.getenv("EVENTS_RETENTION_DAYS", "395"))
+# "drop" deletes expired partitions; "archive" moves them to the
+# events_archive schema for export before they are dropped by hand.
+EVENTS_RETENTION_ACTION = os.getenv("EVENTS_RETENTION_ACTION", "drop")
+# Rows per DELETE when events are not partitioned (SQLite, older schemas),
+# and when trimming the DEFAULT partition of a partitioned table.
+EVENTS_PURGE_CHUNK_SIZE = int(os.getenv("EVENTS_PURGE_CHUNK_SIZE", "10000"))
+
+ARCHIVE_SCHEMA = "events_archive"
+_PARTITION_NAME = re.compile(r"^events_p(\d{4})(\d{2})$")
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"events_p{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[datetime]:
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1)
+
+
+def retained_since(now: Optional[datetime] = None, retention_days: Optional[int] = None) -> Optional[datetime]:
+    """Start of the first hour the purge leaves whole, or None with retention off.
+
+    Rollups before it may count events that are gone, so they must not be
+    recounted from the raw events.
+    """
+    retention_days = EVENTS_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return None
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    hour = cutoff.replace(minute=0, second=0, microsecond=0)
+    return hour if hour == cutoff else hour + timedelta(hours=1)
+
+
+async def is_partitioned(db: AsyncSession) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(await db.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'events' AND c.relnamespace = current_schema()::regnamespace)"
+    )))
+
+
+async def list_event_partitions(db: AsyncSession) -> List[Tuple[str, datetime]]:
+    """Monthly partitions attached to events, oldest first."""
+    names = await db.scalars(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'events'::regclass"
+    ))
+    partitions = [(name, partition_month(name)) for name in names]
+    return sorted((p for p in partitions if p[1] is not None), key=lambda p: p[1])
+
+
+async def default_partition(db: AsyncSession) -> Optional[str]:
+    """The DEFAULT partition of events, if it has one."""
+    return await db.scalar(text(
+        "SELECT c.relname FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partdefid "
+        "WHERE p.partrelid = 'events'::regclass"
+    ))
+
+
+async def create_event_partition(db: AsyncSession, month: datetime, default: Optional[str]) -> None:
+    """Create ``month``'s partition, taking over its rows from ``default``.
+
+    Postgres refuses a new partition while the default one holds rows in
+    its range, which is always the case for create_all schemas, where the
+    default is the only partition. Those rows are moved across with the
+    default detached, all in the caller's transaction.
+    """
+    name = partition_name(month)
+    lower, upper = f"{month:%Y-%m-%d}", f"{add_months(month, 1):%Y-%m-%d}"
+    in_range = f"created_at >= '{lower}' AND created_at < '{upper}'"
+    stranded = default is not None and await db.scalar(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})"
+    ))
+    if stranded:
+        await db.execute(text(f"ALTER TABLE events DETACH PARTITION {default}"))
+    await db.execute(text(
+        f"CREATE TABLE {name} PARTITION OF events FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    ))
+    if stranded:
+        columns = ", ".join(column.name for column in Event.__table__.columns)
+        await db.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {default} WHERE {in_range}"))
+        await db.execute(text(f"DELETE FROM {default} WHERE {in_range}"))
+        await db.execute(text(f"ALTER TABLE events ATTACH PARTITION {default} DEFAULT"))
+
+
+async def ensure_event_partitions(
+    db: AsyncSession,
+    now: Optional[datetime] = None,
+    months_ahead: Optional[int] = None,
+) -> List[str]:
+    """Create any missing partitions from this month to ``months_ahead``."""
+    if not await is_partitioned(db):
+        return []
+    months_ahead = EVENTS_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(now or datetime.utcnow())
+    existing = {name for name, _ in await list_event_partitions(db)}
+    default = await default_partition(db)
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        await create_event_partition(db, month, default)
+        await db.commit()
+        created.append(name)
+    return created
+
+
+async def purge_expired_events(
+    db: AsyncSession,
+    retention_days: Optional[int] = None,
+    action: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> dict:
+    """Remove raw events older than the retention window.
+
+    Partitioned tables lose whole months at a time: a partition is detached
+    once its upper bound has passed the cutoff, then dropped or archived.
+    The DEFAULT partition has no bounds to go by, so it is trimmed the way
+    unpartitioned tables are: by DELETEs of ``chunk_size`` rows, each in its
+    own transaction, so no single statement holds locks for long.
+    """
+    retention_days = EVENTS_RETENTION_DAYS if retention_days is None else retention_days
+    action = action or EVENTS_RETENTION_ACTION
+    chunk_size = chunk_size or EVENTS_PURGE_CHUNK_SIZE
+    if action not in ("drop", "archive"):
+        raise ValueError(f"Unknown retention action: {action}")
+    if retention_days <= 0:
+        return {"mode": "disabled", "cutoff": None}
+
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+
+    if await is_partitioned(db):
+        expired = [
+            name for name, month in await list_event_partitions(db)
+            if add_months(month, 1) <= cutoff
+        ]
+        default = await default_partition(db)
+        if action == "archive" and (expired or default):
+            await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+        if action == "archive" and default:
+            await db.execute(text(f"CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{default} (LIKE events)"))
+        for name in expired:
+            await db.execute(text(f"ALTER TABLE events DETACH PARTITION {name}"))
+            if action == "archive":
+                await db.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            else:
+                await db.execute(text(f"DROP TABLE {name}"))
+            await db.commit()
+        deleted, chunks = 0, 0
+        if default:
+            deleted, chunks = await _delete_in_chunks(
+                db, _default_partition_purge(default, action), cutoff, chunk_size,
+            )
+        return {
+            "mode": "partitions", "cutoff": cutoff, "action": action, "partitions": expired,
+            "deleted": deleted, "chunks": chunks,
+        }
+
+    statement = (
+        delete(Event)
+        .where(Event.id.in_(
+            select(Event.id).where(Event.created_at < bindparam("cutoff")).limit(bindparam("chunk_size"))
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    deleted, chunks = await _delete_in_chunks(db, statement, cutoff, chunk_size)
+    return {"mode": "delete", "cutoff": cutoff, "deleted": deleted, "chunks": chunks}
+
+
+def _default_partition_purge(name: str, action: str):
+    """One chunk of expired rows out of the DEFAULT partition ``name``.
+
+    Archiving moves them into a table of the same name in the archive
+    schema, so they can be exported like a detached monthly partition.
+    """
+    expired = f"SELECT id FROM {name} WHERE created_at < :cutoff LIMIT :chunk_size"
+    if action == "archive":
+        statement = text(
+            f"WITH moved AS (DELETE FROM {name} WHERE id IN ({expired}) RETURNING *) "
+            f"INSERT INTO {ARCHIVE_SCHEMA}.{name} SELECT * FROM moved"
+        )
+    else:
+        statement = text(f"DELETE FROM {name} WHERE id IN ({expired})")
+    return statement.bindparams(bindparam("cutoff", type_=Event.created_at.type))
+
+
+async def _delete_in_chunks(db: AsyncSession, statement, cutoff: datetime, chunk_size: int) -> Tuple[int, int]:
+    """Run ``statement`` until it removes fewer than ``chunk_size`` rows.
+
+    Returns the rows removed and the chunks that removed any.
+    """
+    deleted = 0
+    chunks = 0
+    while True:
+        result = await db.execute(statement, {"cutoff": cutoff, "chunk_size": chunk_size})
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount == 0:
+            break
+        chunks += 1
+        if result.rowcount < chunk_size:
+            break
+    return deleted, chunks
+
+
+async def run_event_retention(db: AsyncSession, now: Optional[datetime] = None) -> dict:
+    """Create upcoming partitions, then purge expired events."""
+    created = await ensure_event_partitions(db, now=now)
+    return {"partitions_created": created, **await purge_expired_events(db, now=now)}
@@ -0,0 +1,113 @@
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db.models import Event, EventRollup
+
+
+def dialect_insert(model, dialect_name: str):
+    """INSERT construct with ON CONFLICT support for the given dialect."""
+    if dialect_name == "postgresql":
+        return postgresql.insert(model)
+    if dialect_name == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"No {model.__tablename__} upsert for {dialect_name}")
+
+
+def hour_bucket(created_at: datetime) -> datetime:
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+
+def _hour_bucket_sql(dialect_name: str, column):
+    if dialect_name == "postgresql":
+        return func.date_trunc("hour", column)
+    # SQLite stores DateTime as text in this layout.
+    return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+
+
+def rollup_rows(rows: List[dict]) -> List[dict]:
+    """Fold event rows into one count per (site, variant, type, hour)."""
+    counts = Counter(
+        (row["site_id"], row["variant_id"], row["event_type"], hour_bucket(row["created_at"]))
+        for row in rows
+    )
+    # Sorted so concurrent writers take row locks in the same order.
+    return [
+        {"site_id": site_id, "variant_id": variant_id, "event_type": event_type, "hour": hour, "count": count}
+        for (site_id, variant_id, event_type, hour), count in sorted(counts.items(), key=lambda item: str(item[0]))
+    ]
+
+
+def record_rollups(db: Session, rows: List[dict]) -> None:
+    """Add event rows to their hourly buckets, in the caller's transaction."""
+    rollups = rollup_rows(rows)
+    if not rollups:
+        return
+    stmt = dialect_insert(EventRollup, db.get_bind().dialect.name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            EventRollup.site_id, EventRollup.variant_id, EventRollup.event_type, EventRollup.hour,
+        ],
+        set_={"count": EventRollup.count + stmt.excluded.count},
+    )
+    db.execute(stmt, rollups)
+
+
+async def rebuild_site_rollups(db: AsyncSession, site_id: str, since: Optional[datetime] = None) -> None:
+    """Recount a site's buckets from raw events, after backfills or deletes.
+
+    With ``since``, an hour boundary, only buckets from then on are
+    recounted; earlier ones are kept as they are.
+    """
+    site_uuid = uuid.UUID(site_id)
+    hour = _hour_bucket_sql(db.get_bind().dialect.name, Event.created_at)
+    stale = delete(EventRollup).where(EventRollup.site_id == site_uuid)
+    events = (
+        select(Event.site_id, Event.variant_id, Event.event_type, hour, func.count())
+        .where(Event.site_id == site_uuid)
+    )
+    if since is not None:
+        stale = stale.where(EventRollup.hour >= since)
+        events = events.where(Event.created_at >= since)
+    await db.execute(stale)
+    await db.execute(
+        insert(EventRollup).from_select(
+            ["site_id", "variant_id", "event_type", "hour", "count"],
+            events.group_by(Event.site_id, Event.variant_id, Event.event_type, hour),
+        )
+    )
+
+
+async def site_timeseries(
+    db: AsyncSession,
+    site_id: str,
+    since: Optional[datetime] = None,
+) -> List[dict]:
+    """Impressions and conversions per variant and hour, oldest first."""
+    query = (
+        select(EventRollup.hour, EventRollup.variant_id, EventRollup.event_type, EventRollup.count)
+        .where(
+            EventRollup.site_id == uuid.UUID(site_id),
+            EventRollup.event_type.in_(["impression", "conversion"]),
+        )
+        .order_by(EventRollup.hour, EventRollup.variant_id)
+    )
+    if since is not None:
+        query = query.where(EventRollup.hour >= hour_bucket(since))
+
+    points = {}
+    for hour, variant_id, event_type, count in (await db.execute(query)).all():
+        point = points.setdefault((hour, variant_id), {
+            "hour": hour,
+            "variant_id": str(variant_id),
+            "impressions": 0,
+            "conversions": 0,
+        })
+        point["impressions" if event_type == "impression" else "conversions"] += count
+    return list(points.values())
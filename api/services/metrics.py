@@ -0,0 +1,223 @@
+"""In-process request metrics, served in the Prometheus text format.
+
+Every HTTP request is timed per route template, along with the number and
+total time of the SQL statements it ran, and the sampler call sites record
+their time per operation. The bookkeeping is a few counter bumps under a
+lock per request and per statement, cheap enough to leave on; set
+``METRICS_ENABLED=false`` to skip it entirely.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no", "off")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects."""
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # Per label set: a count per bucket (plus +Inf), the sum and the count.
+        self._series: Dict[Labels, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, labels: Labels) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return series[2] if series else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        for labels, (bucket_counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), bucket_counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                label_text = _format_labels((*self.label_names, "le"), (*labels, le))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {total!r}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+@dataclass
+class QueryTally:
+    count: int = 0
+    seconds: float = 0.0
+
+
+# The current request's statements; SQLAlchemy's async greenlets share the
+# request's context, so statements run on either engine land here.
+_request_queries: ContextVar[Optional[QueryTally]] = ContextVar("request_queries", default=None)
+
+
+class Metrics:
+    def __init__(self):
+        self.request_seconds = Histogram(
+            "evoloop_http_request_duration_seconds",
+            "HTTP request latency by route template.",
+            ("method", "route", "status"),
+            LATENCY_BUCKETS,
+        )
+        self.request_queries = Histogram(
+            "evoloop_http_request_db_queries",
+            "SQL statements executed per HTTP request.",
+            ("method", "route"),
+            QUERY_COUNT_BUCKETS,
+        )
+        self.request_db_seconds = Histogram(
+            "evoloop_http_request_db_seconds",
+            "Time spent in SQL statements per HTTP request.",
+            ("method", "route"),
+            LATENCY_BUCKETS,
+        )
+        self.query_seconds = Histogram(
+            "evoloop_db_query_duration_seconds",
+            "Latency of every SQL statement, including background work.",
+            (),
+            LATENCY_BUCKETS,
+        )
+        self.sampler_seconds = Histogram(
+            "evoloop_sampler_duration_seconds",
+            "Time spent in ThompsonSampler by operation.",
+            ("operation",),
+            LATENCY_BUCKETS,
+        )
+        self.histograms = [
+            self.request_seconds, self.request_queries, self.request_db_seconds,
+            self.query_seconds, self.sampler_seconds,
+        ]
+
+    def clear(self) -> None:
+        for histogram in self.histograms:
+            histogram.clear()
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for name, (help, value) in sorted((gauges or {}).items()):
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {float(value)!r}"])
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def sampler_timer(operation: str) -> Iterator[None]:
+    """Record the time spent in one ThompsonSampler call."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.sampler_seconds.observe((operation,), time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, so a failed statement leaves nothing behind.
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    metrics.query_seconds.observe((), elapsed)
+    tally = _request_queries.get()
+    if tally is not None:
+        tally.count += 1
+        tally.seconds += elapsed
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement ``engine`` runs; async engines pass ``.sync_engine``."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL work per route template.
+
+    Requests that match no route share one ``unmatched`` label, so scanners
+    probing random paths cannot blow up the series count.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        tally = QueryTally()
+        token = _request_queries.set(tally)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            metrics.request_seconds.observe((method, template, str(status)), elapsed)
+            metrics.request_queries.observe((method, template), tally.count)
+            metrics.request_db_seconds.observe((method, template), tally.seconds)
@@ -0,0 +1,80 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+
+from services.metrics import sampler_timer
+from services.thompson_sampling import ProbBestEstimate, ThompsonSampler
+
+PROB_BEST_CACHE_SIZE = int(os.getenv("PROB_BEST_CACHE_SIZE", "4096"))
+
+PosteriorKey = Tuple[Tuple[str, float, float], ...]
+
+
+def posterior_key(variants: List[Tuple[str, float, float]]) -> PosteriorKey:
+    return tuple(sorted((str(v), float(a), float(b)) for v, a, b in variants))
+
+
+class ProbBestCache:
+    """Bounded LRU of prob_best estimates keyed on the arms' posteriors.
+
+    Posteriors only move when stats are recomputed, so repeated dashboard
+    loads in between resolve to the same key and skip the simulation.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[PosteriorKey, ProbBestEstimate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, variants: List[Tuple[str, float, float]]) -> ProbBestEstimate:
+        return self.get_or_compute(variants, ThompsonSampler.estimate_prob_best)
+
+    def get_or_compute(
+        self,
+        variants: List[Tuple[str, float, float]],
+        compute: Callable[[List[Tuple[str, float, float]]], ProbBestEstimate],
+    ) -> ProbBestEstimate:
+        key = posterior_key(variants)
+        with self._lock:
+            estimate = self._entries.get(key)
+            if estimate is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return estimate
+            self.misses += 1
+        # Computed outside the lock; two concurrent misses just both compute.
+        with sampler_timer("estimate_prob_best"):
+            estimate = compute(list(key))
+        self.put(variants, estimate)
+        return estimate
+
+    def put(self, variants: List[Tuple[str, float, float]], estimate: ProbBestEstimate) -> None:
+        key = posterior_key(variants)
+        with self._lock:
+            self._entries[key] = estimate
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+prob_best_cache = ProbBestCache(max_entries=PROB_BEST_CACHE_SIZE)
@@ -0,0 +1,194 @@
+import atexit
+import logging
+import os
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, false, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db.connection import SessionLocal
+from db.models import Site, SiteActivity
+from services.event_rollups import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# How often each process writes the site counts of its sync ingest, so
+# concurrent requests for one site do not queue on its site_activity row.
+SITE_ACTIVITY_FLUSH_SECONDS = float(os.getenv("SITE_ACTIVITY_FLUSH_SECONDS", "1.0"))
+
+# Per site: events counted, and when the first and last of them arrived.
+Activity = Dict[uuid.UUID, Tuple[int, datetime, datetime]]
+
+
+def write_site_activity(db: Session, activity: Activity) -> None:
+    """Add counted events to their sites' rows, in the caller's transaction."""
+    if not activity:
+        return
+    stmt = dialect_insert(SiteActivity, db.get_bind().dialect.name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SiteActivity.site_id],
+        set_={
+            "pending_events": SiteActivity.pending_events + stmt.excluded.pending_events,
+            "dirty_since": func.coalesce(SiteActivity.dirty_since, stmt.excluded.dirty_since),
+            "last_event_at": stmt.excluded.last_event_at,
+        },
+    )
+    # Sorted so concurrent writers take row locks in the same order.
+    db.execute(stmt, [
+        {"site_id": site_id, "pending_events": count, "dirty_since": first, "last_event_at": last}
+        for site_id, (count, first, last) in sorted(activity.items(), key=lambda item: str(item[0]))
+    ])
+
+
+def record_site_activity(db: Session, rows: List[dict], now: Optional[datetime] = None) -> None:
+    """Count event rows against their sites, in the caller's transaction."""
+    now = now or datetime.utcnow()
+    counts = Counter(row["site_id"] for row in rows)
+    write_site_activity(db, {site_id: (count, now, now) for site_id, count in counts.items()})
+
+
+class SiteActivityTally:
+    """Site event counts this process has committed but not yet written to
+    site_activity.
+
+    Sync ingest adds its rows once their transaction has committed, and a
+    background thread writes the tally in its own transaction every
+    ``flush_interval`` seconds, so each site row is written about once per
+    interval per process rather than once per event, and counts reach the
+    table even when the process receives no further requests. A write that
+    fails is merged back and retried on the next flush.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], flush_interval: float):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self._pending: Activity = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.writes = 0
+        self.failures = 0
+
+    def add(self, rows: List[dict], now: Optional[datetime] = None) -> None:
+        now = now or datetime.utcnow()
+        counts = Counter(row["site_id"] for row in rows)
+        self._merge({site_id: (count, now, now) for site_id, count in counts.items()})
+
+    def _merge(self, activity: Activity) -> None:
+        with self._lock:
+            for site_id, (count, first, last) in activity.items():
+                pending = self._pending.get(site_id)
+                if pending:
+                    count, first, last = pending[0] + count, min(pending[1], first), max(pending[2], last)
+                self._pending[site_id] = (count, first, last)
+
+    def flush(self) -> int:
+        """Write everything tallied in one transaction; returns the sites written."""
+        with self._flush_lock:
+            with self._lock:
+                activity, self._pending = self._pending, {}
+            if not activity:
+                return 0
+            db = self.session_factory()
+            try:
+                write_site_activity(db, activity)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.failures += 1
+                logger.exception("Failed to write activity for %d sites", len(activity))
+                self._merge(activity)
+                return 0
+            finally:
+                db.close()
+            self.writes += 1
+            return len(activity)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="site-activity-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher and write whatever is still tallied."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join(timeout)
+            self._thread = None
+            atexit.unregister(self.stop)
+        self.flush()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending = {}
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "pending_sites": len(self._pending),
+                "pending_events": sum(count for count, _, _ in self._pending.values()),
+                "writes": self.writes,
+                "failures": self.failures,
+            }
+
+
+site_activity_tally = SiteActivityTally(session_factory=SessionLocal, flush_interval=SITE_ACTIVITY_FLUSH_SECONDS)
+
+
+async def mark_recomputed(
+    db: AsyncSession, site_id, observed: Optional[int], recomputed_at: datetime,
+) -> None:
+    """Retire the ``observed`` events a recompute has taken into account.
+
+    Events counted after ``observed`` was read stay pending, so they trigger
+    another recompute rather than being lost. ``None`` retires everything,
+    for sites without active variants whose events nothing reads. Sites
+    that do not exist or are being deleted get no row.
+    """
+    site_uuid = uuid.UUID(str(site_id))
+    stmt = dialect_insert(SiteActivity, db.get_bind().dialect.name).from_select(
+        ["site_id", "pending_events", "last_recomputed_at"],
+        select(Site.id, literal(0), literal(recomputed_at, SiteActivity.last_recomputed_at.type))
+        .where(Site.id == site_uuid, Site.deleted_at.is_(None)),
+    )
+    if observed is None:
+        still_dirty, observed = false(), 0
+    else:
+        still_dirty = SiteActivity.pending_events > observed
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SiteActivity.site_id],
+        set_={
+            "pending_events": case((still_dirty, SiteActivity.pending_events - observed), else_=0),
+            "dirty_since": case((still_dirty, recomputed_at), else_=None),
+            "last_recomputed_at": recomputed_at,
+        },
+    )
+    await db.execute(stmt)
+
+
+def dirty_sites_query():
+    """Running sites with events not yet in their stats, oldest first."""
+    return (
+        select(SiteActivity)
+        .join(Site, Site.id == SiteActivity.site_id)
+        .where(SiteActivity.dirty_since.is_not(None), Site.status == "running")
+        .order_by(SiteActivity.dirty_since)
+    )
@@ -0,0 +1,263 @@
+"""Content-addressed assignment bundles for serving /v1/assign at the edge.
+
+Each running site gets one immutable JSON bundle per distinct content, at
+``{site_id}/{version}.json`` where ``version`` is a hash of the bytes, and a
+``{site_id}/current`` pointer naming the live one. A bundle carries what an
+edge worker needs to assign without calling the API: the active variants with
+their patches and patch hashes, and the alias table of allocation weights
+when one is available. Bundles are served unauthenticated, so the raw
+posteriors stay out; without an alias table the edge falls back to the API.
+``assignment_version`` is the value assignment_hash() is keyed on, so an edge
+worker hashing a visitor into the table picks what /v1/assign does in
+allocation mode.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from services.site_cache import SiteSnapshot, load_site_snapshot, site_snapshots
+
+logger = logging.getLogger(__name__)
+
+# Directory bundles are published to; publishing is off when unset.
+SITE_BUNDLE_DIR = os.getenv("SITE_BUNDLE_DIR", "")
+# Revalidation interval for a site's current bundle and the manifest.
+SITE_BUNDLE_MAX_AGE_SECONDS = int(os.getenv("SITE_BUNDLE_MAX_AGE_SECONDS", "60"))
+
+CURRENT = "current"
+
+
+class LocalBundleStore:
+    """Bundles as files under ``root``, each written atomically."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self, prefix: str = "") -> List[str]:
+        keys = []
+        for directory, _, files in os.walk(self.root):
+            relative = os.path.relpath(directory, self.root)
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                key = name if relative == "." else f"{relative.replace(os.sep, '/')}/{name}"
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+
+class MemoryBundleStore:
+    """In-process stand-in for an object store bucket."""
+
+    def __init__(self):
+        self._objects: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._objects[key] = data
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._objects.get(key)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._objects.pop(key, None)
+
+    def keys(self, prefix: str = "") -> List[str]:
+        with self._lock:
+            return sorted(k for k in self._objects if k.startswith(prefix))
+
+
+bundle_store = LocalBundleStore(SITE_BUNDLE_DIR) if SITE_BUNDLE_DIR else None
+
+
+def encode_bundle(snapshot: SiteSnapshot) -> bytes:
+    """Canonical bytes for a snapshot, so equal content hashes equally."""
+    variants = [
+        {
+            "id": variant_id,
+            "patch_hash": snapshot.patch_hashes[variant_id],
+            "patch": json.loads(snapshot.patches[variant_id]),
+        }
+        for variant_id, _, _ in snapshot.variants
+    ]
+    allocation = None
+    if snapshot.allocation is not None:
+        allocation = {
+            "variant_ids": list(snapshot.allocation.variant_ids),
+            "probability": list(snapshot.allocation.probability),
+            "alias": list(snapshot.allocation.alias),
+        }
+    bundle = {
+        "site_id": snapshot.site_id,
+        "assignment_version": snapshot.version,
+        "variants": variants,
+        "allocation": allocation,
+    }
+    return json.dumps(bundle, separators=(",", ":"), sort_keys=True).encode()
+
+
+def bundle_version(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def bundle_key(site_id: str, version: str) -> str:
+    return f"{site_id}/{version}.json"
+
+
+def current_version(store, site_id: str) -> Optional[str]:
+    pointer = store.get(f"{site_id}/{CURRENT}")
+    return pointer.decode() if pointer else None
+
+
+def _prune(store, site_id: str, keep: Set[Optional[str]]) -> None:
+    for key in store.keys(f"{site_id}/"):
+        if key.endswith(".json") and key[len(site_id) + 1:-len(".json")] not in keep:
+            store.delete(key)
+
+
+async def publish_site_bundle(db: AsyncSession, site_id: str, store=None) -> Optional[str]:
+    """Publish the site's bundle if its content changed; return the live version.
+
+    Sites that are missing, not running or without active variants are
+    unpublished. Nothing is written when the content hash is unchanged.
+    """
+    store = store or bundle_store
+    if store is None:
+        return None
+    site_id = str(site_id)
+
+    snapshot = await load_site_snapshot(db, site_id)
+    data = None
+    if snapshot is not None and snapshot.status == "running" and snapshot.variants:
+        # The snapshot was just loaded anyway; let /v1/assign reuse it.
+        site_snapshots.put(snapshot)
+        data = encode_bundle(snapshot)
+    # Stores do blocking file or network I/O, so they stay off the event loop.
+    return await run_in_threadpool(_write_bundle, store, site_id, data)
+
+
+async def try_publish_site_bundle(db: AsyncSession, site_id: str, store=None) -> Optional[str]:
+    """Publish after a change that is already committed; returns the error, if any.
+
+    A bundle that fails to publish is only stale until the next change, so
+    the failure is logged rather than failing the caller's request.
+    """
+    try:
+        await publish_site_bundle(db, site_id, store)
+    except Exception as e:
+        logger.exception("Failed to publish bundle for site %s", site_id)
+        return str(e)
+    return None
+
+
+def _write_bundle(store, site_id: str, data: Optional[bytes]) -> Optional[str]:
+    """Make ``data`` the site's live bundle, or unpublish the site when None."""
+    previous = current_version(store, site_id)
+    if data is None:
+        if previous is not None:
+            store.delete(f"{site_id}/{CURRENT}")
+            _prune(store, site_id, keep=set())
+            manifest_cache.invalidate()
+        return None
+
+    version = bundle_version(data)
+    if version == previous:
+        return version
+
+    # The bundle lands before the pointer, so readers never see a dangling one.
+    store.put(bundle_key(site_id, version), data)
+    store.put(f"{site_id}/{CURRENT}", version.encode())
+    manifest_cache.invalidate()
+    # The version just replaced stays fetchable for clients that still hold it.
+    _prune(store, site_id, keep={version, previous})
+    return version
+
+
+def bundle_manifest(store=None) -> Dict[str, str]:
+    """Current bundle version of every published site."""
+    store = store or bundle_store
+    if store is None:
+        return {}
+    manifest = {}
+    for key in store.keys():
+        site_id, _, name = key.partition("/")
+        pointer = store.get(key) if name == CURRENT else None
+        if pointer:
+            manifest[site_id] = pointer.decode()
+    return manifest
+
+
+class ManifestCache:
+    """The encoded manifest and its ETag, so serving it does not walk the store.
+
+    Rebuilt when this process publishes or unpublishes a bundle, and at
+    least every ``ttl_seconds``, which bounds how long a publish from another
+    worker takes to show up; clients already cache the manifest that long.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entry: Optional[Tuple[object, float, bytes, str]] = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, store) -> Tuple[bytes, str]:
+        """(body, etag) of ``store``'s manifest."""
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] is store and time.monotonic() < entry[1]:
+                return entry[2], entry[3]
+            body = json.dumps(bundle_manifest(store), separators=(",", ":"), sort_keys=True).encode()
+            etag = f'"{hashlib.sha256(body).hexdigest()[:20]}"'
+            self._entry = (store, time.monotonic() + self.ttl_seconds, body, etag)
+            self.builds += 1
+            return body, etag
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entry = None
+
+    def clear(self) -> None:
+        self.invalidate()
+
+
+manifest_cache = ManifestCache(ttl_seconds=SITE_BUNDLE_MAX_AGE_SECONDS)
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import Site, Variant, ExperimentStats
+from db.patches import canonical_patch, patch_hash
+from services.thompson_sampling import AliasTable, posterior_version
+
+ASSIGN_CACHE_TTL_SECONDS = float(os.getenv("ASSIGN_CACHE_TTL_SECONDS", "30"))
+ASSIGN_CACHE_MAX_SITES = int(os.getenv("ASSIGN_CACHE_MAX_SITES", "10000"))
+# "thompson" draws Beta samples per request; "allocation" hashes visitors
+# into an alias table built from the stored prob_best.
+ASSIGN_MODE = os.getenv("ASSIGN_MODE", "thompson")
+
+
+@dataclass(frozen=True)
+class SiteSnapshot:
+    """Everything /v1/assign needs to serve a site without touching the DB."""
+    site_id: str
+    status: str
+    variants: Tuple[Tuple[str, float, float], ...]
+    patches: Dict[str, str]
+    patch_hashes: Dict[str, str]
+    version: str
+    # None until a stats update has stored prob_best for exactly these posteriors.
+    allocation: Optional[AliasTable] = None
+
+
+async def load_site_snapshot(db: AsyncSession, site_id: str) -> Optional[SiteSnapshot]:
+    site = await db.get(Site, uuid.UUID(site_id))
+    if not site or site.deleted_at is not None:
+        return None
+
+    rows = (await db.execute(
+        select(Variant, ExperimentStats)
+        .join(ExperimentStats, Variant.id == ExperimentStats.variant_id, isouter=True)
+        .where(Variant.site_id == site.id, Variant.status == "active")
+    )).all()
+
+    variants = tuple(sorted(
+        (str(variant.id), stats.alpha if stats else 1.0, stats.beta if stats else 1.0)
+        for variant, stats in rows
+    ))
+    patches = {
+        str(variant.id): canonical_patch(variant.patch)
+        for variant, _ in rows
+    }
+
+    patch_hashes = {
+        str(variant.id): variant.patch_hash or patch_hash(variant.patch)
+        for variant, _ in rows
+    }
+
+    version = posterior_version(variants)
+    return SiteSnapshot(
+        site_id=site_id,
+        status=site.status,
+        variants=variants,
+        patches=patches,
+        patch_hashes=patch_hashes,
+        version=version,
+        allocation=allocation_table([stats for _, stats in rows], version),
+    )
+
+
+def allocation_table(stats_rows: List[Optional[ExperimentStats]], version: str) -> Optional[AliasTable]:
+    """Alias table over the stored prob_best, if it matches ``version``."""
+    if not stats_rows or any(s is None or s.prob_best_version != version for s in stats_rows):
+        return None
+    weights = {str(s.variant_id): s.prob_best for s in stats_rows}
+    if sum(weights.values()) <= 0:
+        return None
+    return AliasTable.build(weights)
+
+
+def _key(site_id) -> str:
+    return str(uuid.UUID(str(site_id)))
+
+
+class SiteSnapshotCache:
+    """Per-site snapshots with a TTL and explicit invalidation.
+
+    The cache is per process: invalidation reaches the worker that handled
+    the write, and the TTL bounds staleness on every other worker.
+    """
+
+    def __init__(self, ttl_seconds: float, max_sites: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sites = max_sites
+        self._entries: "OrderedDict[str, Tuple[float, SiteSnapshot]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, site_id: str) -> Optional[SiteSnapshot]:
+        key = _key(site_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[0]:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, snapshot: SiteSnapshot) -> None:
+        key = _key(snapshot.site_id)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_sites:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get_or_load(
+        self,
+        site_id: str,
+        loader: Callable[[], Awaitable[Optional[SiteSnapshot]]],
+    ) -> Optional[SiteSnapshot]:
+        snapshot = self.get(site_id)
+        if snapshot is None:
+            snapshot = await loader()
+            if snapshot is not None:
+                self.put(snapshot)
+        return snapshot
+
+    def invalidate(self, site_id: str) -> None:
+        with self._lock:
+            if self._entries.pop(_key(site_id), None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+site_snapshots = SiteSnapshotCache(
+    ttl_seconds=ASSIGN_CACHE_TTL_SECONDS,
+    max_sites=ASSIGN_CACHE_MAX_SITES,
+)
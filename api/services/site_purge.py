@@ -0,0 +1,128 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import delete, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import (
+    ConversionGoal, Event, EventRollup, ExperimentStats, Site, SiteActivity, SitePurge, Variant,
+)
+
+# Rows per DELETE; each chunk commits on its own so no transaction or lock
+# is held for the length of the purge.
+SITE_PURGE_CHUNK_SIZE = int(os.getenv("SITE_PURGE_CHUNK_SIZE", "5000"))
+# A running purge that has not reported progress for this long is assumed
+# to have died with its worker and may be resumed.
+SITE_PURGE_STALE_SECONDS = int(os.getenv("SITE_PURGE_STALE_SECONDS", "600"))
+
+
+def purge_steps(site_id: uuid.UUID, chunk_size: int) -> List[Tuple[str, Callable]]:
+    """(table, chunk statement) pairs, children before parents."""
+    variant_children = [
+        ("events", lambda: delete(Event).where(Event.id.in_(
+            select(Event.id).where(Event.site_id == site_id).limit(chunk_size)
+        ))),
+        ("event_rollups", lambda: delete(EventRollup).where(
+            tuple_(EventRollup.site_id, EventRollup.variant_id, EventRollup.event_type, EventRollup.hour).in_(
+                select(EventRollup.site_id, EventRollup.variant_id, EventRollup.event_type, EventRollup.hour)
+                .where(EventRollup.site_id == site_id)
+                .limit(chunk_size)
+            )
+        )),
+        ("experiment_stats", lambda: delete(ExperimentStats).where(ExperimentStats.variant_id.in_(
+            select(Variant.id)
+            .join(ExperimentStats, ExperimentStats.variant_id == Variant.id)
+            .where(Variant.site_id == site_id)
+            .limit(chunk_size)
+        ))),
+    ]
+    return [
+        *variant_children,
+        # Events still in flight when the site was deleted, such as a
+        # buffered flush, may land after the first pass; sweeping again
+        # right before the variants keeps them from blocking that delete.
+        *variant_children,
+        ("variants", lambda: delete(Variant).where(Variant.id.in_(
+            select(Variant.id).where(Variant.site_id == site_id).limit(chunk_size)
+        ))),
+        ("conversion_goals", lambda: delete(ConversionGoal).where(ConversionGoal.id.in_(
+            select(ConversionGoal.id).where(ConversionGoal.site_id == site_id).limit(chunk_size)
+        ))),
+        ("site_activity", lambda: delete(SiteActivity).where(SiteActivity.site_id == site_id)),
+        ("sites", lambda: delete(Site).where(Site.id == site_id)),
+    ]
+
+
+def purge_progress(purge: SitePurge) -> dict:
+    return {
+        "site_id": str(purge.site_id),
+        "status": purge.status,
+        "deleted": purge.deleted or {},
+        "error": purge.error,
+        "requested_at": purge.requested_at,
+        "updated_at": purge.updated_at,
+        "finished_at": purge.finished_at,
+    }
+
+
+async def purge_site(
+    session_factory: Callable[[], AsyncSession],
+    site_id: str,
+    chunk_size: Optional[int] = None,
+) -> Optional[dict]:
+    """Delete a soft-deleted site's rows in bounded chunks, recording progress.
+
+    Safe to resume: every step deletes whatever is left for the site, so a
+    purge interrupted part-way picks up where it stopped.
+    """
+    chunk_size = chunk_size or SITE_PURGE_CHUNK_SIZE
+    site_uuid = uuid.UUID(site_id)
+    async with session_factory() as db:
+        purge = await db.get(SitePurge, site_uuid)
+        if purge is None or purge.status == "done":
+            return purge_progress(purge) if purge else None
+
+        purge.status = "running"
+        purge.error = None
+        await db.commit()
+        deleted = dict(purge.deleted or {})
+        try:
+            # Variants point at their parents; unlinking them lets chunks go in any order.
+            await db.execute(
+                update(Variant).where(Variant.site_id == site_uuid).values(parent_variant_id=None)
+            )
+            for table, statement in purge_steps(site_uuid, chunk_size):
+                while True:
+                    result = await db.execute(statement().execution_options(synchronize_session=False))
+                    deleted[table] = deleted.get(table, 0) + result.rowcount
+                    purge.deleted = dict(deleted)
+                    await db.commit()
+                    if result.rowcount < chunk_size:
+                        break
+            purge.status = "done"
+            purge.finished_at = datetime.utcnow()
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            purge.status = "failed"
+            purge.error = str(e)
+            await db.commit()
+        return purge_progress(purge)
+
+
+async def resume_site_purges(
+    session_factory: Callable[[], AsyncSession],
+    now: Optional[datetime] = None,
+) -> List[dict]:
+    """Run every purge that is pending, failed or stalled."""
+    stale = (now or datetime.utcnow()) - timedelta(seconds=SITE_PURGE_STALE_SECONDS)
+    async with session_factory() as db:
+        site_ids = [str(site_id) for site_id in await db.scalars(
+            select(SitePurge.site_id).where(or_(
+                SitePurge.status.in_(["pending", "failed"]),
+                (SitePurge.status == "running") & (SitePurge.updated_at < stale),
+            ))
+        )]
+    return [await purge_site(session_factory, site_id) for site_id in site_ids]
@@ -0,0 +1,140 @@
+"""Recompute stats only for sites whose events have moved since the last pass.
+
+Ingest counts every site's new events in ``site_activity`` (sync ingest via
+a per-process tally written about once a second). Each pass picks
+the running sites that are due: hot sites, with at least
+``STATS_HOT_EVENT_THRESHOLD`` pending events, and any dirty site that has
+waited ``STATS_MAX_STALENESS_SECONDS``. Sites without new events are never
+touched, so a pass costs nothing on an idle fleet.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from db.connection import AsyncSessionLocal
+from db.models import SiteActivity
+from services.site_activity import dirty_sites_query, site_activity_tally
+from services.stats_updater import STATS_UPDATE_CONCURRENCY, posterior_pool, update_sites
+
+logger = logging.getLogger(__name__)
+
+# Seconds between in-process scheduler passes; 0 leaves scheduling to cron.
+STATS_SCHEDULER_INTERVAL_SECONDS = float(os.getenv("STATS_SCHEDULER_INTERVAL_SECONDS", "0"))
+# Pending events that make a site due on the next pass.
+STATS_HOT_EVENT_THRESHOLD = int(os.getenv("STATS_HOT_EVENT_THRESHOLD", "1000"))
+# Longest a site with any pending event waits for a recompute.
+STATS_MAX_STALENESS_SECONDS = int(os.getenv("STATS_MAX_STALENESS_SECONDS", "300"))
+
+
+def is_due(activity: SiteActivity, now: datetime) -> bool:
+    return activity.dirty_since is not None and (
+        activity.pending_events >= STATS_HOT_EVENT_THRESHOLD
+        or activity.dirty_since <= now - timedelta(seconds=STATS_MAX_STALENESS_SECONDS)
+    )
+
+
+async def due_site_ids(db: AsyncSession, now: datetime) -> List[str]:
+    stale = now - timedelta(seconds=STATS_MAX_STALENESS_SECONDS)
+    rows = await db.scalars(dirty_sites_query().where(or_(
+        SiteActivity.pending_events >= STATS_HOT_EVENT_THRESHOLD,
+        SiteActivity.dirty_since <= stale,
+    )))
+    return [str(activity.site_id) for activity in rows]
+
+
+async def run_scheduler_pass(
+    session_factory: Callable[[], AsyncSession],
+    now: Optional[datetime] = None,
+    concurrency: int = STATS_UPDATE_CONCURRENCY,
+) -> dict:
+    """Recompute every due site and republish what changed."""
+    start = time.perf_counter()
+    now = now or datetime.utcnow()
+    # This process's own recent events count towards this pass.
+    await run_in_threadpool(site_activity_tally.flush)
+    async with session_factory() as db:
+        site_ids = await due_site_ids(db, now)
+    results = await update_sites(
+        site_ids, session_factory, concurrency=concurrency, pool=posterior_pool(), publish=True,
+    )
+    return {
+        "sites_updated": len(results),
+        "errors": sum(1 for r in results if r["status"] != "success"),
+        "duration_ms": (time.perf_counter() - start) * 1000,
+        "results": results,
+    }
+
+
+class StatsScheduler:
+    """Runs a scheduler pass every ``interval`` seconds on the event loop."""
+
+    def __init__(self, session_factory: Callable[[], AsyncSession], interval: float):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.passes = 0
+        self.sites_updated = 0
+        self.errors = 0
+        self.last_pass_at: Optional[datetime] = None
+        self.last_pass_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running or self.interval <= 0:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="stats-scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self, now: Optional[datetime] = None) -> dict:
+        summary = await run_scheduler_pass(self.session_factory, now=now)
+        self.passes += 1
+        self.sites_updated += summary["sites_updated"]
+        self.errors += summary["errors"]
+        self.last_pass_at = now or datetime.utcnow()
+        self.last_pass_ms = summary["duration_ms"]
+        return summary
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Stats scheduler pass failed")
+            await asyncio.sleep(self.interval)
+
+    def metrics(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "hot_event_threshold": STATS_HOT_EVENT_THRESHOLD,
+            "max_staleness_seconds": STATS_MAX_STALENESS_SECONDS,
+            "passes": self.passes,
+            "sites_updated": self.sites_updated,
+            "errors": self.errors,
+            "last_pass_at": self.last_pass_at,
+            "last_pass_ms": self.last_pass_ms,
+        }
+
+
+stats_scheduler = StatsScheduler(
+    session_factory=AsyncSessionLocal,
+    interval=STATS_SCHEDULER_INTERVAL_SECONDS,
+)
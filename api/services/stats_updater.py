@@ -0,0 +1,250 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import Variant, ExperimentStats, EventRollup, SiteActivity
+from services.event_retention import retained_since
+from services.event_rollups import dialect_insert, rebuild_site_rollups
+from services.metrics import sampler_timer
+from services.prob_best_cache import prob_best_cache
+from services.site_activity import mark_recomputed
+from services.site_bundles import try_publish_site_bundle
+from services.site_cache import site_snapshots
+from services.thompson_sampling import ProbBestEstimate, ThompsonSampler, posterior_version
+
+# Sites recomputed at once by update_sites, each on its own session.
+STATS_UPDATE_CONCURRENCY = int(os.getenv("STATS_UPDATE_CONCURRENCY", "8"))
+# Processes for the posterior math; 0 keeps it on the worker threads.
+STATS_PROCESS_POOL_WORKERS = int(os.getenv("STATS_PROCESS_POOL_WORKERS", "0"))
+
+_posterior_pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class VariantCounts:
+    visitors: int
+    conversions: int
+
+    @property
+    def alpha(self) -> float:
+        return 1.0 + self.conversions
+
+    @property
+    def beta(self) -> float:
+        return 1.0 + (self.visitors - self.conversions)
+
+
+@dataclass
+class SiteStatsUpdate:
+    site_id: str
+    computed_at: datetime
+    counts: Dict[str, VariantCounts]
+    # Site's pending event count, read in the same statement as the rollups;
+    # None when the site has no active variants to read it alongside.
+    pending_events: Optional[int] = None
+
+    @property
+    def posteriors(self) -> List[Tuple[str, float, float]]:
+        return [(variant_id, c.alpha, c.beta) for variant_id, c in self.counts.items()]
+
+
+async def aggregate_site_stats(db: AsyncSession, site_id: str, full: bool = False) -> SiteStatsUpdate:
+    """Sum each active variant's hourly rollups into its counts.
+
+    One query over the rollups, so the cost grows with arms x hours rather
+    than with events. With ``full`` the site's rollups are first rebuilt from
+    the raw events, which repairs them after backfills or deletes; hours the
+    retention purge may have thinned keep their rollups.
+
+    The same query reads the site's pending event count. Ingest writes both
+    in one transaction, so the count matches exactly the events summed here.
+    """
+    site_uuid = uuid.UUID(site_id)
+    computed_at = datetime.utcnow()
+
+    if full:
+        await rebuild_site_rollups(db, site_id, since=retained_since())
+
+    pending = (
+        select(SiteActivity.pending_events)
+        .where(SiteActivity.site_id == site_uuid)
+        .scalar_subquery()
+    )
+    rows = (await db.execute(
+        select(Variant.id, EventRollup.event_type, func.sum(EventRollup.count), pending)
+        .join(EventRollup, and_(
+            EventRollup.site_id == Variant.site_id,
+            EventRollup.variant_id == Variant.id,
+            EventRollup.event_type.in_(["impression", "conversion"]),
+        ), isouter=True)
+        .where(Variant.site_id == site_uuid, Variant.status == "active")
+        .group_by(Variant.id, EventRollup.event_type)
+    )).all()
+
+    counts = {}
+    pending_events = None
+    for variant_id, event_type, count, site_pending in rows:
+        pending_events = site_pending or 0
+        variant_counts = counts.setdefault(str(variant_id), VariantCounts(visitors=0, conversions=0))
+        if event_type == "impression":
+            variant_counts.visitors += count
+        elif event_type == "conversion":
+            variant_counts.conversions += count
+
+    return SiteStatsUpdate(
+        site_id=site_id, computed_at=computed_at, counts=counts, pending_events=pending_events,
+    )
+
+
+async def write_site_stats(
+    db: AsyncSession,
+    update: SiteStatsUpdate,
+    estimate: Optional[ProbBestEstimate],
+) -> None:
+    """Upsert every variant's stats row in a single statement."""
+    if not update.counts:
+        return
+
+    prob_best = estimate.probabilities if estimate else {}
+    version = posterior_version(update.posteriors)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "variant_id": uuid.UUID(variant_id),
+            "visitors": c.visitors,
+            "conversions": c.conversions,
+            "alpha": c.alpha,
+            "beta": c.beta,
+            "prob_best": prob_best.get(variant_id, 0.0),
+            "prob_best_version": version,
+            "updated_at": now,
+        }
+        for variant_id, c in update.counts.items()
+    ]
+
+    stmt = dialect_insert(ExperimentStats, db.get_bind().dialect.name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ExperimentStats.variant_id],
+        set_={
+            column: stmt.excluded[column]
+            for column in (
+                "visitors", "conversions", "alpha", "beta",
+                "prob_best", "prob_best_version", "updated_at",
+            )
+        },
+    )
+    await db.execute(stmt, rows)
+
+
+async def estimate_site_stats(
+    update: SiteStatsUpdate,
+    estimate_prob_best: Callable[[List[Tuple[str, float, float]]], ProbBestEstimate] = ThompsonSampler.estimate_prob_best,
+    executor: Optional[Executor] = None,
+) -> Optional[ProbBestEstimate]:
+    """Run the posterior math off the event loop, on ``executor`` if given.
+
+    The result also seeds prob_best_cache, so the first stats read after an
+    update does not repeat the work.
+    """
+    if not update.counts:
+        return None
+    loop = asyncio.get_running_loop()
+    # Timed around the executor, since pool workers have their own metrics.
+    with sampler_timer("estimate_prob_best"):
+        estimate = await loop.run_in_executor(executor, estimate_prob_best, update.posteriors)
+    prob_best_cache.put(update.posteriors, estimate)
+    return estimate
+
+
+async def recompute_site_stats(
+    db: AsyncSession,
+    site_id: str,
+    full: bool = False,
+    estimate_prob_best: Callable[[List[Tuple[str, float, float]]], ProbBestEstimate] = ThompsonSampler.estimate_prob_best,
+) -> dict:
+    update = await aggregate_site_stats(db, site_id, full=full)
+    estimate = await estimate_site_stats(update, estimate_prob_best)
+    await write_site_stats(db, update, estimate)
+    await mark_recomputed(db, site_id, update.pending_events, update.computed_at)
+    await db.commit()
+    return stats_update_result(update, estimate)
+
+
+def stats_update_result(update: SiteStatsUpdate, estimate: Optional[ProbBestEstimate]) -> dict:
+    return {
+        "updated": list(update.counts),
+        "prob_best": estimate.probabilities if estimate else {},
+        "prob_best_method": estimate.method if estimate else None,
+        "prob_best_error_bound": estimate.error_bound if estimate else 0.0,
+    }
+
+
+def posterior_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared process pool for prob_best, created on first use."""
+    global _posterior_pool
+    if _posterior_pool is None and STATS_PROCESS_POOL_WORKERS > 0:
+        _posterior_pool = ProcessPoolExecutor(
+            max_workers=STATS_PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _posterior_pool
+
+
+def shutdown_posterior_pool() -> None:
+    global _posterior_pool
+    if _posterior_pool is not None:
+        _posterior_pool.shutdown()
+        _posterior_pool = None
+
+
+async def update_sites(
+    site_ids: List[str],
+    session_factory: Callable[[], AsyncSession],
+    concurrency: int = STATS_UPDATE_CONCURRENCY,
+    full: bool = False,
+    pool: Optional[ProcessPoolExecutor] = None,
+    publish: bool = False,
+) -> List[dict]:
+    """Recompute several sites concurrently, isolating each one.
+
+    At most ``concurrency`` sites are in flight, each with its own session
+    and transaction, so a failure rolls back only that site. The posterior
+    math runs on ``pool`` when given, otherwise on the default thread pool.
+    With ``publish`` each updated site's bundle is republished by the same
+    worker; a publish failure is reported as ``publish_error`` and leaves
+    the committed stats alone.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(site_id: str) -> dict:
+        async with semaphore:
+            start = time.perf_counter()
+            async with session_factory() as db:
+                try:
+                    update = await aggregate_site_stats(db, site_id, full=full)
+                    estimate = await estimate_site_stats(update, executor=pool)
+                    await write_site_stats(db, update, estimate)
+                    await mark_recomputed(db, site_id, update.pending_events, update.computed_at)
+                    await db.commit()
+                    result = {"site_id": site_id, "status": "success", **stats_update_result(update, estimate)}
+                except Exception as e:
+                    await db.rollback()
+                    result = {"site_id": site_id, "status": "error", "error": str(e)}
+                if publish and result["status"] == "success":
+                    site_snapshots.invalidate(site_id)
+                    publish_error = await try_publish_site_bundle(db, site_id)
+                    if publish_error is not None:
+                        result["publish_error"] = publish_error
+            result["duration_ms"] = (time.perf_counter() - start) * 1000
+            return result
+
+    return list(await asyncio.gather(*(run(site_id) for site_id in site_ids)))
@@ -1,7 +1,150 @@
 import random
-from typing import List, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 import hashlib
 
+import numpy as np
+from scipy.special import betainc, betaincinv, betaln
+
+# Upper bound on the number of Beta draws held in memory at once by
+# calculate_prob_best. With many arms the simulation is split into chunks of
+# rows so the sample matrix never exceeds this many float64 values (~8 MB).
+MAX_SAMPLE_ELEMENTS = 1_000_000
+
+# estimate_prob_best integrates exactly up to this many arms and falls back to
+# Monte Carlo above it.
+EXACT_MAX_ARMS = 4
+
+# Posterior mass ignored in each tail when bounding the integration range.
+_TAIL_MASS = 1e-12
+
+# Quantiles of every arm used as panel breakpoints, so each posterior is
+# resolved at its own scale even when one is far narrower than another.
+_BREAKPOINT_QUANTILES = np.array([
+    _TAIL_MASS, 1e-4, 0.05, 0.5, 0.95, 1 - 1e-4, 1 - _TAIL_MASS,
+])
+
+# Gauss-Legendre points per panel; the half-order rule gives the error estimate.
+_QUADRATURE_ORDER = 8
+
+
+@dataclass(frozen=True)
+class ProbBestEstimate:
+    probabilities: Dict[str, float]
+    method: str
+    error_bound: float
+
+
+@lru_cache(maxsize=None)
+def _legendre_rule(order: int) -> Tuple[np.ndarray, np.ndarray]:
+    return np.polynomial.legendre.leggauss(order)
+
+
+def _gauss_legendre_nodes(breakpoints: np.ndarray, order: int) -> Tuple[np.ndarray, np.ndarray]:
+    points, weights = _legendre_rule(order)
+    left, right = breakpoints[:-1, None], breakpoints[1:, None]
+    half_width = (right - left) / 2
+    nodes = left + half_width * (points + 1)
+    return nodes.ravel(), (half_width * weights).ravel()
+
+
+def _integrate_prob_best(
+    alphas: np.ndarray,
+    betas: np.ndarray,
+    breakpoints: np.ndarray,
+    order: int,
+) -> np.ndarray:
+    x, w = _gauss_legendre_nodes(breakpoints, order)
+    a, b = alphas[:, None], betas[:, None]
+    log_pdf = (a - 1) * np.log(x) + (b - 1) * np.log1p(-x) - betaln(a, b)
+    with np.errstate(divide="ignore"):
+        log_cdf = np.log(betainc(a, b, x))
+    # P(i is best) = integral of pdf_i(x) * prod_{j != i} cdf_j(x) dx
+    log_others = log_cdf.sum(axis=0) - log_cdf
+    integrand = np.exp(log_pdf + log_others)
+    return integrand @ w
+
+
+def posterior_version(variants: List[Tuple[str, float, float]]) -> str:
+    """Stable digest of a set of (variant_id, alpha, beta) posteriors."""
+    digest = hashlib.blake2b(digest_size=8)
+    for variant_id, alpha, beta in sorted(variants):
+        digest.update(f"{variant_id}:{float(alpha)!r}:{float(beta)!r};".encode())
+    return digest.hexdigest()
+
+
+def assignment_rng(site_id: str, visitor_id: str, version: str) -> np.random.Generator:
+    """Counter-based generator keyed on (site_id, visitor_id, version).
+
+    Philox output depends only on its key, so every process derives the same
+    stream for a visitor without seeding or sharing any mutable state.
+    """
+    key = hashlib.blake2b(
+        f"{site_id}\x1f{visitor_id}\x1f{version}".encode(), digest_size=16
+    ).digest()
+    return np.random.Generator(np.random.Philox(key=np.frombuffer(key, dtype=np.uint64)))
+
+
+def assignment_hash(site_id: str, visitor_id: str, version: str) -> Tuple[int, float]:
+    """Two independent draws from (site_id, visitor_id, version): an integer and a [0, 1) float."""
+    digest = hashlib.blake2b(
+        f"{site_id}\x1f{visitor_id}\x1f{version}".encode(), digest_size=16
+    ).digest()
+    column = int.from_bytes(digest[:8], "little")
+    coin = (int.from_bytes(digest[8:], "little") >> 11) * 2.0 ** -53
+    return column, coin
+
+
+@dataclass(frozen=True)
+class AliasTable:
+    """Walker alias table over variant ids for constant-time weighted picks.
+
+    Column ``i`` keeps ``variant_ids[i]`` with ``probability[i]`` and hands
+    the rest of its mass to ``variant_ids[alias[i]]``.
+    """
+    variant_ids: Tuple[str, ...]
+    probability: Tuple[float, ...]
+    alias: Tuple[int, ...]
+
+    @classmethod
+    def build(cls, weights: Dict[str, float]) -> "AliasTable":
+        """Vose's construction; weights need not be normalized."""
+        ids = tuple(sorted(weights))
+        total = sum(weights[v] for v in ids)
+        if not ids or total <= 0:
+            raise ValueError("Alias table needs a positive total weight")
+
+        n = len(ids)
+        scaled = [weights[v] * n / total for v in ids]
+        probability = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            lo, hi = small.pop(), large.pop()
+            probability[lo] = scaled[lo]
+            alias[lo] = hi
+            scaled[hi] -= 1.0 - scaled[lo]
+            (small if scaled[hi] < 1.0 else large).append(hi)
+        # Whatever is left is 1 up to rounding and keeps its own column.
+        return cls(variant_ids=ids, probability=tuple(probability), alias=tuple(alias))
+
+    def pick(self, column: int, coin: float) -> str:
+        column %= len(self.variant_ids)
+        if coin < self.probability[column]:
+            return self.variant_ids[column]
+        return self.variant_ids[self.alias[column]]
+
+    def weights(self) -> Dict[str, float]:
+        """Selection probability of each variant, recovered from the table."""
+        n = len(self.variant_ids)
+        result = {v: 0.0 for v in self.variant_ids}
+        for i, v in enumerate(self.variant_ids):
+            result[v] += self.probability[i] / n
+            result[self.variant_ids[self.alias[i]]] += (1.0 - self.probability[i]) / n
+        return result
+
 
 class ThompsonSampler:
     @staticmethod
@@ -12,13 +155,28 @@ class ThompsonSampler:
     def select_variant(
         variants: List[Tuple[str, float, float]],
         visitor_id: str = None,
+        site_id: str = "",
+        version: Optional[str] = None,
     ) -> str:
+        """Draw one Beta sample per variant and return the id of the largest.
+
+        With a ``visitor_id`` the draws come from assignment_rng, so the same
+        visitor gets the same variant on every worker for as long as the
+        posteriors (``version``) are unchanged. No global RNG state is touched.
+        """
         if not variants:
             raise ValueError("No variants to select from")
 
         if visitor_id:
-            seed = int(hashlib.md5(visitor_id.encode()).hexdigest()[:8], 16)
-            random.seed(seed)
+            ordered = sorted(variants)
+            if version is None:
+                version = posterior_version(ordered)
+            rng = assignment_rng(site_id, visitor_id, version)
+            samples = rng.beta(
+                np.array([v[1] for v in ordered], dtype=np.float64),
+                np.array([v[2] for v in ordered], dtype=np.float64),
+            )
+            return ordered[int(samples.argmax())][0]
 
         best_variant = None
         best_sample = -1
@@ -29,22 +187,147 @@ class ThompsonSampler:
                 best_sample = sample
                 best_variant = variant_id
 
-        random.seed()
         return best_variant
 
+    @staticmethod
+    def select_allocated(
+        table: AliasTable,
+        visitor_id: str,
+        site_id: str = "",
+        version: str = "",
+    ) -> str:
+        """Pick from a precomputed allocation by hashing the visitor.
+
+        Thompson sampling serves each arm with probability P(arm is best),
+        so a table built from prob_best allocates the same way in
+        expectation, in O(1) per visitor and without Beta draws. The pick is
+        stable for as long as ``version`` is.
+        """
+        column, coin = assignment_hash(site_id, visitor_id, version)
+        return table.pick(column, coin)
+
     @staticmethod
     def calculate_prob_best(
         variants: List[Tuple[str, float, float]],
         num_simulations: int = 10000,
+        seed: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> dict:
+        """Estimate P(variant is best) by Monte Carlo over the Beta posteriors.
+
+        Draws a (simulations x arms) matrix of Beta samples and counts the
+        argmax of each row. ``chunk_size`` caps the rows drawn per batch; by
+        default it is derived from MAX_SAMPLE_ELEMENTS. Passing ``seed`` makes
+        the result reproducible.
+        """
+        if not variants:
+            return {}
+
+        ids = [v[0] for v in variants]
+        alphas = np.array([v[1] for v in variants], dtype=np.float64)
+        betas = np.array([v[2] for v in variants], dtype=np.float64)
+
+        if chunk_size is None:
+            chunk_size = max(1, MAX_SAMPLE_ELEMENTS // len(variants))
+
+        rng = np.random.default_rng(seed)
+        wins = np.zeros(len(variants), dtype=np.int64)
+        remaining = num_simulations
+        while remaining > 0:
+            rows = min(chunk_size, remaining)
+            samples = rng.beta(alphas, betas, size=(rows, len(variants)))
+            wins += np.bincount(samples.argmax(axis=1), minlength=len(variants))
+            remaining -= rows
+
+        win_counts = {variant_id: 0 for variant_id in ids}
+        for variant_id, count in zip(ids, wins.tolist()):
+            win_counts[variant_id] += count
+
+        return {v: count / num_simulations for v, count in win_counts.items()}
+
+    @staticmethod
+    def calculate_prob_best_exact(
+        variants: List[Tuple[str, float, float]],
+    ) -> ProbBestEstimate:
+        """Compute P(variant is best) by numerical integration.
+
+        Integrates pdf_i * prod(cdf_j) with composite Gauss-Legendre over
+        panels split at quantiles of every posterior. The error bound is the
+        larger of the gap to the half-order rule and the deviation of the
+        total from 1, plus the truncated tail mass.
+        """
+        if not variants:
+            return ProbBestEstimate(probabilities={}, method="exact", error_bound=0.0)
+
+        alphas = np.array([v[1] for v in variants], dtype=np.float64)
+        betas = np.array([v[2] for v in variants], dtype=np.float64)
+
+        quantiles = betaincinv(alphas[:, None], betas[:, None], _BREAKPOINT_QUANTILES)
+        # Below the largest lower bound some other arm almost surely wins.
+        lower = quantiles[:, 0].max()
+        breakpoints = np.unique(quantiles)
+        breakpoints = breakpoints[(breakpoints >= lower) & (breakpoints > 0) & (breakpoints < 1)]
+        if len(breakpoints) < 2:
+            breakpoints = np.array([lower, 1.0 - _TAIL_MASS])
+
+        probs = _integrate_prob_best(alphas, betas, breakpoints, _QUADRATURE_ORDER)
+        coarse = _integrate_prob_best(alphas, betas, breakpoints, _QUADRATURE_ORDER // 2)
+        error_bound = max(
+            float(np.abs(probs - coarse).max()),
+            abs(1.0 - float(probs.sum())),
+        ) + 2 * len(variants) * _TAIL_MASS
+
+        probabilities = {v[0]: 0.0 for v in variants}
+        for variant, prob in zip(variants, np.clip(probs, 0.0, 1.0).tolist()):
+            probabilities[variant[0]] += prob
+
+        return ProbBestEstimate(probabilities=probabilities, method="exact", error_bound=error_bound)
+
+    @staticmethod
+    def estimate_prob_best(
+        variants: List[Tuple[str, float, float]],
+        exact_max_arms: int = EXACT_MAX_ARMS,
+        num_simulations: int = 10000,
+        seed: Optional[int] = None,
+    ) -> ProbBestEstimate:
+        """Pick exact integration for small arm counts, Monte Carlo otherwise.
+
+        The Monte Carlo error bound is three standard errors of the noisiest
+        arm, floored at one simulation's worth of probability.
+        """
+        if len(variants) <= exact_max_arms:
+            return ThompsonSampler.calculate_prob_best_exact(variants)
+
+        probabilities = ThompsonSampler.calculate_prob_best(
+            variants, num_simulations=num_simulations, seed=seed
+        )
+        p = np.array(list(probabilities.values()))
+        error_bound = max(3 * float(np.sqrt(p * (1 - p) / num_simulations).max()), 1 / num_simulations)
+        return ProbBestEstimate(
+            probabilities=probabilities,
+            method="monte_carlo",
+            error_bound=error_bound,
+        )
+
+    @staticmethod
+    def calculate_prob_best_reference(
+        variants: List[Tuple[str, float, float]],
+        num_simulations: int = 10000,
+        seed: Optional[int] = None,
     ) -> dict:
+        """Pure-Python, one-draw-at-a-time version of calculate_prob_best.
+
+        Kept as the reference the vectorized engine is validated against.
+        """
         if not variants:
             return {}
 
+        rng = random.Random(seed)
         win_counts = {v[0]: 0 for v in variants}
 
         for _ in range(num_simulations):
             samples = [
-                (v[0], ThompsonSampler.sample_beta(v[1], v[2]))
+                (v[0], rng.betavariate(v[1], v[2]))
                 for v in variants
             ]
             winner = max(samples, key=lambda x: x[1])[0]
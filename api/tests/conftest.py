@@ -1,60 +1,53 @@
 import os
+import tempfile
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
-# Set test database URL before importing app modules - use SQLite for testing
+# Set test database URL before importing app modules - use a SQLite file so
+# background workers opening their own sessions see the same data as tests.
 os.environ["DATABASE_URL"] = os.getenv(
     "TEST_DATABASE_URL",
-    "sqlite:///:memory:"
+    f"sqlite:///{tempfile.mkdtemp(prefix='evoloop-tests-')}/test.db"
 )
 
 from db.models import Base
-from db.connection import get_db
+from db.connection import engine as app_engine, async_engine, SessionLocal
 from index import app
+from services.event_batch import variant_owners
+from services.prob_best_cache import prob_best_cache
+from services.site_activity import site_activity_tally
+from services.site_bundles import manifest_cache
+from services.site_cache import site_snapshots
 
 
 @pytest.fixture(scope="session")
 def engine():
-    test_url = os.environ["DATABASE_URL"]
-    if test_url.startswith("sqlite"):
-        # SQLite in-memory requires special handling
-        engine = create_engine(
-            test_url,
-            connect_args={"check_same_thread": False},
-            poolclass=StaticPool
-        )
-    else:
-        engine = create_engine(test_url)
-    Base.metadata.create_all(bind=engine)
-    yield engine
-    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=app_engine)
+    yield app_engine
+    Base.metadata.drop_all(bind=app_engine)
 
 
 @pytest.fixture
-def db_session(engine):
-    connection = engine.connect()
-    transaction = connection.begin()
-    Session = sessionmaker(bind=connection)
-    session = Session()
-
-    # Override the get_db dependency
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            pass
+def route_engine(engine):
+    """The engine routes query through, for statement-counting listeners."""
+    return async_engine.sync_engine
 
-    app.dependency_overrides[get_db] = override_get_db
 
+@pytest.fixture
+def db_session(engine):
+    session = SessionLocal()
     yield session
 
     session.close()
-    transaction.rollback()
-    connection.close()
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
     app.dependency_overrides.clear()
+    site_snapshots.clear()
+    prob_best_cache.clear()
+    site_activity_tally.clear()
+    variant_owners.clear()
+    manifest_cache.clear()
 
 
 @pytest.fixture
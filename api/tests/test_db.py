@@ -0,0 +1,36 @@
+import time
+import uuid
+
+from sqlalchemy import text
+
+from db import get_async_db
+from db.connection import async_database_url
+from db.ids import uuid7
+
+
+def test_postgres_url_uses_asyncpg():
+    url = async_database_url(
+        "postgresql://user:pw@host/db?sslmode=require&channel_binding=require"
+    )
+    assert url.drivername == "postgresql+asyncpg"
+    assert dict(url.query) == {"ssl": "require"}
+
+
+def test_sqlite_url_uses_aiosqlite():
+    url = async_database_url("sqlite:////tmp/test.db")
+    assert url.drivername == "sqlite+aiosqlite"
+    assert url.database == "/tmp/test.db"
+
+
+async def test_async_session_dependency(db_session):
+    async for session in get_async_db():
+        assert (await session.execute(text("SELECT 1"))).scalar() == 1
+
+
+def test_uuid7_is_time_ordered():
+    before_ms = time.time_ns() // 1_000_000
+    ids = [uuid7() for _ in range(5000)]
+    assert all(i.version == 7 and i.variant == uuid.RFC_4122 for i in ids)
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert ids[0].int >> 80 >= before_ms
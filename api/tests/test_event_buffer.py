@@ -0,0 +1,198 @@
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from db.connection import SessionLocal
+from db.models import User, Site, Variant, Event
+from routes import runtime
+from services import event_buffer as event_buffer_module
+from services.event_buffer import EventBuffer
+
+
+def make_row(site_id, variant_id, visitor_id="visitor", event_type="impression"):
+    return {
+        "id": uuid.uuid4(),
+        "site_id": site_id,
+        "variant_id": variant_id,
+        "visitor_id": visitor_id,
+        "event_type": event_type,
+        "event_metadata": {},
+        "created_at": datetime.utcnow(),
+    }
+
+
+@pytest.fixture
+def buffer(db_session):
+    return EventBuffer(
+        session_factory=SessionLocal,
+        max_size=100,
+        batch_size=10,
+        flush_interval=0.05,
+    )
+
+
+@pytest.fixture
+def ids(db_session):
+    user = User(id=uuid.uuid4(), email="buffer@example.com", password_hash="fake")
+    site = Site(id=uuid.uuid4(), user_id=user.id, url="https://buffer-test.com", status="running")
+    variant = Variant(id=uuid.uuid4(), site_id=site.id, patch={"headline": "Hi"}, status="active")
+    db_session.add_all([user, site, variant])
+    db_session.commit()
+    return site.id, variant.id
+
+
+class TestEventBuffer:
+    def test_flush_writes_in_batches(self, db_session, buffer, ids):
+        for i in range(25):
+            assert buffer.put(make_row(*ids, visitor_id=f"v{i}"))
+
+        assert buffer.flush() == 25
+        assert db_session.query(Event).filter(Event.site_id == ids[0]).count() == 25
+        metrics = buffer.metrics()
+        assert metrics["flushes"] == 3
+        assert metrics["flushed"] == 25
+        assert metrics["queue_depth"] == 0
+
+    def test_put_rejects_when_full(self, buffer, ids):
+        for _ in range(100):
+            assert buffer.put(make_row(*ids))
+        assert not buffer.put(make_row(*ids))
+        assert buffer.metrics()["rejected"] == 1
+
+    def test_failed_flush_is_counted(self, db_session, buffer, ids):
+        buffer.put({"id": uuid.uuid4(), "site_id": ids[0]})
+        assert buffer.flush() == 1
+        assert buffer.metrics()["failed"] == 1
+        assert buffer.metrics()["flushed"] == 0
+
+    def test_bad_row_does_not_drop_its_batch(self, db_session, buffer, ids):
+        for i in range(10):
+            row = make_row(*ids, visitor_id=f"v{i}")
+            if i == 3:
+                row["visitor_id"] = None
+            buffer.put(row)
+
+        assert buffer.flush() == 10
+        metrics = buffer.metrics()
+        assert metrics["flushed"] == 9
+        assert metrics["failed"] == 1
+        assert db_session.query(Event).filter(Event.site_id == ids[0]).count() == 9
+
+    def test_unavailable_database_is_retried(self, db_session, buffer, ids, monkeypatch):
+        real_insert = event_buffer_module.insert_events
+        calls = []
+
+        def flaky_insert(db, rows):
+            calls.append(len(rows))
+            if len(calls) == 1:
+                raise RuntimeError("connection lost")
+            real_insert(db, rows)
+
+        monkeypatch.setattr(event_buffer_module, "insert_events", flaky_insert)
+        for i in range(15):
+            buffer.put(make_row(*ids, visitor_id=f"v{i}"))
+
+        assert buffer.flush() == 0
+        assert buffer.metrics()["retry_depth"] == 10
+        assert buffer.metrics()["queue_depth"] == 5
+
+        assert buffer.flush() == 15
+        metrics = buffer.metrics()
+        assert metrics["flushed"] == 15
+        assert metrics["retried"] == 10
+        assert metrics["failed"] == 0
+        assert db_session.query(Event).filter(Event.site_id == ids[0]).count() == 15
+
+    def test_retries_are_bounded(self, buffer, ids, monkeypatch):
+        def failing_insert(db, rows):
+            raise RuntimeError("connection lost")
+
+        monkeypatch.setattr(event_buffer_module, "insert_events", failing_insert)
+        buffer.max_attempts = 2
+        for _ in range(3):
+            buffer.put(make_row(*ids))
+
+        assert buffer.flush() == 0
+        assert buffer.flush() == 3
+        assert buffer.metrics()["failed"] == 3
+        assert buffer.metrics()["retry_depth"] == 0
+
+    def test_background_flusher_and_stop(self, db_session, buffer, ids):
+        buffer.start()
+        assert buffer.running
+        buffer.put(make_row(*ids))
+
+        deadline = time.monotonic() + 5
+        while buffer.metrics()["flushed"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert buffer.metrics()["flushed"] == 1
+
+        for _ in range(5):
+            buffer.put(make_row(*ids))
+        buffer.stop()
+        assert not buffer.running
+        assert db_session.query(Event).filter(Event.site_id == ids[0]).count() == 6
+
+
+class TestBufferedEventEndpoint:
+    def test_event_is_queued_when_buffer_runs(
+        self, client: TestClient, db_session, buffer, ids, monkeypatch
+    ):
+        monkeypatch.setattr(runtime, "event_buffer", buffer)
+        buffer.start()
+        try:
+            response = client.post(
+                "/v1/event",
+                json={
+                    "site_id": str(ids[0]),
+                    "variant_id": str(ids[1]),
+                    "visitor_id": "buffered-visitor",
+                    "type": "impression",
+                },
+            )
+        finally:
+            buffer.stop()
+
+        assert response.json()["status"] == "queued"
+        assert db_session.query(Event).filter(Event.visitor_id == "buffered-visitor").count() == 1
+
+    def test_event_is_recorded_synchronously_by_default(self, client: TestClient, db_session, ids):
+        response = client.post(
+            "/v1/event",
+            json={
+                "site_id": str(ids[0]),
+                "variant_id": str(ids[1]),
+                "visitor_id": "sync-visitor",
+                "type": "impression",
+            },
+        )
+        assert response.json()["status"] == "recorded"
+
+    def test_event_for_unknown_variant_is_rejected(
+        self, client: TestClient, db_session, buffer, ids, monkeypatch
+    ):
+        monkeypatch.setattr(runtime, "event_buffer", buffer)
+        buffer.start()
+        try:
+            response = client.post(
+                "/v1/event",
+                json={
+                    "site_id": str(ids[0]),
+                    "variant_id": str(uuid.uuid4()),
+                    "visitor_id": "lost-visitor",
+                    "type": "impression",
+                },
+            )
+        finally:
+            buffer.stop()
+
+        assert response.status_code == 422
+        assert "variant_id" in response.json()["detail"]
+        assert buffer.metrics()["enqueued"] == 0
+
+    def test_ingest_stats_endpoint(self, client: TestClient):
+        data = client.get("/api/stats/ingest").json()
+        assert data["mode"] == "sync"
+        assert "queue_depth" in data
@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from db.connection import AsyncSessionLocal
+from db.models import User, Site, Variant
+from services.event_buffer import insert_events
+from services.event_export import event_batches, write_export
+
+NOW = datetime(2026, 10, 18, 12, 0, 0)
+
+
+@pytest.fixture
+def export_site(db_session):
+    user = User(id=uuid.uuid4(), email="export@example.com", password_hash="fake")
+    site = Site(id=uuid.uuid4(), user_id=user.id, url="https://export-test.com", status="running")
+    variant = Variant(id=uuid.uuid4(), site_id=site.id, patch={}, status="active")
+    db_session.add_all([user, site, variant])
+    db_session.commit()
+
+    # One event per hour over the last ten hours, plus another site's event.
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "site_id": site.id,
+            "variant_id": variant.id,
+            "visitor_id": f"visitor-{i}",
+            "event_type": "conversion" if i % 5 == 0 else "impression",
+            "event_metadata": {"n": i},
+            "created_at": NOW - timedelta(hours=i),
+        }
+        for i in range(10)
+    ]
+    rows.append({**rows[0], "id": uuid.uuid4(), "site_id": uuid.uuid4()})
+    insert_events(db_session, rows)
+    db_session.commit()
+    return site
+
+
+def test_export_ndjson(client: TestClient, export_site):
+    response = client.get(f"/api/sites/{export_site.id}/events/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "attachment" in response.headers["content-disposition"]
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert len(events) == 10
+    assert {e["site_id"] for e in events} == {str(export_site.id)}
+    assert sorted(e["event_metadata"]["n"] for e in events) == list(range(10))
+
+
+def test_export_csv_time_range(client: TestClient, export_site):
+    since = (NOW - timedelta(hours=3)).isoformat()
+    until = NOW.isoformat()
+    response = client.get(
+        f"/api/sites/{export_site.id}/events/export",
+        params={"format": "csv", "since": since, "until": until},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert sorted(json.loads(r["event_metadata"])["n"] for r in rows) == [1, 2, 3]
+
+
+def test_export_parquet(client: TestClient, export_site):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get(f"/api/sites/{export_site.id}/events/export", params={"format": "parquet"})
+    assert response.status_code == 200
+
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 10
+    assert set(table.column("event_type").to_pylist()) == {"impression", "conversion"}
+    assert max(table.column("created_at").to_pylist()) == NOW
+
+
+def test_export_rejects_unknown_site_and_format(client: TestClient, export_site):
+    assert client.get(f"/api/sites/{uuid.uuid4()}/events/export").status_code == 404
+    response = client.get(f"/api/sites/{export_site.id}/events/export", params={"format": "xlsx"})
+    assert response.status_code == 422
+
+
+async def test_events_are_read_in_batches(export_site):
+    sizes = [
+        len(batch)
+        async for batch in event_batches(AsyncSessionLocal, export_site.id, batch_size=4)
+    ]
+    assert sizes == [4, 4, 2]
+
+
+async def test_cli_writes_export(export_site):
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = io.BytesIO()
+    written = await write_export(out, AsyncSessionLocal, export_site.id, "parquet", batch_size=3)
+    assert written == len(out.getvalue())
+
+    parquet = pq.ParquetFile(io.BytesIO(out.getvalue()))
+    assert parquet.metadata.num_rows == 10
+    assert parquet.metadata.num_row_groups == 4
@@ -0,0 +1,160 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from db.connection import AsyncSessionLocal, async_engine
+from db.models import User, Site, Variant, Event, EventRollup
+from services import event_retention
+from services.event_buffer import insert_events
+
+
+requires_postgres = pytest.mark.skipif(
+    async_engine.dialect.name != "postgresql", reason="partitioning is PostgreSQL only"
+)
+
+
+def add_events(db_session, count, created_at):
+    site_id, variant_id = uuid.uuid4(), uuid.uuid4()
+    insert_events(db_session, [
+        {
+            "id": uuid.uuid4(),
+            "site_id": site_id,
+            "variant_id": variant_id,
+            "visitor_id": f"visitor-{i}",
+            "event_type": "impression",
+            "event_metadata": {},
+            "created_at": created_at,
+        }
+        for i in range(count)
+    ])
+    db_session.commit()
+
+
+class TestPartitionNaming:
+    def test_add_months_crosses_years(self):
+        assert event_retention.add_months(datetime(2026, 11, 1), 3) == datetime(2027, 2, 1)
+        assert event_retention.add_months(datetime(2026, 1, 1), -1) == datetime(2025, 12, 1)
+
+    def test_partition_name_round_trips(self):
+        name = event_retention.partition_name(datetime(2026, 10, 1))
+        assert name == "events_p202610"
+        assert event_retention.partition_month(name) == datetime(2026, 10, 1)
+        assert event_retention.partition_month("events_default") is None
+
+
+class TestPurge:
+    async def test_unpartitioned_purge_deletes_in_chunks(self, db_session):
+        now = datetime.utcnow()
+        add_events(db_session, 25, now - timedelta(days=40))
+        add_events(db_session, 5, now - timedelta(days=1))
+
+        async with AsyncSessionLocal() as db:
+            result = await event_retention.purge_expired_events(db, retention_days=30, chunk_size=10)
+
+        assert result["mode"] == "delete"
+        assert result["deleted"] == 25
+        assert result["chunks"] == 3
+        assert db_session.query(Event).count() == 5
+        # Rollups outlive the raw events, so stats are unaffected.
+        assert sum(r.count for r in db_session.query(EventRollup)) == 30
+
+    async def test_default_partition_is_trimmed_in_chunks(self, db_session, monkeypatch):
+        # Stands in for a partitioned table whose only partition is the
+        # default one; events itself plays that partition here.
+        async def partitioned(db):
+            return True
+
+        async def no_monthly_partitions(db):
+            return []
+
+        async def events_default(db):
+            return "events"
+
+        monkeypatch.setattr(event_retention, "is_partitioned", partitioned)
+        monkeypatch.setattr(event_retention, "list_event_partitions", no_monthly_partitions)
+        monkeypatch.setattr(event_retention, "default_partition", events_default)
+        now = datetime.utcnow()
+        add_events(db_session, 12, now - timedelta(days=40))
+        add_events(db_session, 3, now - timedelta(days=1))
+
+        async with AsyncSessionLocal() as db:
+            result = await event_retention.purge_expired_events(db, retention_days=30, chunk_size=5)
+
+        assert result["mode"] == "partitions"
+        assert result["partitions"] == []
+        assert (result["deleted"], result["chunks"]) == (12, 3)
+        assert db_session.query(Event).count() == 3
+
+    async def test_retention_can_be_disabled(self, db_session):
+        add_events(db_session, 3, datetime.utcnow() - timedelta(days=4000))
+        async with AsyncSessionLocal() as db:
+            result = await event_retention.purge_expired_events(db, retention_days=0)
+        assert result["mode"] == "disabled"
+        assert db_session.query(Event).count() == 3
+
+    async def test_unknown_action_is_rejected(self, db_session):
+        async with AsyncSessionLocal() as db:
+            with pytest.raises(ValueError):
+                await event_retention.purge_expired_events(db, action="truncate")
+
+    def test_retention_endpoint(self, client: TestClient, db_session, monkeypatch):
+        monkeypatch.setattr(event_retention, "EVENTS_RETENTION_DAYS", 7)
+        add_events(db_session, 4, datetime.utcnow() - timedelta(days=8))
+
+        response = client.post("/api/maintenance/events/retention")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["partitions_created"] == []
+        assert data["deleted"] == 4
+
+
+@requires_postgres
+class TestPartitions:
+    async def test_new_partition_takes_over_rows_from_default(self, db_session):
+        # create_all schemas start with only the default partition, so this
+        # month's events are already sitting in it.
+        user = User(id=uuid.uuid4(), email="partitions@example.com", password_hash="fake")
+        site = Site(id=uuid.uuid4(), user_id=user.id, url="https://partitions.com", status="running")
+        variant = Variant(id=uuid.uuid4(), site_id=site.id, patch={}, status="active")
+        db_session.add_all([user, site, variant])
+        db_session.commit()
+        month = event_retention.month_start(datetime.utcnow()) + timedelta(days=1)
+        name = event_retention.partition_name(month)
+        insert_events(db_session, [
+            {
+                "id": uuid.uuid4(), "site_id": site.id, "variant_id": variant.id,
+                "visitor_id": f"visitor-{i}", "event_type": "impression",
+                "event_metadata": {}, "created_at": month + timedelta(hours=i),
+            }
+            for i in range(5)
+        ])
+        db_session.commit()
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            await db.commit()
+            try:
+                created = await event_retention.ensure_event_partitions(db, now=month, months_ahead=0)
+                assert created == [name]
+                assert await db.scalar(text(f"SELECT count(*) FROM {name}")) == 5
+                assert await db.scalar(text("SELECT count(*) FROM events_default")) == 0
+                assert await event_retention.default_partition(db) == "events_default"
+            finally:
+                await db.rollback()
+                await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                await db.commit()
+
+    async def test_purge_trims_the_default_partition(self, db_session):
+        # No monthly partition covers 2001, so these rows land in the default.
+        add_events(db_session, 4, datetime(2001, 1, 1))
+        add_events(db_session, 2, datetime.utcnow())
+
+        async with AsyncSessionLocal() as db:
+            result = await event_retention.purge_expired_events(db, retention_days=30, action="drop")
+
+        assert result["deleted"] == 4
+        assert db_session.query(Event).filter(Event.created_at < datetime(2002, 1, 1)).count() == 0
+        assert db_session.query(Event).count() == 2
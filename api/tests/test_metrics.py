@@ -0,0 +1,88 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from db.models import User, Site, Variant, ExperimentStats
+from services import metrics as metrics_module
+from services.metrics import Histogram, metrics, sampler_timer
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    metrics.clear()
+    yield
+    metrics.clear()
+
+
+@pytest.fixture
+def metrics_site(db_session):
+    user = User(id=uuid.uuid4(), email="metrics@example.com", password_hash="fake")
+    site = Site(id=uuid.uuid4(), user_id=user.id, url="https://metrics-test.com", status="running")
+    variant = Variant(id=uuid.uuid4(), site_id=site.id, patch={"headline": "Hi"}, status="active")
+    db_session.add_all([user, site, variant, ExperimentStats(variant_id=variant.id)])
+    db_session.commit()
+    return site
+
+
+def sample(text: str, line_prefix: str) -> float:
+    values = [float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(line_prefix)]
+    assert len(values) == 1, line_prefix
+    return values[0]
+
+
+def test_requests_are_timed_per_route_template(client: TestClient, metrics_site):
+    for _ in range(3):
+        client.get("/v1/assign", params={"site_id": str(metrics_site.id), "visitor_id": "v1"})
+    client.get(f"/api/sites/{uuid.uuid4()}/purge")
+    client.get("/no/such/path")
+
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    assign = 'method="GET",route="/v1/assign"'
+    assert sample(text, f'evoloop_http_request_duration_seconds_count{{{assign},status="200"}}') == 3
+    assert sample(text, f'evoloop_http_request_duration_seconds_bucket{{{assign},status="200",le="+Inf"}}') == 3
+    assert 'route="/api/sites/{site_id}/purge",status="404"' in text
+    assert 'route="unmatched",status="404"' in text
+
+    # The first assign loads the snapshot; the other two come from the cache.
+    assert sample(text, f"evoloop_http_request_db_queries_count{{{assign}}}") == 3
+    assert sample(text, f"evoloop_http_request_db_queries_sum{{{assign}}}") >= 1
+    assert sample(text, f'evoloop_http_request_db_queries_bucket{{{assign},le="0.0"}}') == 2
+    assert sample(text, "evoloop_db_query_duration_seconds_count") >= 1
+
+    assert sample(text, 'evoloop_sampler_duration_seconds_count{operation="select_variant"}') == 3
+    assert "evoloop_event_buffer_queue_depth 0.0" in text
+
+
+def test_stats_update_times_prob_best(client: TestClient, metrics_site):
+    client.post(f"/api/stats/update/{metrics_site.id}")
+    text = client.get("/api/metrics").text
+    assert sample(text, 'evoloop_sampler_duration_seconds_count{operation="estimate_prob_best"}') == 1
+    update = 'method="POST",route="/api/stats/update/{site_id}"'
+    assert sample(text, f"evoloop_http_request_db_queries_sum{{{update}}}") >= 3
+
+
+def test_histogram_buckets_are_cumulative_and_escaped():
+    histogram = Histogram("h", "Test.", ("path",), (1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(('a"b',), value)
+    assert histogram.render() == [
+        "# HELP h Test.",
+        "# TYPE h histogram",
+        'h_bucket{path="a\\"b",le="1.0"} 2',
+        'h_bucket{path="a\\"b",le="5.0"} 3',
+        'h_bucket{path="a\\"b",le="+Inf"} 4',
+        'h_sum{path="a\\"b"} 14.5',
+        'h_count{path="a\\"b"} 4',
+    ]
+
+
+def test_sampler_timer_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(metrics_module, "METRICS_ENABLED", False)
+    with sampler_timer("select_variant"):
+        pass
+    assert metrics.sampler_seconds.count(("select_variant",)) == 0
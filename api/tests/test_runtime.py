@@ -1,6 +1,15 @@
+import gzip
+import json
 import pytest
 from fastapi.testclient import TestClient
-from db.models import User, Site, Variant, ExperimentStats
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from db.models import User, Site, Variant, ExperimentStats, Event
+from routes import runtime
+from services import event_batch
+from services.site_cache import site_snapshots
+from services.thompson_sampling import posterior_version
+from db.patches import patch_hash
 import uuid
 
 
@@ -94,3 +103,289 @@ class TestRuntimeEndpoints:
             },
         )
         assert response.status_code == 200
+
+    def test_assign_served_from_snapshot_without_queries(
+        self, client: TestClient, db_session, running_site, route_engine
+    ):
+        site_id = running_site.id
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(route_engine, "before_cursor_execute", count)
+        try:
+            client.get(f"/v1/assign?site_id={site_id}&visitor_id=warm-up")
+            assert statements
+            statements.clear()
+            response = client.get(f"/v1/assign?site_id={site_id}&visitor_id=cached")
+        finally:
+            event.remove(route_engine, "before_cursor_execute", count)
+
+        assert response.status_code == 200
+        assert statements == []
+        assert client.get("/api/stats/cache").json()["assign_snapshots"]["hits"] >= 1
+
+    def test_assign_returns_patch_for_selected_variant(self, client: TestClient, db_session, running_site):
+        patches = {str(v.id): v.patch for v in running_site.variants}
+        data = client.get(f"/v1/assign?site_id={running_site.id}&visitor_id=patch-visitor").json()
+        assert data["patch"] == patches[data["variant_id"]]
+
+    def test_assign_sees_killed_variant_after_invalidation(
+        self, client: TestClient, db_session, running_site
+    ):
+        variant_ids = [str(v.id) for v in running_site.variants]
+        client.get(f"/v1/assign?site_id={running_site.id}&visitor_id=warm-up")
+
+        client.patch(f"/api/variants/{variant_ids[0]}", json={"status": "killed"})
+
+        for i in range(20):
+            data = client.get(f"/v1/assign?site_id={running_site.id}&visitor_id=v{i}").json()
+            assert data["variant_id"] == variant_ids[1]
+
+    def test_assign_rejects_paused_site_after_invalidation(
+        self, client: TestClient, db_session, running_site
+    ):
+        client.get(f"/v1/assign?site_id={running_site.id}&visitor_id=warm-up")
+        client.patch(f"/api/sites/{running_site.id}", json={"status": "analyzed"})
+
+        response = client.get(f"/v1/assign?site_id={running_site.id}&visitor_id=warm-up")
+        assert response.status_code == 404
+
+
+class TestPatchDelivery:
+    def test_assign_without_inline_patch(self, client: TestClient, db_session, running_site):
+        inline = client.get(f"/v1/assign?site_id={running_site.id}&visitor_id=ref-visitor").json()
+        response = client.get(
+            f"/v1/assign?site_id={running_site.id}&visitor_id=ref-visitor&inline_patch=false"
+        )
+        data = response.json()
+        assert data == {"variant_id": inline["variant_id"], "patch_hash": inline["patch_hash"]}
+        assert response.headers["cache-control"] == "private, no-cache"
+
+        patch = client.get(f"/v1/patches/{data['patch_hash']}")
+        assert patch.status_code == 200
+        assert patch.json() == inline["patch"]
+        assert "immutable" in patch.headers["cache-control"]
+        assert patch.headers["etag"] == f'"{data["patch_hash"]}"'
+
+    def test_patch_hash_is_content_address(self, client: TestClient, db_session, running_site):
+        for variant in running_site.variants:
+            assert variant.patch_hash == patch_hash(variant.patch)
+        assert client.get(f"/v1/patches/{patch_hash({'missing': True})}").status_code == 404
+
+    def test_conditional_assign_and_patch(self, client: TestClient, db_session, running_site):
+        url = f"/v1/assign?site_id={running_site.id}&visitor_id=returning"
+        first = client.get(url)
+        repeat = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+        assert repeat.status_code == 304
+        assert repeat.content == b""
+
+        # The ETag differs by delivery mode, since the bodies do.
+        ref = client.get(url + "&inline_patch=false", headers={"If-None-Match": first.headers["etag"]})
+        assert ref.status_code == 200
+
+        patch_url = f"/v1/patches/{first.json()['patch_hash']}"
+        etag = client.get(patch_url).headers["etag"]
+        assert client.get(patch_url, headers={"If-None-Match": etag}).status_code == 304
+
+
+class TestAllocationAssignment:
+    def store_prob_best(self, db_session, site, weights):
+        stats = [v.stats for v in site.variants]
+        version = posterior_version([(str(s.variant_id), s.alpha, s.beta) for s in stats])
+        for s in stats:
+            s.prob_best = weights[str(s.variant_id)]
+            s.prob_best_version = version
+        db_session.commit()
+
+    def test_assign_follows_stored_allocation(
+        self, client: TestClient, db_session, running_site, monkeypatch
+    ):
+        monkeypatch.setattr(runtime, "ASSIGN_MODE", "allocation")
+        losing, winning = (str(v.id) for v in running_site.variants)
+        self.store_prob_best(db_session, running_site, {losing: 0.0, winning: 1.0})
+
+        assigned = {
+            client.get(f"/v1/assign?site_id={running_site.id}&visitor_id=v{i}").json()["variant_id"]
+            for i in range(30)
+        }
+        assert assigned == {winning}
+
+    def test_stale_allocation_falls_back_to_sampling(
+        self, client: TestClient, db_session, running_site, monkeypatch
+    ):
+        monkeypatch.setattr(runtime, "ASSIGN_MODE", "allocation")
+        losing, winning = (str(v.id) for v in running_site.variants)
+        self.store_prob_best(db_session, running_site, {losing: 0.0, winning: 1.0})
+        # A slight posterior change invalidates the stored allocation, and the
+        # near-even posteriors then split traffic between both arms.
+        running_site.variants[0].stats.alpha = 1.01
+        db_session.commit()
+
+        assigned = {
+            client.get(f"/v1/assign?site_id={running_site.id}&visitor_id=v{i}").json()["variant_id"]
+            for i in range(30)
+        }
+        assert assigned == {losing, winning}
+
+
+class TestBatchEventEndpoint:
+    def event(self, site, visitor_id, event_type="impression"):
+        return {
+            "site_id": str(site.id),
+            "variant_id": str(site.variants[0].id),
+            "visitor_id": visitor_id,
+            "type": event_type,
+        }
+
+    def count_events(self, db_session, site):
+        return db_session.query(Event).filter(Event.site_id == site.id).count()
+
+    def test_json_array_batch(self, client: TestClient, db_session, running_site):
+        events = [self.event(running_site, f"batch-{i}") for i in range(25)]
+        response = client.post("/v1/events", json=events)
+        assert response.status_code == 200
+        assert response.json() == {"accepted": 25, "rejected": []}
+        assert self.count_events(db_session, running_site) == 25
+
+    def test_ndjson_stream_with_rejects(self, client: TestClient, db_session, running_site):
+        lines = [
+            json.dumps(self.event(running_site, "ok-1")),
+            '{"site_id": "not-json"',
+            json.dumps({"site_id": str(running_site.id), "type": "impression"}),
+            "",
+            json.dumps({**self.event(running_site, "bad-uuid"), "variant_id": "nope"}),
+            json.dumps(self.event(running_site, "ok-2", "conversion")),
+        ]
+
+        def body():
+            for line in lines:
+                yield (line + "\n").encode()
+
+        response = client.post(
+            "/v1/events",
+            content=body(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["accepted"] == 2
+        assert [r["index"] for r in data["rejected"]] == [1, 2, 3]
+        assert "visitor_id" in data["rejected"][1]["error"]
+        assert self.count_events(db_session, running_site) == 2
+
+    def test_unknown_targets_are_rejected_per_index(self, client: TestClient, db_session, running_site):
+        events = [
+            self.event(running_site, "known-1"),
+            {**self.event(running_site, "unknown-variant"), "variant_id": str(uuid.uuid4())},
+            {**self.event(running_site, "unknown-site"), "site_id": str(uuid.uuid4())},
+            self.event(running_site, "known-2"),
+        ]
+        response = client.post("/v1/events", json=events)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["accepted"] == 2
+        assert data["rejected"] == [
+            {"index": 1, "error": "variant_id: not a variant of this site"},
+            {"index": 2, "error": "site_id: unknown or deleted site"},
+        ]
+        assert self.count_events(db_session, running_site) == 2
+
+    def test_events_for_a_killed_variant_are_kept(self, client: TestClient, db_session, running_site):
+        killed = running_site.variants[0]
+        killed.status = "killed"
+        db_session.commit()
+
+        response = client.post("/v1/events", json=[self.event(running_site, "late-conversion", "conversion")])
+        assert response.json() == {"accepted": 1, "rejected": []}
+        single = client.post("/v1/event", json=self.event(running_site, "late-impression"))
+        assert single.status_code == 200
+
+    def test_unknown_variants_leave_the_snapshot_alone(
+        self, client: TestClient, db_session, running_site, route_engine
+    ):
+        other_site = Site(id=uuid.uuid4(), user_id=running_site.user_id, url="https://other.com", status="running")
+        foreign = Variant(id=uuid.uuid4(), site_id=other_site.id, patch={}, status="active")
+        db_session.add_all([other_site, foreign])
+        db_session.commit()
+        junk = str(uuid.uuid4())
+        client.get(f"/v1/assign?site_id={running_site.id}&visitor_id=warm")
+        invalidations = site_snapshots.stats()["invalidations"]
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(route_engine, "before_cursor_execute", count)
+        try:
+            for variant_id in (junk, junk, str(foreign.id)):
+                response = client.post("/v1/event", json={**self.event(running_site, "v"), "variant_id": variant_id})
+                assert response.status_code == 422
+                assert response.json()["detail"] == "variant_id: not a variant of this site"
+        finally:
+            event.remove(route_engine, "before_cursor_execute", count)
+
+        assert site_snapshots.stats()["invalidations"] == invalidations
+        # One lookup per unknown id; the repeat is answered from memory.
+        assert len(statements) == 2
+
+    def test_rows_refused_by_the_database_are_rejected_alone(
+        self, client: TestClient, db_session, running_site, monkeypatch
+    ):
+        real_insert = runtime.insert_events
+
+        def insert_refusing_poison(db, rows, *args):
+            if any(row["visitor_id"] == "poison" for row in rows):
+                raise IntegrityError("INSERT INTO events", {}, Exception("foreign key violation"))
+            real_insert(db, rows, *args)
+
+        monkeypatch.setattr(runtime, "insert_events", insert_refusing_poison)
+        events = [self.event(running_site, v) for v in ("ok-1", "poison", "ok-2")]
+        response = client.post("/v1/events", json=events)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["accepted"] == 2
+        assert [r["index"] for r in data["rejected"]] == [1]
+        assert self.count_events(db_session, running_site) == 2
+
+    def test_gzip_ndjson_batch(self, client: TestClient, db_session, running_site):
+        body = "\n".join(json.dumps(self.event(running_site, f"gz-{i}")) for i in range(10))
+        response = client.post(
+            "/v1/events",
+            content=gzip.compress(body.encode()),
+            headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+        )
+        assert response.json()["accepted"] == 10
+        assert self.count_events(db_session, running_site) == 10
+
+    def test_malformed_array_is_rejected(self, client: TestClient, db_session, running_site):
+        response = client.post(
+            "/v1/events", content=b'{"not": "a list"}', headers={"Content-Type": "application/json"}
+        )
+        assert response.status_code == 400
+
+    def test_invalid_gzip_is_rejected(self, client: TestClient, db_session, running_site):
+        response = client.post(
+            "/v1/events",
+            content=b"definitely not gzip",
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+        assert response.status_code == 400
+
+    def test_oversized_batch_stores_nothing(self, client: TestClient, db_session, running_site, monkeypatch):
+        monkeypatch.setattr(event_batch, "EVENT_BATCH_MAX_RECORDS", 5)
+        events = [self.event(running_site, f"big-{i}") for i in range(6)]
+        response = client.post("/v1/events", json=events)
+        assert response.status_code == 413
+        assert self.count_events(db_session, running_site) == 0
+
+    def test_gzip_bomb_is_rejected(self, client: TestClient, db_session, running_site, monkeypatch):
+        monkeypatch.setattr(event_batch, "EVENT_BATCH_MAX_BYTES", 1024)
+        response = client.post(
+            "/v1/events",
+            content=gzip.compress(b"[" + b" " * 100_000 + b"]"),
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+        assert response.status_code == 413
@@ -0,0 +1,159 @@
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from db.models import User, Site, Variant, ExperimentStats
+from services import site_bundles
+from services.site_bundles import LocalBundleStore, MemoryBundleStore, bundle_manifest, manifest_cache
+
+
+@pytest.fixture(params=["local", "memory"])
+def store(request, tmp_path, monkeypatch):
+    store = LocalBundleStore(str(tmp_path)) if request.param == "local" else MemoryBundleStore()
+    monkeypatch.setattr(site_bundles, "bundle_store", store)
+    return store
+
+
+@pytest.fixture
+def bundle_site(db_session):
+    user = User(id=uuid.uuid4(), email="bundles@example.com", password_hash="fake")
+    site = Site(id=uuid.uuid4(), user_id=user.id, url="https://bundle-test.com", status="running")
+    variants = [
+        Variant(id=uuid.uuid4(), site_id=site.id, patch={"headline": f"V{i}"}, status="active")
+        for i in range(2)
+    ]
+    db_session.add_all([user, site, *variants])
+    db_session.add_all([ExperimentStats(variant_id=v.id) for v in variants])
+    db_session.commit()
+    return site
+
+
+def published_versions(store, site):
+    return sorted(k for k in store.keys(f"{site.id}/") if k.endswith(".json"))
+
+
+def test_stats_update_publishes_bundle(client: TestClient, store, bundle_site):
+    client.post(f"/api/stats/update/{bundle_site.id}")
+    version = bundle_manifest(store)[str(bundle_site.id)]
+
+    response = client.get(f"/v1/bundles/{bundle_site.id}")
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"{version}"'
+    assert "max-age" in response.headers["cache-control"]
+
+    bundle = response.json()
+    assert bundle["site_id"] == str(bundle_site.id)
+    assert {v["patch"]["headline"] for v in bundle["variants"]} == {"V0", "V1"}
+    # Stored prob_best from the update becomes the allocation table.
+    assert sorted(bundle["allocation"]["variant_ids"]) == sorted(str(v.id) for v in bundle_site.variants)
+
+
+def test_bundle_carries_no_posteriors(client: TestClient, store, bundle_site):
+    client.post(f"/api/stats/update/{bundle_site.id}")
+    bundle = client.get(f"/v1/bundles/{bundle_site.id}").json()
+    for variant in bundle["variants"]:
+        assert set(variant) == {"id", "patch", "patch_hash"}
+        assert client.get(f"/v1/patches/{variant['patch_hash']}").json() == variant["patch"]
+
+
+def test_publish_failure_keeps_committed_stats(client: TestClient, db_session, bundle_site, monkeypatch):
+    class BrokenStore(MemoryBundleStore):
+        def put(self, key, data):
+            raise OSError("bucket unavailable")
+
+    monkeypatch.setattr(site_bundles, "bundle_store", BrokenStore())
+    response = client.post(f"/api/stats/update/{bundle_site.id}")
+    assert response.status_code == 200
+    assert response.json()["publish_error"] == "bucket unavailable"
+
+    [result] = client.post("/api/stats/update-all").json()["results"]
+    assert result["status"] == "success"
+    assert result["publish_error"] == "bucket unavailable"
+    db_session.expire_all()
+    assert all(v.stats.prob_best_version for v in bundle_site.variants)
+
+
+def test_unchanged_content_keeps_version(client: TestClient, store, bundle_site):
+    client.post(f"/api/stats/update/{bundle_site.id}")
+    first = bundle_manifest(store)
+    client.post(f"/api/stats/update/{bundle_site.id}")
+    assert bundle_manifest(store) == first
+    assert len(published_versions(store, bundle_site)) == 1
+
+
+def test_variant_status_change_republishes(client: TestClient, store, bundle_site):
+    client.post(f"/api/stats/update/{bundle_site.id}")
+    old = bundle_manifest(store)[str(bundle_site.id)]
+
+    killed = bundle_site.variants[0]
+    client.patch(f"/api/variants/{killed.id}", json={"status": "killed"})
+    new = bundle_manifest(store)[str(bundle_site.id)]
+    assert new != old
+
+    bundle = client.get(f"/v1/bundles/{bundle_site.id}").json()
+    assert str(killed.id) not in {v["id"] for v in bundle["variants"]}
+    # The replaced version is still served, immutably, to clients holding it.
+    response = client.get(f"/v1/bundles/{bundle_site.id}/{old}.json")
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test_only_the_previous_version_is_kept(client: TestClient, store, bundle_site):
+    for variant in bundle_site.variants:
+        client.patch(f"/api/variants/{variant.id}", json={"status": "active"})
+        client.post(f"/api/stats/update/{bundle_site.id}")
+        client.patch(f"/api/variants/{variant.id}", json={"status": "killed"})
+    assert len(published_versions(store, bundle_site)) <= 2
+
+
+def test_paused_site_is_unpublished(client: TestClient, store, bundle_site):
+    client.post(f"/api/stats/update/{bundle_site.id}")
+    client.patch(f"/api/sites/{bundle_site.id}", json={"status": "analyzed"})
+
+    assert str(bundle_site.id) not in bundle_manifest(store)
+    assert published_versions(store, bundle_site) == []
+    assert client.get(f"/v1/bundles/{bundle_site.id}").status_code == 404
+
+
+def test_etag_revalidation(client: TestClient, store, bundle_site):
+    client.post(f"/api/stats/update/{bundle_site.id}")
+    for url in (f"/v1/bundles/{bundle_site.id}", "/v1/bundles/manifest"):
+        etag = client.get(url).headers["etag"]
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+
+def test_manifest_lists_current_versions(client: TestClient, store, bundle_site):
+    client.post(f"/api/stats/update/{bundle_site.id}")
+    manifest = client.get("/v1/bundles/manifest").json()
+    assert manifest == bundle_manifest(store)
+    body = client.get(f"/v1/bundles/{bundle_site.id}/{manifest[str(bundle_site.id)]}.json").content
+    assert json.loads(body)["site_id"] == str(bundle_site.id)
+    assert client.get(f"/v1/bundles/{bundle_site.id}/..%2Fcurrent.json").status_code == 404
+
+
+def test_manifest_is_not_rebuilt_per_request(client: TestClient, store, bundle_site):
+    client.post(f"/api/stats/update/{bundle_site.id}")
+    builds = manifest_cache.builds
+    first = client.get("/v1/bundles/manifest")
+    assert client.get("/v1/bundles/manifest").headers["etag"] == first.headers["etag"]
+    assert manifest_cache.builds == builds + 1
+
+    # Unpublishing from this process shows up at once.
+    client.patch(f"/api/sites/{bundle_site.id}", json={"status": "analyzed"})
+    assert client.get("/v1/bundles/manifest").json() == {}
+
+
+def test_malformed_site_id_is_rejected(client: TestClient, store):
+    assert client.get("/v1/bundles/not-a-site").status_code == 422
+    assert client.get(f"/v1/bundles/not-a-site/{'0' * 20}.json").status_code == 422
+
+
+def test_bundles_disabled(client: TestClient, db_session, monkeypatch):
+    monkeypatch.setattr(site_bundles, "bundle_store", None)
+    assert client.get("/v1/bundles/manifest").status_code == 404
+    assert client.get(f"/v1/bundles/{uuid.uuid4()}/not-a-version.json").status_code == 404
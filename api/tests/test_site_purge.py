@@ -0,0 +1,197 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from db.connection import AsyncSessionLocal
+from db.models import (
+    User, Site, Variant, ExperimentStats, ConversionGoal, Event, EventRollup, SiteActivity, SitePurge,
+)
+from services import site_purge
+from services.event_buffer import insert_events
+
+
+@pytest.fixture
+def doomed_site(db_session):
+    user = User(id=uuid.uuid4(), email="purge@example.com", password_hash="fake")
+    site = Site(id=uuid.uuid4(), user_id=user.id, url="https://purge-test.com", status="running")
+    parent = Variant(id=uuid.uuid4(), site_id=site.id, patch={}, status="killed")
+    child = Variant(id=uuid.uuid4(), site_id=site.id, parent_variant_id=parent.id, patch={"a": 1}, status="active")
+    db_session.add_all([user, site, parent, child])
+    db_session.add_all([ExperimentStats(variant_id=v.id) for v in (parent, child)])
+    db_session.add(ConversionGoal(id=uuid.uuid4(), site_id=site.id, type="click"))
+    db_session.commit()
+
+    now = datetime.utcnow()
+    insert_events(db_session, [
+        {
+            "id": uuid.uuid4(),
+            "site_id": site.id,
+            "variant_id": child.id,
+            "visitor_id": f"visitor-{i}",
+            "event_type": "impression",
+            "event_metadata": {},
+            "created_at": now - timedelta(hours=i % 5),
+        }
+        for i in range(25)
+    ])
+    db_session.commit()
+    return site
+
+
+def remaining(db_session, site_id):
+    db_session.expire_all()
+    return {
+        "events": db_session.query(Event).filter(Event.site_id == site_id).count(),
+        "event_rollups": db_session.query(EventRollup).filter(EventRollup.site_id == site_id).count(),
+        "variants": db_session.query(Variant).filter(Variant.site_id == site_id).count(),
+        "experiment_stats": db_session.query(ExperimentStats).count(),
+        "conversion_goals": db_session.query(ConversionGoal).filter(ConversionGoal.site_id == site_id).count(),
+        "site_activity": db_session.query(SiteActivity).filter(SiteActivity.site_id == site_id).count(),
+        "sites": db_session.query(Site).filter(Site.id == site_id).count(),
+    }
+
+
+def soft_delete(db_session, site):
+    site.status = "deleting"
+    site.deleted_at = datetime.utcnow()
+    db_session.add(SitePurge(site_id=site.id))
+    db_session.commit()
+
+
+def test_delete_purges_everything_and_reports_progress(client: TestClient, db_session, doomed_site):
+    response = client.delete(f"/api/sites/{doomed_site.id}")
+    assert response.status_code == 202
+
+    assert set(remaining(db_session, doomed_site.id).values()) == {0}
+    progress = client.get(response.json()["progress"]).json()
+    assert progress["status"] == "done"
+    assert progress["finished_at"] is not None
+    assert progress["deleted"] == {
+        "events": 25, "event_rollups": 5, "experiment_stats": 2,
+        "variants": 2, "conversion_goals": 1, "site_activity": 1, "sites": 1,
+    }
+
+
+def test_deleted_site_is_hidden_before_purge(client: TestClient, db_session, doomed_site, monkeypatch):
+    async def not_yet(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr("routes.sites.purge_site", not_yet)
+    client.delete(f"/api/sites/{doomed_site.id}")
+
+    assert client.get(f"/api/sites/{doomed_site.id}").status_code == 404
+    assert client.get(f"/api/sites?user_id={doomed_site.user_id}").json() == []
+    assert client.get(f"/v1/assign?site_id={doomed_site.id}&visitor_id=v").status_code == 404
+    assert client.delete(f"/api/sites/{doomed_site.id}").status_code == 404
+    assert client.get(f"/api/sites/{doomed_site.id}/purge").json()["status"] == "pending"
+    assert remaining(db_session, doomed_site.id)["events"] == 25
+
+
+async def test_purge_runs_in_chunks(db_session, doomed_site, monkeypatch):
+    soft_delete(db_session, doomed_site)
+    statements = []
+    steps = site_purge.purge_steps
+
+    def counting_steps(site_id, chunk_size):
+        return [
+            (table, lambda make=make, table=table: statements.append(table) or make())
+            for table, make in steps(site_id, chunk_size)
+        ]
+
+    monkeypatch.setattr(site_purge, "purge_steps", counting_steps)
+    progress = await site_purge.purge_site(AsyncSessionLocal, str(doomed_site.id), chunk_size=10)
+
+    assert progress["status"] == "done"
+    assert progress["deleted"]["events"] == 25
+    # 25 events at 10 per chunk take three DELETEs, plus the sweep before variants.
+    assert statements.count("events") == 4
+
+
+async def test_events_arriving_mid_purge_are_swept(db_session, doomed_site, monkeypatch):
+    site_id = doomed_site.id
+    variant_id = doomed_site.variants[0].id
+    soft_delete(db_session, doomed_site)
+    steps = site_purge.purge_steps
+
+    def late_event_after_first_pass(site_id, chunk_size):
+        def late_event():
+            insert_events(db_session, [{
+                "id": uuid.uuid4(), "site_id": site_id, "variant_id": variant_id,
+                "visitor_id": "late", "event_type": "conversion",
+                "event_metadata": {}, "created_at": datetime.utcnow(),
+            }])
+            db_session.commit()
+            return make_stats()
+
+        all_steps = steps(site_id, chunk_size)
+        make_stats = all_steps[2][1]
+        all_steps[2] = ("experiment_stats", late_event)
+        return all_steps
+
+    monkeypatch.setattr(site_purge, "purge_steps", late_event_after_first_pass)
+    progress = await site_purge.purge_site(AsyncSessionLocal, str(site_id))
+
+    assert progress["status"] == "done"
+    assert progress["deleted"]["events"] == 26
+    assert set(remaining(db_session, site_id).values()) == {0}
+
+
+def test_deleted_site_rejects_events(client: TestClient, db_session, doomed_site, monkeypatch):
+    async def not_yet(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr("routes.sites.purge_site", not_yet)
+    event = {
+        "site_id": str(doomed_site.id),
+        "variant_id": str(next(v.id for v in doomed_site.variants if v.status == "active")),
+        "visitor_id": "after-delete",
+        "type": "impression",
+    }
+    # Warm the snapshot cache first; deleting the site must invalidate it.
+    assert client.post("/v1/event", json=event).status_code == 200
+    client.delete(f"/api/sites/{doomed_site.id}")
+
+    response = client.post("/v1/event", json=event)
+    assert response.status_code == 422
+    assert response.json()["detail"] == "site_id: unknown or deleted site"
+    assert client.post("/v1/events", json=[event]).json()["accepted"] == 0
+
+
+async def test_failed_purge_is_resumed(db_session, doomed_site, monkeypatch):
+    site_id = doomed_site.id
+    soft_delete(db_session, doomed_site)
+    steps = site_purge.purge_steps
+
+    def failing_after_events(site_id, chunk_size):
+        events, *_ = steps(site_id, chunk_size)
+        return [events, ("variants", lambda: (_ for _ in ()).throw(RuntimeError("lost connection")))]
+
+    monkeypatch.setattr(site_purge, "purge_steps", failing_after_events)
+    progress = await site_purge.purge_site(AsyncSessionLocal, str(site_id))
+    assert progress["status"] == "failed"
+    assert progress["error"] == "lost connection"
+    assert progress["deleted"]["events"] == 25
+    assert remaining(db_session, site_id)["variants"] == 2
+
+    monkeypatch.undo()
+    [resumed] = await site_purge.resume_site_purges(AsyncSessionLocal)
+    assert resumed["status"] == "done"
+    assert resumed["deleted"]["events"] == 25
+    assert set(remaining(db_session, site_id).values()) == {0}
+
+
+def test_maintenance_resumes_only_stalled_purges(client: TestClient, db_session, doomed_site):
+    soft_delete(db_session, doomed_site)
+    purge = db_session.get(SitePurge, doomed_site.id)
+    purge.status = "running"
+    db_session.commit()
+
+    # Still reporting progress, so presumably alive on another worker.
+    assert client.post("/api/maintenance/sites/purge").json() == {"purges": []}
+
+    purge.updated_at = datetime.utcnow() - timedelta(seconds=site_purge.SITE_PURGE_STALE_SECONDS + 1)
+    db_session.commit()
+    [resumed] = client.post("/api/maintenance/sites/purge").json()["purges"]
+    assert resumed["status"] == "done"
@@ -41,6 +41,24 @@ class TestSitesEndpoints:
         data = response.json()
         assert len(data) == 2
 
+    def test_list_sites_pages_and_filters(self, client: TestClient, db_session, test_user):
+        for i in range(5):
+            client.post(
+                "/api/sites",
+                json={"url": f"https://page{i}.com", "user_id": str(test_user.id)},
+            )
+        first = client.get(f"/api/sites?user_id={test_user.id}&limit=3")
+        assert len(first.json()) == 3
+        cursor = first.headers["X-Next-Cursor"]
+
+        second = client.get(f"/api/sites?user_id={test_user.id}&limit=3&cursor={cursor}")
+        assert "X-Next-Cursor" not in second.headers
+        urls = [s["url"] for s in first.json() + second.json()]
+        assert urls == [f"https://page{i}.com" for i in range(5)]
+
+        paused = client.get(f"/api/sites?user_id={test_user.id}&status=paused")
+        assert paused.json() == []
+
     def test_get_site_by_id(self, client: TestClient, db_session, test_user):
         create_response = client.post(
             "/api/sites",
@@ -85,6 +103,8 @@ class TestSitesEndpoints:
         )
         site_id = create_response.json()["id"]
         response = client.delete(f"/api/sites/{site_id}")
-        assert response.status_code == 200
+        assert response.status_code == 202
+        assert response.json()["status"] == "deleting"
         get_response = client.get(f"/api/sites/{site_id}")
         assert get_response.status_code == 404
+        assert client.get(f"/api/sites/{site_id}/purge").json()["status"] == "done"
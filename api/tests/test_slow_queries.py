@@ -0,0 +1,95 @@
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from db.connection import AsyncSessionLocal, async_engine
+from db.models import User, Site, Variant
+from db.slow_queries import RequestContextMiddleware, SlowQueryLog, file_logger
+from index import app
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / "slow.jsonl"
+
+
+@pytest.fixture
+def slow_log(log_path):
+    logger = file_logger(str(log_path), max_bytes=1_000_000, backups=1, name=f"test.slow.{uuid.uuid4()}")
+    # Every statement is slow and every slow SELECT is explained.
+    log = SlowQueryLog(logger, threshold_ms=0, explain_sample_rate=1.0)
+    log.install(async_engine.sync_engine)
+    yield log
+    log.uninstall(async_engine.sync_engine)
+    for handler in logger.handlers:
+        handler.close()
+
+
+def entries(log_path):
+    return [json.loads(line) for line in log_path.read_text().splitlines()]
+
+
+@pytest.fixture
+def logged_site(db_session):
+    user = User(id=uuid.uuid4(), email="slow@example.com", password_hash="fake")
+    site = Site(id=uuid.uuid4(), user_id=user.id, url="https://slow-test.com", status="running")
+    variant = Variant(id=uuid.uuid4(), site_id=site.id, patch={}, status="active")
+    db_session.add_all([user, site, variant])
+    db_session.commit()
+    return site
+
+
+def test_slow_statements_are_logged_with_route_and_plan(db_session, logged_site, slow_log, log_path):
+    client = TestClient(RequestContextMiddleware(app))
+    response = client.get(f"/api/sites/{logged_site.id}/variants")
+    assert response.status_code == 200
+
+    logged = [e for e in entries(log_path) if "FROM variants" in e["statement"]]
+    assert logged
+    entry = logged[0]
+    assert entry["route"] == "GET /api/sites/{site_id}/variants"
+    assert entry["duration_ms"] >= 0
+    assert entry["dialect"] == "sqlite"
+    assert logged_site.id.hex in json.dumps(entry["parameters"])
+    # SQLite plans come from EXPLAIN QUERY PLAN, one detail line per step.
+    assert any("variants" in step for step in entry["plan"])
+
+
+async def test_background_statements_have_no_route(logged_site, slow_log, log_path):
+    slow_log.explain_sample_rate = 0.0
+    async with AsyncSessionLocal() as db:
+        await db.execute(select(Site.id).where(Site.id == logged_site.id))
+
+    entry = entries(log_path)[-1]
+    assert entry["route"] is None
+    assert "plan" not in entry
+
+
+async def test_writes_are_never_explained(logged_site, slow_log, log_path):
+    async with AsyncSessionLocal() as db:
+        site = await db.get(Site, logged_site.id)
+        site.url = "https://renamed.com"
+        await db.commit()
+
+    update = [e for e in entries(log_path) if e["statement"].startswith("UPDATE sites")]
+    assert update and "plan" not in update[0]
+
+
+async def test_fast_statements_are_skipped(logged_site, slow_log, log_path):
+    slow_log.threshold_ms = 60_000
+    async with AsyncSessionLocal() as db:
+        await db.execute(select(Site.id))
+    assert entries(log_path) == []
+
+
+def test_log_rotates(tmp_path):
+    path = tmp_path / "rotating.jsonl"
+    logger = file_logger(str(path), max_bytes=200, backups=2, name=f"test.slow.{uuid.uuid4()}")
+    for i in range(20):
+        logger.warning(json.dumps({"statement": f"SELECT {i}", "padding": "x" * 50}))
+    for handler in logger.handlers:
+        handler.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["rotating.jsonl", "rotating.jsonl.1", "rotating.jsonl.2"]
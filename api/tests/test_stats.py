@@ -0,0 +1,316 @@
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from db.connection import AsyncSessionLocal
+from db.models import User, Site, Variant, ExperimentStats, Event, EventRollup
+from services import event_retention, stats_updater
+from services.prob_best_cache import prob_best_cache
+from services.event_buffer import insert_events
+
+
+@pytest.fixture
+def stats_site(db_session):
+    user = User(id=uuid.uuid4(), email="stats@example.com", password_hash="fake")
+    db_session.add(user)
+    db_session.commit()
+
+    site = Site(id=uuid.uuid4(), user_id=user.id, url="https://stats-test.com", status="running")
+    db_session.add(site)
+    db_session.commit()
+
+    variants = [
+        Variant(id=uuid.uuid4(), site_id=site.id, patch={"headline": f"V{i}"}, status="active")
+        for i in range(2)
+    ]
+    db_session.add_all(variants)
+    db_session.commit()
+    return site
+
+
+def add_events(db_session, site, variant, impressions, conversions, created_at=None):
+    """Ingest events the way the runtime routes do, rollups included."""
+    created_at = created_at or datetime.utcnow()
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "site_id": site.id,
+            "variant_id": variant.id,
+            "visitor_id": f"visitor-{uuid.uuid4()}",
+            "event_type": event_type,
+            "event_metadata": {},
+            "created_at": created_at,
+        }
+        for event_type, count in (("impression", impressions), ("conversion", conversions))
+        for _ in range(count)
+    ]
+    insert_events(db_session, rows)
+    db_session.commit()
+    return rows
+
+
+def stats_by_variant(db_session, site):
+    db_session.expire_all()
+    return {
+        str(s.variant_id): (s.visitors, s.conversions, s.alpha, s.beta)
+        for s in db_session.query(ExperimentStats)
+        .join(Variant, Variant.id == ExperimentStats.variant_id)
+        .filter(Variant.site_id == site.id)
+    }
+
+
+def rollup_counts(db_session, site):
+    db_session.expire_all()
+    return {
+        (str(r.variant_id), r.event_type, r.hour): r.count
+        for r in db_session.query(EventRollup).filter(EventRollup.site_id == site.id)
+    }
+
+
+class TestStatsEndpoints:
+    def test_update_counts_events(self, client: TestClient, db_session, stats_site):
+        variant_a, variant_b = stats_site.variants
+        past = datetime.utcnow() - timedelta(hours=1)
+        add_events(db_session, stats_site, variant_a, 40, 4, past)
+        add_events(db_session, stats_site, variant_b, 40, 12, past)
+
+        response = client.post(f"/api/stats/update/{stats_site.id}")
+        assert response.status_code == 200
+        data = response.json()
+        assert sorted(data["updated"]) == sorted(str(v.id) for v in stats_site.variants)
+        assert data["prob_best"][str(variant_b.id)] > data["prob_best"][str(variant_a.id)]
+
+        stats = stats_by_variant(db_session, stats_site)
+        assert stats[str(variant_a.id)] == (40, 4, 5.0, 37.0)
+        assert stats[str(variant_b.id)] == (40, 12, 13.0, 29.0)
+
+    def test_update_reads_rollups_not_raw_events(self, client: TestClient, db_session, stats_site):
+        variant = stats_site.variants[0]
+        add_events(db_session, stats_site, variant, 20, 2, datetime.utcnow() - timedelta(hours=2))
+        add_events(db_session, stats_site, variant, 5, 1)
+
+        # Raw events can be purged once rolled up without changing the stats.
+        db_session.query(Event).delete()
+        db_session.commit()
+        client.post(f"/api/stats/update/{stats_site.id}")
+
+        assert stats_by_variant(db_session, stats_site)[str(variant.id)] == (25, 3, 4.0, 23.0)
+
+    def test_rollups_and_full_rebuild_agree(self, client: TestClient, db_session, stats_site):
+        variant_a, variant_b = stats_site.variants
+        now = datetime.utcnow()
+        add_events(db_session, stats_site, variant_a, 30, 3, now - timedelta(hours=3))
+        add_events(db_session, stats_site, variant_b, 25, 5, now - timedelta(hours=3))
+        add_events(db_session, stats_site, variant_a, 10, 2, now - timedelta(minutes=5))
+        add_events(db_session, stats_site, variant_b, 7, 1)
+        rolled_up = client.post(f"/api/stats/update/{stats_site.id}").json()
+        rolled_up_stats = stats_by_variant(db_session, stats_site)
+        rollups_before = rollup_counts(db_session, stats_site)
+
+        full = client.post(f"/api/stats/update/{stats_site.id}?full=true").json()
+        full_stats = stats_by_variant(db_session, stats_site)
+
+        assert rolled_up_stats == full_stats
+        assert rolled_up_stats[str(variant_a.id)] == (40, 5, 6.0, 36.0)
+        assert rolled_up["prob_best"] == pytest.approx(full["prob_best"])
+        assert rollup_counts(db_session, stats_site) == rollups_before
+
+    def test_full_rebuild_repairs_rollups(self, client: TestClient, db_session, stats_site):
+        variant = stats_site.variants[0]
+        add_events(db_session, stats_site, variant, 12, 3, datetime.utcnow() - timedelta(hours=1))
+        db_session.query(EventRollup).delete()
+        db_session.commit()
+
+        client.post(f"/api/stats/update/{stats_site.id}")
+        assert stats_by_variant(db_session, stats_site)[str(variant.id)][:2] == (0, 0)
+
+        client.post(f"/api/stats/update/{stats_site.id}?full=true")
+        assert stats_by_variant(db_session, stats_site)[str(variant.id)][:2] == (12, 3)
+
+    async def test_full_rebuild_keeps_purged_history(self, client: TestClient, db_session, stats_site, monkeypatch):
+        monkeypatch.setattr(event_retention, "EVENTS_RETENTION_DAYS", 30)
+        variant = stats_site.variants[0]
+        add_events(db_session, stats_site, variant, 20, 4, datetime.utcnow() - timedelta(days=40))
+        add_events(db_session, stats_site, variant, 10, 1, datetime.utcnow() - timedelta(hours=1))
+        async with AsyncSessionLocal() as db:
+            await event_retention.purge_expired_events(db)
+        assert db_session.query(Event).filter(Event.site_id == stats_site.id).count() == 11
+
+        client.post(f"/api/stats/update/{stats_site.id}?full=true")
+        assert stats_by_variant(db_session, stats_site)[str(variant.id)][:2] == (30, 5)
+
+    def test_site_timeseries_is_hourly(self, client: TestClient, db_session, stats_site):
+        variant_a, variant_b = stats_site.variants
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+        add_events(db_session, stats_site, variant_a, 4, 1, hour + timedelta(minutes=10))
+        add_events(db_session, stats_site, variant_a, 6, 0, hour + timedelta(minutes=50))
+        add_events(db_session, stats_site, variant_b, 3, 2, hour + timedelta(hours=1, minutes=1))
+        add_events(db_session, stats_site, variant_b, 9, 9, hour - timedelta(hours=48))
+
+        response = client.get(f"/api/stats/site/{stats_site.id}/timeseries?hours=24")
+        assert response.status_code == 200
+        points = [
+            (p["hour"], p["variant_id"], p["impressions"], p["conversions"])
+            for p in response.json()
+        ]
+        assert points == [
+            (hour.isoformat(), str(variant_a.id), 10, 1),
+            ((hour + timedelta(hours=1)).isoformat(), str(variant_b.id), 3, 2),
+        ]
+
+    def test_get_site_stats(self, client: TestClient, db_session, stats_site):
+        add_events(db_session, stats_site, stats_site.variants[0], 10, 2, datetime.utcnow() - timedelta(hours=1))
+        client.post(f"/api/stats/update/{stats_site.id}")
+
+        response = client.get(f"/api/stats/site/{stats_site.id}")
+        assert response.status_code == 200
+        data = {row["variant_id"]: row for row in response.json()}
+        row = data[str(stats_site.variants[0].id)]
+        assert row["visitors"] == 10
+        assert row["conversion_rate"] == pytest.approx(20.0)
+        assert sum(r["prob_best"] for r in data.values()) == pytest.approx(1.0, abs=1e-6)
+
+    def test_get_site_stats_serves_stored_prob_best(self, client: TestClient, db_session, stats_site, monkeypatch):
+        variant_a, variant_b = stats_site.variants
+        add_events(db_session, stats_site, variant_a, 30, 3, datetime.utcnow() - timedelta(hours=1))
+        add_events(db_session, stats_site, variant_b, 30, 9, datetime.utcnow() - timedelta(hours=1))
+        stored = client.post(f"/api/stats/update/{stats_site.id}").json()["prob_best"]
+
+        def no_compute(variants):
+            raise AssertionError("prob_best recomputed")
+
+        monkeypatch.setattr(prob_best_cache, "get", no_compute)
+        data = {r["variant_id"]: r["prob_best"] for r in client.get(f"/api/stats/site/{stats_site.id}").json()}
+        assert data == pytest.approx(stored)
+
+        misses = prob_best_cache.misses
+        # Killing an arm changes the posterior set, so the stored values no longer apply.
+        monkeypatch.undo()
+        variant_a.status = "killed"
+        db_session.commit()
+        data = {r["variant_id"]: r["prob_best"] for r in client.get(f"/api/stats/site/{stats_site.id}").json()}
+        assert data == {str(variant_b.id): pytest.approx(1.0)}
+        assert client.get("/api/stats/cache").json()["prob_best"]["misses"] == misses + 1
+
+    def test_get_site_stats_caches_prob_best(self, client: TestClient, db_session, stats_site):
+        url = f"/api/stats/site/{stats_site.id}?use_stored=false"
+        hits, misses = prob_best_cache.hits, prob_best_cache.misses
+        first = client.get(url).json()
+        assert client.get(url).json() == first
+
+        stats = client.get("/api/stats/cache").json()["prob_best"]
+        assert (stats["hits"], stats["misses"]) == (hits + 1, misses + 1)
+
+    def test_get_site_stats_missing_site(self, client: TestClient, db_session):
+        response = client.get(f"/api/stats/site/{uuid.uuid4()}")
+        assert response.status_code == 404
+
+    def test_update_all_updates_running_sites(self, client: TestClient, db_session, stats_site):
+        response = client.post("/api/stats/update-all")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["sites_updated"] == 1
+        assert data["results"][0]["site_id"] == str(stats_site.id)
+        assert data["results"][0]["status"] == "success"
+
+    def test_update_query_count_is_constant_in_arm_count(
+        self, client: TestClient, db_session, stats_site, route_engine
+    ):
+        past = datetime.utcnow() - timedelta(hours=1)
+        wide_site = Site(id=uuid.uuid4(), user_id=stats_site.user_id, url="https://wide.com", status="running")
+        db_session.add(wide_site)
+        db_session.commit()
+        db_session.add_all([
+            Variant(id=uuid.uuid4(), site_id=wide_site.id, patch={}, status="active")
+            for _ in range(12)
+        ])
+        db_session.commit()
+        for site in (stats_site, wide_site):
+            for variant in site.variants:
+                add_events(db_session, site, variant, 5, 1, past)
+
+        def count_queries(site):
+            url = f"/api/stats/update/{site.id}"
+            statements = []
+
+            def count(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            event.listen(route_engine, "before_cursor_execute", count)
+            try:
+                response = client.post(url)
+            finally:
+                event.remove(route_engine, "before_cursor_execute", count)
+            assert response.status_code == 200
+            return len(statements)
+
+        narrow_queries = count_queries(stats_site)
+        wide_queries = count_queries(wide_site)
+
+        assert narrow_queries == wide_queries
+        assert 0 < wide_queries <= 3
+        assert len(stats_by_variant(db_session, wide_site)) == 12
+
+
+class TestParallelStatsUpdate:
+    @pytest.fixture
+    def running_sites(self, db_session, stats_site):
+        sites = [stats_site]
+        for i in range(4):
+            site = Site(id=uuid.uuid4(), user_id=stats_site.user_id, url=f"https://s{i}.com", status="running")
+            db_session.add(site)
+            db_session.add(Variant(id=uuid.uuid4(), site_id=site.id, patch={}, status="active"))
+            sites.append(site)
+        db_session.commit()
+        past = datetime.utcnow() - timedelta(hours=1)
+        for site in sites:
+            for variant in site.variants:
+                add_events(db_session, site, variant, 10, 3, past)
+        return sites
+
+    def test_update_all_reports_timing(self, client: TestClient, db_session, running_sites):
+        response = client.post("/api/stats/update-all?concurrency=3")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["sites_updated"] == len(running_sites)
+        assert data["concurrency"] == 3
+        assert data["duration_ms"] > 0
+        assert {r["status"] for r in data["results"]} == {"success"}
+        assert all(r["duration_ms"] > 0 for r in data["results"])
+        for site in running_sites:
+            for stats in stats_by_variant(db_session, site).values():
+                assert stats == (10, 3, 4.0, 8.0)
+
+    def test_failing_site_does_not_poison_others(
+        self, client: TestClient, db_session, running_sites, monkeypatch
+    ):
+        bad_site_id = str(running_sites[1].id)
+        aggregate = stats_updater.aggregate_site_stats
+
+        async def flaky_aggregate(db, site_id, full=False):
+            if site_id == bad_site_id:
+                raise RuntimeError("boom")
+            return await aggregate(db, site_id, full=full)
+
+        monkeypatch.setattr(stats_updater, "aggregate_site_stats", flaky_aggregate)
+
+        data = client.post("/api/stats/update-all").json()
+        by_site = {r["site_id"]: r for r in data["results"]}
+        assert by_site[bad_site_id]["status"] == "error"
+        assert by_site[bad_site_id]["error"] == "boom"
+        assert [r["status"] for r in by_site.values()].count("success") == len(running_sites) - 1
+        assert stats_by_variant(db_session, running_sites[0])
+
+    async def test_update_sites_with_process_pool(self, db_session, running_sites):
+        site_ids = [str(site.id) for site in running_sites]
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = await stats_updater.update_sites(site_ids, AsyncSessionLocal, concurrency=2, pool=pool)
+
+        assert [r["site_id"] for r in results] == site_ids
+        assert {r["status"] for r in results} == {"success"}
+        assert results[0]["prob_best_method"] == "exact"
@@ -0,0 +1,264 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from db.connection import AsyncSessionLocal, SessionLocal
+from db.models import User, Site, Variant, ExperimentStats, SiteActivity
+from routes import runtime
+from services import stats_scheduler
+from services.event_buffer import insert_events
+from services.site_activity import SiteActivityTally, mark_recomputed, site_activity_tally
+from services.stats_scheduler import StatsScheduler, run_scheduler_pass
+
+
+@pytest.fixture
+def make_site(db_session):
+    user = User(id=uuid.uuid4(), email="scheduler@example.com", password_hash="fake")
+    db_session.add(user)
+    db_session.commit()
+
+    def make(name: str, status: str = "running") -> Site:
+        site = Site(id=uuid.uuid4(), user_id=user.id, url=f"https://{name}.com", status=status)
+        variant = Variant(id=uuid.uuid4(), site_id=site.id, patch={}, status="active")
+        db_session.add_all([site, variant, ExperimentStats(variant_id=variant.id)])
+        db_session.commit()
+        return site
+
+    return make
+
+
+def add_events(db_session, site: Site, count: int) -> None:
+    variant = site.variants[0]
+    insert_events(db_session, [
+        {
+            "id": uuid.uuid4(),
+            "site_id": site.id,
+            "variant_id": variant.id,
+            "visitor_id": f"visitor-{i}",
+            "event_type": "impression",
+            "event_metadata": {},
+            "created_at": datetime.utcnow(),
+        }
+        for i in range(count)
+    ])
+    db_session.commit()
+
+
+def activity(db_session, site: Site) -> SiteActivity:
+    db_session.expire_all()
+    return db_session.get(SiteActivity, site.id)
+
+
+def test_ingest_marks_site_dirty_and_recompute_clears_it(client: TestClient, db_session, make_site):
+    site = make_site("dirty")
+    add_events(db_session, site, 3)
+    add_events(db_session, site, 2)
+    dirty = activity(db_session, site)
+    assert dirty.pending_events == 5
+    assert dirty.dirty_since is not None
+    first_dirty_since = dirty.dirty_since
+
+    add_events(db_session, site, 1)
+    assert activity(db_session, site).dirty_since == first_dirty_since
+
+    assert client.post(f"/api/stats/update/{site.id}").status_code == 200
+    clean = activity(db_session, site)
+    assert clean.pending_events == 0
+    assert clean.dirty_since is None
+    assert clean.last_recomputed_at is not None
+
+
+async def test_events_after_the_read_stay_pending(db_session, make_site):
+    site = make_site("racing")
+    add_events(db_session, site, 10)
+
+    # The recompute read 6 of the 10 events; the other 4 arrived after it.
+    async with AsyncSessionLocal() as db:
+        await mark_recomputed(db, site.id, 6, datetime.utcnow())
+        await db.commit()
+    racing = activity(db_session, site)
+    assert racing.pending_events == 4
+    assert racing.dirty_since is not None
+
+
+@pytest.fixture
+def running_tally(db_session, monkeypatch):
+    monkeypatch.setattr(site_activity_tally, "flush_interval", 3600)
+    site_activity_tally.start()
+    yield site_activity_tally
+    site_activity_tally.stop()
+
+
+def event_for(site: Site, visitor_id: str = "v") -> dict:
+    return {
+        "site_id": str(site.id),
+        "variant_id": str(site.variants[0].id),
+        "visitor_id": visitor_id,
+        "type": "impression",
+    }
+
+
+def test_sync_ingest_batches_activity_writes(
+    client: TestClient, db_session, make_site, running_tally, monkeypatch
+):
+    monkeypatch.setattr(stats_scheduler, "STATS_HOT_EVENT_THRESHOLD", 3)
+    site = make_site("tallied")
+    for _ in range(3):
+        assert client.post("/v1/event", json=event_for(site)).status_code == 200
+
+    # Held in the process until its flusher runs, or a pass needs them.
+    assert activity(db_session, site) is None
+    assert client.get("/api/stats/ingest").json()["site_activity"]["pending_events"] == 3
+    assert client.post("/api/stats/update-dirty").json()["sites_updated"] == 1
+
+    client.post("/v1/event", json=event_for(site))
+    assert running_tally.flush() == 1
+    assert activity(db_session, site).pending_events == 1
+
+
+def test_rolled_back_ingest_is_not_tallied(client: TestClient, db_session, make_site, running_tally, monkeypatch):
+    real_insert = runtime.insert_events
+
+    def insert_refusing_poison(db, rows, *args):
+        if any(row["visitor_id"] == "poison" for row in rows):
+            raise IntegrityError("INSERT INTO events", {}, Exception("foreign key violation"))
+        real_insert(db, rows, *args)
+
+    monkeypatch.setattr(runtime, "insert_events", insert_refusing_poison)
+    site = make_site("rolled-back")
+    events = [event_for(site, v) for v in ("ok-1", "poison", "ok-2")]
+    assert client.post("/v1/events", json=events).json()["accepted"] == 2
+    assert running_tally.metrics()["pending_events"] == 2
+
+
+def test_idle_worker_writes_its_own_tally(db_session, make_site):
+    site = make_site("idle-worker")
+    receiving = SiteActivityTally(session_factory=SessionLocal, flush_interval=0.05)
+    other = SiteActivityTally(session_factory=SessionLocal, flush_interval=0.05)
+    receiving.start()
+    other.start()
+    try:
+        receiving.add([{"site_id": site.id}] * 3)
+        # The worker that took the events never sees another request.
+        deadline = time.monotonic() + 5
+        while activity(db_session, site) is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        receiving.stop()
+        other.stop()
+
+    assert activity(db_session, site).pending_events == 3
+    assert receiving.metrics()["writes"] == 1
+    assert other.metrics()["writes"] == 0
+
+
+def test_failed_tally_write_is_kept_for_the_next_flush(db_session, make_site):
+    site = make_site("flaky")
+    opened = []
+
+    def flaky_session():
+        session = SessionLocal()
+        opened.append(session)
+        if len(opened) == 1:
+            def commit():
+                raise OperationalError("COMMIT", {}, Exception("database is gone"))
+            session.commit = commit
+        return session
+
+    tally = SiteActivityTally(session_factory=flaky_session, flush_interval=3600)
+    tally.add([{"site_id": site.id}] * 2)
+    assert tally.flush() == 0
+    assert tally.metrics()["failures"] == 1
+    assert tally.flush() == 1
+    assert activity(db_session, site).pending_events == 2
+
+
+async def test_recompute_skips_unknown_and_deleted_sites(client: TestClient, db_session, make_site):
+    response = client.post(f"/api/stats/update/{uuid.uuid4()}")
+    assert response.status_code == 200
+
+    site = make_site("deleted")
+    site.deleted_at = datetime.utcnow()
+    db_session.commit()
+    async with AsyncSessionLocal() as db:
+        await mark_recomputed(db, site.id, None, datetime.utcnow())
+        await db.commit()
+    assert db_session.query(SiteActivity).count() == 0
+
+
+async def test_pass_recomputes_only_due_sites(db_session, make_site, monkeypatch):
+    monkeypatch.setattr(stats_scheduler, "STATS_HOT_EVENT_THRESHOLD", 10)
+    monkeypatch.setattr(stats_scheduler, "STATS_MAX_STALENESS_SECONDS", 300)
+    hot = make_site("hot")
+    warm = make_site("warm")
+    idle = make_site("idle")
+    paused = make_site("paused", status="analyzed")
+    add_events(db_session, hot, 10)
+    add_events(db_session, warm, 2)
+    add_events(db_session, paused, 50)
+
+    summary = await run_scheduler_pass(AsyncSessionLocal)
+    assert [r["site_id"] for r in summary["results"]] == [str(hot.id)]
+    assert activity(db_session, hot).dirty_since is None
+    assert activity(db_session, idle) is None
+
+    # Once the warm site has waited out the staleness bound it is due too.
+    later = datetime.utcnow() + timedelta(seconds=301)
+    summary = await run_scheduler_pass(AsyncSessionLocal, now=later)
+    assert [r["site_id"] for r in summary["results"]] == [str(warm.id)]
+    assert activity(db_session, paused).pending_events == 50
+
+    summary = await run_scheduler_pass(AsyncSessionLocal, now=later)
+    assert summary["sites_updated"] == 0
+
+
+def test_scheduler_status_reports_staleness(client: TestClient, db_session, make_site, monkeypatch):
+    monkeypatch.setattr(stats_scheduler, "STATS_HOT_EVENT_THRESHOLD", 10)
+    hot = make_site("hot")
+    warm = make_site("warm")
+    add_events(db_session, warm, 2)
+    add_events(db_session, hot, 20)
+
+    status = client.get("/api/stats/scheduler").json()
+    assert status["queue_depth"] == 2
+    assert status["due"] == 1
+    by_site = {s["site_id"]: s for s in status["sites"]}
+    assert by_site[str(hot.id)]["due"] is True
+    assert by_site[str(warm.id)]["pending_events"] == 2
+    assert by_site[str(warm.id)]["staleness_seconds"] >= 0
+
+    response = client.post("/api/stats/update-dirty")
+    assert response.json()["sites_updated"] == 1
+    status = client.get("/api/stats/scheduler").json()
+    assert status["queue_depth"] == 1
+    assert status["passes"] >= 1
+
+
+async def test_scheduler_runs_passes_until_stopped(db_session, make_site, monkeypatch):
+    monkeypatch.setattr(stats_scheduler, "STATS_HOT_EVENT_THRESHOLD", 1)
+    site = make_site("background")
+    add_events(db_session, site, 1)
+
+    scheduler = StatsScheduler(AsyncSessionLocal, interval=0.01)
+    scheduler.start()
+    try:
+        for _ in range(200):
+            if scheduler.sites_updated:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await scheduler.stop()
+    assert not scheduler.running
+    assert scheduler.metrics()["sites_updated"] == 1
+    assert activity(db_session, site).dirty_since is None
+
+
+def test_disabled_scheduler_does_not_start():
+    scheduler = StatsScheduler(AsyncSessionLocal, interval=0)
+    scheduler.start()
+    assert not scheduler.running
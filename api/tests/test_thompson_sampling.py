@@ -1,5 +1,10 @@
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import pytest
-from services.thompson_sampling import ThompsonSampler
+from services.prob_best_cache import ProbBestCache
+from services.thompson_sampling import AliasTable, ThompsonSampler, posterior_version
 
 
 class TestThompsonSampler:
@@ -73,3 +78,213 @@ class TestThompsonSampler:
     def test_calculate_prob_best_empty_returns_empty(self):
         probs = ThompsonSampler.calculate_prob_best([])
         assert probs == {}
+
+    def test_calculate_prob_best_seeded_is_reproducible(self):
+        variants = [("a", 12, 88), ("b", 15, 85), ("c", 9, 91)]
+        first = ThompsonSampler.calculate_prob_best(variants, seed=42)
+        second = ThompsonSampler.calculate_prob_best(variants, seed=42)
+        assert first == second
+
+    def test_calculate_prob_best_chunked_matches_unchunked(self):
+        variants = [(f"v{i}", 5 + i, 50 - i) for i in range(8)]
+        whole = ThompsonSampler.calculate_prob_best(variants, num_simulations=5000, seed=7)
+        chunked = ThompsonSampler.calculate_prob_best(
+            variants, num_simulations=5000, seed=7, chunk_size=333
+        )
+        assert sum(chunked.values()) == pytest.approx(1.0)
+        for variant_id in whole:
+            assert chunked[variant_id] == pytest.approx(whole[variant_id], abs=0.03)
+
+    def test_calculate_prob_best_agrees_with_reference(self):
+        variants = [
+            ("var1", 10, 30),
+            ("var2", 20, 20),
+            ("var3", 22, 18),
+            ("var4", 5, 5),
+        ]
+        vectorized = ThompsonSampler.calculate_prob_best(variants, num_simulations=20000, seed=1)
+        reference = ThompsonSampler.calculate_prob_best_reference(
+            variants, num_simulations=20000, seed=1
+        )
+        assert vectorized.keys() == reference.keys()
+        for variant_id in reference:
+            assert vectorized[variant_id] == pytest.approx(reference[variant_id], abs=0.02)
+
+    def test_calculate_prob_best_reference_empty_returns_empty(self):
+        assert ThompsonSampler.calculate_prob_best_reference([]) == {}
+
+    def test_calculate_prob_best_exact_matches_monte_carlo(self):
+        variants = [("var1", 10, 30), ("var2", 20, 20), ("var3", 22, 18)]
+        exact = ThompsonSampler.calculate_prob_best_exact(variants)
+        simulated = ThompsonSampler.calculate_prob_best(variants, num_simulations=200000, seed=3)
+        assert exact.method == "exact"
+        assert sum(exact.probabilities.values()) == pytest.approx(1.0, abs=1e-6)
+        for variant_id, prob in simulated.items():
+            assert exact.probabilities[variant_id] == pytest.approx(prob, abs=0.005)
+
+    def test_calculate_prob_best_exact_is_deterministic(self):
+        variants = [("a", 4000, 180000), ("b", 4100, 180000)]
+        first = ThompsonSampler.calculate_prob_best_exact(variants)
+        second = ThompsonSampler.calculate_prob_best_exact(variants)
+        assert first == second
+        assert first.error_bound < 1e-4
+        assert first.probabilities["b"] > first.probabilities["a"]
+
+    def test_calculate_prob_best_exact_handles_mixed_scales(self):
+        variants = [("narrow", 4000, 180000), ("wide", 3, 100), ("flat", 1, 1)]
+        exact = ThompsonSampler.calculate_prob_best_exact(variants)
+        simulated = ThompsonSampler.calculate_prob_best(variants, num_simulations=200000, seed=5)
+        for variant_id, prob in simulated.items():
+            assert exact.probabilities[variant_id] == pytest.approx(prob, abs=0.005)
+
+    def test_estimate_prob_best_uses_exact_for_few_arms(self):
+        variants = [("a", 5, 50), ("b", 6, 50)]
+        estimate = ThompsonSampler.estimate_prob_best(variants)
+        assert estimate.method == "exact"
+
+    def test_estimate_prob_best_falls_back_to_monte_carlo(self):
+        variants = [(f"v{i}", 5 + i, 50) for i in range(6)]
+        estimate = ThompsonSampler.estimate_prob_best(variants, exact_max_arms=4, seed=11)
+        assert estimate.method == "monte_carlo"
+        assert 0 < estimate.error_bound < 0.05
+        assert sum(estimate.probabilities.values()) == pytest.approx(1.0)
+
+    def test_calculate_prob_best_exact_empty_returns_empty(self):
+        estimate = ThompsonSampler.calculate_prob_best_exact([])
+        assert estimate.probabilities == {}
+
+    def test_select_variant_does_not_touch_global_rng(self):
+        variants = [("var1", 10, 10), ("var2", 10, 10)]
+        random.seed(1234)
+        state = random.getstate()
+        ThompsonSampler.select_variant(variants, "visitor123", site_id="site")
+        assert random.getstate() == state
+
+    def test_select_variant_ignores_variant_order(self):
+        variants = [("var1", 10, 12), ("var2", 11, 10), ("var3", 9, 10)]
+        for i in range(50):
+            forward = ThompsonSampler.select_variant(variants, f"visitor{i}", site_id="site")
+            backward = ThompsonSampler.select_variant(variants[::-1], f"visitor{i}", site_id="site")
+            assert forward == backward
+
+    def test_select_variant_keyed_on_site_and_version(self):
+        variants = [("var1", 10, 10), ("var2", 10, 10), ("var3", 10, 10)]
+        by_site = {
+            ThompsonSampler.select_variant(variants, "visitor", site_id=f"site{i}")
+            for i in range(50)
+        }
+        by_version = {
+            ThompsonSampler.select_variant(variants, "visitor", site_id="site", version=str(i))
+            for i in range(50)
+        }
+        assert len(by_site) > 1
+        assert len(by_version) > 1
+
+    def test_posterior_version_tracks_parameters(self):
+        variants = [("var1", 10, 10), ("var2", 11, 10)]
+        assert posterior_version(variants) == posterior_version(variants[::-1])
+        assert posterior_version(variants) != posterior_version([("var1", 10, 10), ("var2", 12, 10)])
+
+    def test_select_variant_sticky_under_thread_pool(self):
+        variants = [(f"var{i}", 10 + i, 10) for i in range(5)]
+        visitors = [f"visitor{i}" for i in range(200)]
+        expected = {
+            v: ThompsonSampler.select_variant(variants, v, site_id="site") for v in visitors
+        }
+
+        def assign(visitor_id):
+            return visitor_id, ThompsonSampler.select_variant(variants, visitor_id, site_id="site")
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(assign, visitors * 20))
+
+        for visitor_id, selected in results:
+            assert selected == expected[visitor_id]
+
+    def test_select_variant_sticky_across_processes(self):
+        variants = [(f"var{i}", 10 + i, 10) for i in range(5)]
+        visitors = [f"visitor{i}" for i in range(20)]
+        expected = [
+            ThompsonSampler.select_variant(variants, v, site_id="site") for v in visitors
+        ]
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=2, mp_context=context) as pool:
+            results = list(pool.map(
+                ThompsonSampler.select_variant,
+                [variants] * len(visitors),
+                visitors,
+                ["site"] * len(visitors),
+            ))
+
+        assert results == expected
+
+
+class TestProbBestCache:
+    def test_key_ignores_arm_order(self):
+        cache = ProbBestCache(max_entries=4)
+        calls = []
+
+        def compute(variants):
+            calls.append(variants)
+            return ThompsonSampler.estimate_prob_best(variants)
+
+        first = cache.get_or_compute([("a", 3, 7), ("b", 5, 5)], compute)
+        second = cache.get_or_compute([("b", 5.0, 5.0), ("a", 3.0, 7.0)], compute)
+        assert second is first
+        assert len(calls) == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["hit_rate"] == pytest.approx(0.5)
+
+    def test_changed_posterior_misses(self):
+        cache = ProbBestCache(max_entries=4)
+        cache.get([("a", 3, 7), ("b", 5, 5)])
+        cache.get([("a", 4, 7), ("b", 5, 5)])
+        assert cache.stats()["misses"] == 2
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ProbBestCache(max_entries=2)
+        arms = [[("a", n, 10), ("b", 10, n)] for n in (1, 2, 3)]
+        cache.get(arms[0])
+        cache.get(arms[1])
+        cache.get(arms[0])
+        cache.get(arms[2])
+
+        stats = cache.stats()
+        assert stats["size"] == 2
+        assert stats["evictions"] == 1
+        cache.get(arms[0])
+        assert cache.stats()["hits"] == 2
+
+
+class TestAliasTable:
+    def test_table_reproduces_weights(self):
+        weights = {"a": 0.5, "b": 0.3, "c": 0.15, "d": 0.05, "e": 0.0}
+        table = AliasTable.build(weights)
+        assert table.weights() == pytest.approx(weights)
+
+    def test_unnormalized_weights(self):
+        table = AliasTable.build({"a": 2, "b": 6})
+        assert table.weights() == pytest.approx({"a": 0.25, "b": 0.75})
+
+    def test_rejects_zero_total(self):
+        with pytest.raises(ValueError):
+            AliasTable.build({"a": 0.0, "b": 0.0})
+
+    def test_hashed_assignment_matches_weights(self):
+        weights = {"a": 0.6, "b": 0.3, "c": 0.1, "d": 0.0}
+        table = AliasTable.build(weights)
+        picks = [
+            ThompsonSampler.select_allocated(table, f"visitor-{i}", site_id="s", version="v1")
+            for i in range(20000)
+        ]
+        for variant_id, weight in weights.items():
+            assert picks.count(variant_id) / len(picks) == pytest.approx(weight, abs=0.015)
+
+    def test_assignment_is_stable_per_version(self):
+        table = AliasTable.build({"a": 0.5, "b": 0.5})
+        first = [ThompsonSampler.select_allocated(table, f"v{i}", "s", "v1") for i in range(200)]
+        again = [ThompsonSampler.select_allocated(table, f"v{i}", "s", "v1") for i in range(200)]
+        reshuffled = [ThompsonSampler.select_allocated(table, f"v{i}", "s", "v2") for i in range(200)]
+        assert first == again
+        assert first != reshuffled
@@ -1,6 +1,9 @@
 import pytest
+from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from db.models import User, Site, Variant, ExperimentStats
+from services import pagination
 import uuid
 
 
@@ -111,3 +114,87 @@ class TestVariantsEndpoints:
         assert response.status_code == 200
         diff = response.json()
         assert "headline" in diff["changes"]
+
+    def test_list_variants_pages_with_cursor(self, client: TestClient, db_session, test_site):
+        base = datetime.utcnow()
+        keys = []
+        for i in range(7):
+            # Pairs of variants share a timestamp so the id breaks the tie.
+            key = (base + timedelta(seconds=i // 2 * 2), uuid.uuid4())
+            db_session.add(Variant(id=key[1], site_id=test_site.id, patch={}, status="active", created_at=key[0]))
+            keys.append(key)
+        db_session.commit()
+        expected = [str(variant_id) for _, variant_id in sorted(keys, key=lambda k: (k[0], k[1].hex))]
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            url = f"/api/sites/{test_site.id}/variants?limit=3"
+            if cursor:
+                url += f"&cursor={cursor}"
+            response = client.get(url)
+            assert response.status_code == 200
+            seen += [v["id"] for v in response.json()]
+            pages += 1
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        assert pages == 3
+        assert seen == expected
+
+    def test_list_variants_pages_by_default(self, client: TestClient, db_session, test_site):
+        for _ in range(pagination.DEFAULT_PAGE_SIZE + 1):
+            db_session.add(Variant(id=uuid.uuid4(), site_id=test_site.id, patch={}, status="active"))
+        db_session.commit()
+
+        first = client.get(f"/api/sites/{test_site.id}/variants")
+        assert len(first.json()) == pagination.DEFAULT_PAGE_SIZE
+        rest = client.get(f"/api/sites/{test_site.id}/variants?cursor={first.headers['X-Next-Cursor']}")
+        assert len(rest.json()) == 1
+        assert "X-Next-Cursor" not in rest.headers
+
+    def test_list_variants_hides_deleted_sites(self, client: TestClient, db_session, test_site):
+        db_session.add(Variant(id=uuid.uuid4(), site_id=test_site.id, patch={}, status="active"))
+        test_site.deleted_at = datetime.utcnow()
+        db_session.commit()
+
+        response = client.get(f"/api/sites/{test_site.id}/variants")
+        assert response.status_code == 200
+        assert response.json() == []
+
+    def test_list_variants_filters_by_status(self, client: TestClient, db_session, test_site):
+        for status in ("active", "killed", "killed", "pending_review"):
+            db_session.add(Variant(id=uuid.uuid4(), site_id=test_site.id, patch={}, status=status))
+        db_session.commit()
+
+        response = client.get(f"/api/sites/{test_site.id}/variants?status=active&status=pending_review")
+        assert sorted(v["status"] for v in response.json()) == ["active", "pending_review"]
+
+    def test_list_variants_rejects_bad_cursor(self, client: TestClient, db_session, test_site):
+        response = client.get(f"/api/sites/{test_site.id}/variants?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+    def test_list_variants_is_one_query(self, client: TestClient, db_session, test_site, route_engine):
+        for i in range(20):
+            variant = Variant(id=uuid.uuid4(), site_id=test_site.id, patch={}, status="active")
+            db_session.add(variant)
+            db_session.add(ExperimentStats(variant_id=variant.id, visitors=10 + i, conversions=i))
+        db_session.commit()
+        url = f"/api/sites/{test_site.id}/variants"
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(route_engine, "before_cursor_execute", count)
+        try:
+            data = client.get(url).json()
+        finally:
+            event.remove(route_engine, "before_cursor_execute", count)
+
+        assert len(data) == 20
+        assert sorted(v["stats"]["visitors"] for v in data) == list(range(10, 30))
+        assert len(statements) == 1
@@ -4,6 +4,7 @@ import { useState, useEffect } from "react"
 import Link from "next/link"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Button } from "@/components/ui/button"
+import { fetchAllPages } from "@/lib/pagination"
 import {
   BarChart3,
   TrendingUp,
@@ -43,11 +44,7 @@ export default function AnalyticsPage() {
 
   const fetchData = async () => {
     try {
-      const res = await fetch("/api/sites")
-      if (res.ok) {
-        const data = await res.json()
-        setSites(Array.isArray(data) ? data : (data.sites || []))
-      }
+      setSites(await fetchAllPages<Site>("/api/sites"))
     } catch (error) {
       console.error("Failed to fetch data:", error)
     } finally {
@@ -5,6 +5,7 @@ import { useParams } from "next/navigation"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Badge } from "@/components/ui/badge"
+import { fetchAllPages } from "@/lib/pagination"
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs"
 import {
   Select,
@@ -105,22 +106,19 @@ export default function SiteDetailPage() {
 
   const fetchVariants = async () => {
     try {
-      const res = await fetch(`/api/sites/${siteId}/variants`)
-      if (res.ok) {
-        const data = await res.json()
-        // Transform backend data to match frontend interface
-        const transformedVariants = data.map((v: any) => ({
-          id: v.id,
-          status: v.status,
-          patch: v.patch || {},
-          stats: v.stats || { visitors: 0, conversions: 0, conversion_rate: 0, prob_best: 0 },
-          visitors: v.stats?.visitors || 0,
-          conversions: v.stats?.conversions || 0,
-          conversionRate: v.stats?.conversion_rate || 0,
-          probBest: v.stats?.prob_best || 0,
-        }))
-        setVariants(transformedVariants)
-      }
+      const data = await fetchAllPages(`/api/sites/${siteId}/variants`)
+      // Transform backend data to match frontend interface
+      const transformedVariants = data.map((v: any) => ({
+        id: v.id,
+        status: v.status,
+        patch: v.patch || {},
+        stats: v.stats || { visitors: 0, conversions: 0, conversion_rate: 0, prob_best: 0 },
+        visitors: v.stats?.visitors || 0,
+        conversions: v.stats?.conversions || 0,
+        conversionRate: v.stats?.conversion_rate || 0,
+        probBest: v.stats?.prob_best || 0,
+      }))
+      setVariants(transformedVariants)
     } catch (error) {
       console.error("Failed to fetch variants:", error)
     }
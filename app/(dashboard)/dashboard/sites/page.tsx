@@ -5,6 +5,7 @@ import Link from "next/link"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Badge } from "@/components/ui/badge"
+import { fetchAllPages } from "@/lib/pagination"
 import {
   Dialog,
   DialogContent,
@@ -47,12 +48,7 @@ export default function SitesPage() {
 
   const fetchSites = async () => {
     try {
-      const res = await fetch("/api/sites")
-      if (res.ok) {
-        const data = await res.json()
-        // Handle both array response and {sites: []} response
-        setSites(Array.isArray(data) ? data : (data.sites || []))
-      }
+      setSites(await fetchAllPages<Site>("/api/sites"))
     } catch (error) {
       console.error("Failed to fetch sites:", error)
     } finally {
@@ -10,7 +10,8 @@ export async function GET(
     const { siteId } = await params
     console.log('GET /api/sites/[siteId]/variants - fetching variants for site:', siteId)
 
-    const res = await fetch(`${API_URL}/api/sites/${siteId}/variants`, {
+    const { search } = new URL(request.url)
+    const res = await fetch(`${API_URL}/api/sites/${siteId}/variants${search}`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -26,7 +27,12 @@ export async function GET(
 
     const data = await res.json()
     console.log('GET /api/sites/[siteId]/variants - backend response:', data)
-    return NextResponse.json(data)
+    const response = NextResponse.json(data)
+    const nextCursor = res.headers.get('X-Next-Cursor')
+    if (nextCursor) {
+      response.headers.set('X-Next-Cursor', nextCursor)
+    }
+    return response
   } catch (error) {
     console.error("Failed to fetch variants:", error)
     return NextResponse.json({ error: "Failed to fetch variants" }, { status: 500 })
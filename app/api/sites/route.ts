@@ -74,10 +74,14 @@ export async function GET(request: Request) {
       return NextResponse.json({ error: "Unauthorized" }, { status: 401 })
     }
 
+    // Paging and filters pass through; the user always comes from the session.
+    const query = new URL(request.url).searchParams
+    query.set('user_id', userId)
+
     console.log('GET /api/sites - user ID:', userId)
-    console.log('GET /api/sites - calling backend at:', `${API_URL}/api/sites?user_id=${userId}`)
+    console.log('GET /api/sites - calling backend at:', `${API_URL}/api/sites?${query}`)
 
-    const res = await fetch(`${API_URL}/api/sites?user_id=${userId}`, {
+    const res = await fetch(`${API_URL}/api/sites?${query}`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -93,7 +97,12 @@ export async function GET(request: Request) {
 
     const data = await res.json()
     console.log('GET /api/sites - backend response:', data)
-    return NextResponse.json(data)
+    const response = NextResponse.json(data)
+    const nextCursor = res.headers.get('X-Next-Cursor')
+    if (nextCursor) {
+      response.headers.set('X-Next-Cursor', nextCursor)
+    }
+    return response
   } catch (error) {
     console.error("Failed to fetch sites:", error)
     return NextResponse.json({ error: "Failed to fetch sites" }, { status: 500 })
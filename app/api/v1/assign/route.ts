@@ -1,4 +1,5 @@
 import { NextResponse } from "next/server"
+import { fetchAllPages } from "@/lib/pagination"
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000"
 
@@ -40,20 +41,15 @@ export async function GET(request: Request) {
 
     console.log('GET /api/v1/assign - site:', siteId, 'visitor:', visitorId)
 
-    // Fetch variants for this site
-    const variantsRes = await fetch(`${API_URL}/api/sites/${siteId}/variants`, {
+    // Fetch every active variant for this site, following the cursor so a
+    // large site is never assigned from a truncated list.
+    const variants = await fetchAllPages(`${API_URL}/api/sites/${siteId}/variants?status=active&limit=500`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
       },
     })
 
-    if (!variantsRes.ok) {
-      console.log('No variants found, returning null')
-      return NextResponse.json(null)
-    }
-
-    const variants = await variantsRes.json()
     const activeVariants = variants.filter((v: any) => v.status === 'active')
 
     if (activeVariants.length === 0) {
@@ -0,0 +1,22 @@
+// Listing endpoints return one page at a time and put the cursor for the
+// next page in this header; it is absent on the last page.
+export const NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+// Fetch every page of a listing, following the cursor until it runs out.
+// Throws if any page fails, rather than returning a partial listing.
+export async function fetchAllPages<T = any>(url: string, init?: RequestInit): Promise<T[]> {
+  const items: T[] = []
+  let cursor: string | null = null
+  do {
+    const pageUrl: string = cursor
+      ? `${url}${url.includes("?") ? "&" : "?"}cursor=${encodeURIComponent(cursor)}`
+      : url
+    const res = await fetch(pageUrl, init)
+    if (!res.ok) {
+      throw new Error(`Failed to fetch ${pageUrl}: ${res.status} ${res.statusText}`)
+    }
+    items.push(...(await res.json()))
+    cursor = res.headers.get(NEXT_CURSOR_HEADER)
+  } while (cursor)
+  return items
+}
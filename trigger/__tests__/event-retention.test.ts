@@ -0,0 +1,42 @@
+import { describe, it, expect, beforeEach } from 'vitest'
+import { scheduledEventRetention } from '../event-retention'
+import { mockFetch, resetMocks } from './setup'
+
+describe('scheduledEventRetention', () => {
+  beforeEach(() => {
+    resetMocks()
+  })
+
+  it('calls the retention endpoint and returns its summary', async () => {
+    const mockResponse = {
+      partitions_created: ['events_p202701'],
+      mode: 'partitions',
+      action: 'drop',
+      partitions: ['events_p202509'],
+    }
+
+    mockFetch.mockResolvedValueOnce({
+      ok: true,
+      json: () => Promise.resolve(mockResponse)
+    })
+
+    const result = await scheduledEventRetention.run()
+
+    expect(mockFetch).toHaveBeenCalledWith(
+      'http://localhost:8000/api/maintenance/events/retention',
+      expect.objectContaining({
+        method: 'POST'
+      })
+    )
+    expect(result).toEqual(mockResponse)
+  })
+
+  it('throws when the endpoint fails', async () => {
+    mockFetch.mockResolvedValueOnce({
+      ok: false,
+      statusText: 'Internal Server Error'
+    })
+
+    await expect(scheduledEventRetention.run()).rejects.toThrow('Event retention failed')
+  })
+})
@@ -0,0 +1,39 @@
+import { describe, it, expect, beforeEach } from 'vitest'
+import { scheduledSitePurge } from '../site-purge'
+import { mockFetch, resetMocks } from './setup'
+
+describe('scheduledSitePurge', () => {
+  beforeEach(() => {
+    resetMocks()
+  })
+
+  it('calls the purge endpoint and returns its summary', async () => {
+    const mockResponse = {
+      purges: [{ site_id: 'site-1', status: 'done', deleted: { events: 120000, sites: 1 } }],
+    }
+
+    mockFetch.mockResolvedValueOnce({
+      ok: true,
+      json: () => Promise.resolve(mockResponse)
+    })
+
+    const result = await scheduledSitePurge.run()
+
+    expect(mockFetch).toHaveBeenCalledWith(
+      'http://localhost:8000/api/maintenance/sites/purge',
+      expect.objectContaining({
+        method: 'POST'
+      })
+    )
+    expect(result).toEqual(mockResponse)
+  })
+
+  it('throws when the endpoint fails', async () => {
+    mockFetch.mockResolvedValueOnce({
+      ok: false,
+      statusText: 'Internal Server Error'
+    })
+
+    await expect(scheduledSitePurge.run()).rejects.toThrow('Site purge failed')
+  })
+})
@@ -1,5 +1,5 @@
 import { describe, it, expect, beforeEach } from 'vitest'
-import { updateStatsTask } from '../update-stats'
+import { scheduledStatsUpdate, updateStatsTask } from '../update-stats'
 import { mockFetch, resetMocks } from './setup'
 
 describe('updateStatsTask', () => {
@@ -97,3 +97,35 @@ describe('updateStatsTask', () => {
     expect(result).toEqual(mockResponse)
   })
 })
+
+describe('scheduledStatsUpdate', () => {
+  beforeEach(() => {
+    resetMocks()
+  })
+
+  it('recomputes only dirty sites', async () => {
+    mockFetch.mockResolvedValueOnce({
+      ok: true,
+      json: () => Promise.resolve({ sites_updated: 2, errors: 0, results: [] })
+    })
+
+    const result = await scheduledStatsUpdate.run()
+
+    expect(mockFetch).toHaveBeenCalledWith(
+      'http://localhost:8000/api/stats/update-dirty',
+      expect.objectContaining({
+        method: 'POST'
+      })
+    )
+    expect(result).toEqual(expect.objectContaining({ status: 'completed', sitesUpdated: 2 }))
+  })
+
+  it('throws when the endpoint fails', async () => {
+    mockFetch.mockResolvedValueOnce({
+      ok: false,
+      statusText: 'Internal Server Error'
+    })
+
+    await expect(scheduledStatsUpdate.run()).rejects.toThrow('Scheduled stats update failed')
+  })
+})
@@ -0,0 +1,20 @@
+import { schedules } from "@trigger.dev/sdk/v3"
+
+// Create upcoming event partitions and purge events past retention, daily
+export const scheduledEventRetention = schedules.task({
+  id: "scheduled-event-retention",
+  cron: "30 3 * * *",
+  maxDuration: 600,
+  run: async () => {
+    const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/api/maintenance/events/retention`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+    })
+
+    if (!response.ok) {
+      throw new Error(`Event retention failed: ${response.statusText}`)
+    }
+
+    return response.json()
+  },
+})
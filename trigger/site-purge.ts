@@ -0,0 +1,20 @@
+import { schedules } from "@trigger.dev/sdk/v3"
+
+// Resume site purges left pending, failed or stalled by a restarted worker
+export const scheduledSitePurge = schedules.task({
+  id: "scheduled-site-purge",
+  cron: "*/15 * * * *",
+  maxDuration: 900,
+  run: async () => {
+    const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/api/maintenance/sites/purge`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+    })
+
+    if (!response.ok) {
+      throw new Error(`Site purge failed: ${response.statusText}`)
+    }
+
+    return response.json()
+  },
+})
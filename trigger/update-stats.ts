@@ -29,12 +29,14 @@ export const updateStatsTask = task({
   },
 })
 
-// Schedule stats update every 5 minutes
+// Recompute sites with new events every minute; hot sites are picked up on
+// the next pass, quiet ones once they pass the API's staleness bound, and
+// idle ones cost nothing.
 export const scheduledStatsUpdate = schedules.task({
   id: "scheduled-stats-update",
-  cron: "*/5 * * * *",
+  cron: "* * * * *",
   run: async () => {
-    const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/api/stats/update-all`, {
+    const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/api/stats/update-dirty`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
     })
@@ -43,6 +45,11 @@ export const scheduledStatsUpdate = schedules.task({
       throw new Error(`Scheduled stats update failed: ${response.statusText}`)
     }
 
-    return { status: "completed", timestamp: new Date().toISOString() }
+    const result = await response.json()
+    return {
+      status: "completed",
+      sitesUpdated: result.sites_updated,
+      timestamp: new Date().toISOString(),
+    }
   },
 })